@@ -1,11 +1,13 @@
-import time
 from datetime import datetime
 
 from langchain.agents import create_agent
+from langchain.agents.middleware import dynamic_prompt, ModelRequest
 from langchain.chat_models import init_chat_model
 
 from backend.app.agents.files_manager_agent.state import FileAgentState
 from backend.app.agents.files_manager_agent.tools import tools_list
+from backend.app.core.settings import settings
+from backend.app.utils.cache_util import LRUCache
 
 # system_prompt = (
 #     "You are a helpful personal assistant. "
@@ -13,22 +15,61 @@ from backend.app.agents.files_manager_agent.tools import tools_list
 #     "Break down user requests into appropriate tool calls and coordinate the results. "
 #     "When a request involves multiple actions, use multiple tools in sequence."
 # ),
-def get_file_agent(prompt_text:str,model_name:str,provider:str,system_type:str,base_url:str=None,api_key:str=None):
+
+# 已编译的 Agent 缓存：key 为 (provider, model_name, base_url, api_key, prompt_text, system_type)，
+# value 为 (Agent, 使用该配置的助手 ID 集合)；助手 ID 随条目一起淘汰，不单独维护映射
+_agent_cache = LRUCache(maxsize=settings.AGENT_CACHE_SIZE)
+
+
+def build_system_prompt(prompt_text: str, system_type: str) -> str:
+    """构造不随时间变化的系统提示词（当前时间在每次调用模型时动态追加）"""
+    return (
+        f"{prompt_text}"
+        "Before making any tool calls, first explain clearly why the tool is needed and how it helps address the user’s request. Then, break down the user’s request into appropriate tool calls, execute them in a logical order, and coordinate their results to produce a coherent final answer. "
+        "When a request involves multiple actions, use multiple tools in sequence."
+        f"This os is {system_type}"
+    )
+
+
+def _build_file_agent(prompt_text:str,model_name:str,provider:str,system_type:str,base_url:str=None,api_key:str=None):
     model=init_chat_model(model=model_name,model_provider=provider,base_url=base_url,api_key=api_key)
+    static_prompt = build_system_prompt(prompt_text, system_type)
+
+    @dynamic_prompt
+    def file_agent_prompt(request: ModelRequest) -> str:
+        # 每轮注入当前时间，避免把时间固化进缓存的 Agent
+        return f"{static_prompt}\nThe current date and time is {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}."
+
     return create_agent(
         model=model,
         tools=tools_list,
-        system_prompt=(
-            f"{prompt_text}"
-            "Before making any tool calls, first explain clearly why the tool is needed and how it helps address the user’s request. Then, break down the user’s request into appropriate tool calls, execute them in a logical order, and coordinate their results to produce a coherent final answer. "
-            "When a request involves multiple actions, use multiple tools in sequence."
-            f"The current date and time is {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}."
-            f"This os is {system_type}"
-        ),
+        middleware=[file_agent_prompt],
         name="file_agent",
         state_schema=FileAgentState
     )
+
+
+def get_file_agent(prompt_text:str,model_name:str,provider:str,system_type:str,base_url:str=None,api_key:str=None,assistant_id:int=None):
+    """
+    获取已编译的文件管理 Agent：相同配置复用缓存，避免每轮对话重建模型客户端、工具 schema 与 LangGraph 图。
+    """
+    key = (provider, model_name, base_url, api_key, prompt_text, system_type)
+    entry = _agent_cache.get(key)
+    if entry is None:
+        entry = (_build_file_agent(prompt_text, model_name, provider, system_type, base_url, api_key), set())
+        _agent_cache.set(key, entry)
+    agent, assistant_ids = entry
+    if assistant_id is not None:
+        assistant_ids.add(assistant_id)
+    return agent
+
+
+def invalidate_file_agent(assistant_id: int) -> None:
+    """助手配置变更或删除后，移除其对应的已编译 Agent（缓存条目数有上限，直接遍历）"""
+    for key in _agent_cache.keys():
+        entry = _agent_cache.get(key)
+        if entry is not None and assistant_id in entry[1]:
+            _agent_cache.pop(key)
 # messages=file_agent.invoke({"messages": [{"role": "user", "content":"创建一个233.txt文件然后写入233，然后再帮我列出所有文件"}]})
 # for message in messages["messages"]:
 #     print(message)
-
@@ -13,6 +13,7 @@ from typing_extensions import Annotated
 from langgraph.prebuilt import InjectedState
 
 from backend.app.agents.files_manager_agent.state import FileAgentState, ToolState
+from backend.app.utils import process_registry
 
 
 def safe_path(base_dir: str, rel_path: str) -> Path:
@@ -305,17 +306,32 @@ def run_command(runtime: ToolRuntime,command: str, shell_type: str = None, max_o
             # ✅ CMD 强制以 UTF-8 执行命令
             shell_cmd = ["cmd", "/c", f"chcp 65001 >nul && {command}"]
 
+    # 对话被取消时按会话结束子进程（见 process_registry），会话 ID 来自 graph 调用时的 configurable
+    scope = (runtime.config or {}).get("configurable", {}).get("thread_id")
+    proc = None
     try:
-        result = subprocess.run(
+        proc = subprocess.Popen(
             shell_cmd,
             cwd=base_dir,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
             encoding="utf-8",  # ✅ 强制解码为 UTF-8
             errors="replace",  # ✅ 避免乱码崩溃，用 � 替代非法字符
             shell=(system != "Windows"),
-            timeout=60
+            **process_registry.popen_group_kwargs(),
         )
+        if scope is not None:
+            process_registry.register(scope, proc)
+        try:
+            stdout, stderr = proc.communicate(timeout=60)
+        except subprocess.TimeoutExpired:
+            process_registry.cancel_process(proc)
+            proc.communicate()
+            return {"error": "命令执行超时。"}
+        if scope is not None and process_registry.is_cancelled(scope):
+            return {"error": "命令已取消。"}
+        result = subprocess.CompletedProcess(shell_cmd, proc.returncode, stdout, stderr)
 
         stdout = (result.stdout or "").strip()
         stderr = (result.stderr or "").strip()
@@ -337,10 +353,11 @@ def run_command(runtime: ToolRuntime,command: str, shell_type: str = None, max_o
             res["warning"] = warning
         return res
 
-    except subprocess.TimeoutExpired:
-        return {"error": "命令执行超时。"}
     except Exception as e:
         return {"error": f"命令执行失败: {e}"}
+    finally:
+        if scope is not None and proc is not None:
+            process_registry.unregister(scope, proc)
 
 
 
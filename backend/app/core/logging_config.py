@@ -1,18 +1,61 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import os
 
 LOG_DIR = "logs"
 LOG_FILE = os.path.join(LOG_DIR, "app.log")
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# 所有 logger 共用一个 QueueHandler：事件循环线程只把日志记录放入队列，
+# 文件写入（含轮转）与控制台输出由 QueueListener 的后台线程完成，不阻塞事件循环
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_queue_handler: QueueHandler | None = None
+_listener: QueueListener | None = None
+
+
+def _build_handlers() -> list[logging.Handler]:
+    formatter = logging.Formatter(
+        "[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    # 设置文件日志处理器，支持日志轮转（10MB一个文件，最多保留5个）
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=10 * 1024 * 1024, backupCount=5,encoding='utf-8')
+    file_handler.setFormatter(formatter)
+
+    # 设置控制台日志处理器
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    return [file_handler, console_handler]
+
+
+def _get_queue_handler() -> QueueHandler:
+    """首次调用时创建共享的 QueueHandler 并启动后台写日志线程"""
+    global _queue_handler, _listener
+    if _queue_handler is None:
+        _queue_handler = QueueHandler(_log_queue)
+        _listener = QueueListener(_log_queue, *_build_handlers(), respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    return _queue_handler
+
+
+def stop_logging() -> None:
+    """停止后台写日志线程：写完队列中剩余的日志（进程退出时自动调用，可重复调用）"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def get_logger(name: str = "app_logger") -> logging.Logger:
     """
     创建并返回一个配置好的日志记录器（Logger）。
 
     如果指定名称的 logger 尚未设置处理器（handlers），则：
     - 设置日志级别为 INFO；
-    - 使用指定的格式化器同时将日志输出到文件和控制台；
+    - 挂载共享的 QueueHandler：日志记录经队列交给后台线程，同时输出到文件和控制台；
     - 文件输出使用 RotatingFileHandler，实现日志文件的自动轮转（最大10MB，保留5个历史文件）。
 
     参数:
@@ -24,20 +67,5 @@ def get_logger(name: str = "app_logger") -> logging.Logger:
     logger = logging.getLogger(name)
     if not logger.handlers:
         logger.setLevel(logging.INFO)
-
-        formatter = logging.Formatter(
-            "[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S"
-        )
-        # 设置文件日志处理器，支持日志轮转（10MB一个文件，最多保留5个）
-        file_handler = RotatingFileHandler(LOG_FILE, maxBytes=10 * 1024 * 1024, backupCount=5,encoding='utf-8')
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-
-        # 设置控制台日志处理器
-
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
-
-    return logger
\ No newline at end of file
+        logger.addHandler(_get_queue_handler())
+    return logger
@@ -0,0 +1,226 @@
+"""
+metrics.py - 进程内指标（计数器 / 直方图）
+----------------------------------------------
+指标只在事件循环线程内更新：单线程下普通的 dict/list 自增无需加锁，开销为一次哈希查找。
+render_prometheus() 以 Prometheus 文本格式导出全部指标（由 /metrics 接口返回），
+指标为单进程数据，多 worker 部署时由 Prometheus 分别抓取各进程。
+"""
+import math
+from bisect import bisect_left
+from typing import Iterable, Sequence
+
+# 字节大小类直方图的默认分桶（1KB ~ 16MB）
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# 耗时类直方图的默认分桶（秒）
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 毫秒级操作（缓存读取、索引查询）的耗时分桶（秒）
+FAST_SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+# 已创建的全部指标，按创建顺序导出
+_REGISTRY: list = []
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+        _REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> dict[tuple, float]:
+        return dict(self._values)
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float],
+        labelnames: Iterable[str] = (),
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        # label 值 -> [各分桶计数..., +Inf 计数, 总和]
+        self._values: dict[tuple, list[float]] = {}
+        _REGISTRY.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def snapshot(self) -> dict[tuple, dict]:
+        """返回各 label 组合的累计分桶计数、样本数与总和"""
+        result = {}
+        for key, series in self._values.items():
+            cumulative, total = [], 0
+            for count in series[:-1]:
+                total += count
+                cumulative.append(total)
+            result[key] = {
+                "buckets": dict(zip(self.buckets + (float("inf"),), cumulative)),
+                "count": total,
+                "sum": series[-1],
+            }
+        return result
+
+
+# =====================
+# Prometheus 文本格式导出
+# =====================
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def render_prometheus() -> str:
+    """以 Prometheus 文本格式（0.0.4）导出全部指标"""
+    lines = []
+    for metric in _REGISTRY:
+        doc = metric.documentation.replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {metric.name} {doc}")
+        if isinstance(metric, Histogram):
+            lines.append(f"# TYPE {metric.name} histogram")
+            bucket_names = metric.labelnames + ("le",)
+            for key, data in sorted(metric.snapshot().items()):
+                for bound, count in data["buckets"].items():
+                    labels = _format_labels(bucket_names, key + (_format_value(bound),))
+                    lines.append(f"{metric.name}_bucket{labels} {count}")
+                labels = _format_labels(metric.labelnames, key)
+                lines.append(f"{metric.name}_sum{labels} {_format_value(data['sum'])}")
+                lines.append(f"{metric.name}_count{labels} {data['count']}")
+        else:
+            lines.append(f"# TYPE {metric.name} counter")
+            for key, value in sorted(metric.snapshot().items()):
+                lines.append(f"{metric.name}{_format_labels(metric.labelnames, key)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# =====================
+# TTS 音频
+# =====================
+TTS_AUDIO_BYTES = Counter(
+    "tts_audio_bytes_total",
+    "TTS 音频字节数（stream: 推送给客户端的片段，stored: 上传对象存储的整段音频）",
+    labelnames=("encoding", "kind"),
+)
+TTS_TURN_AUDIO_BYTES = Histogram(
+    "tts_turn_audio_bytes",
+    "单轮对话产生的 TTS 音频字节数",
+    buckets=BYTES_BUCKETS,
+    labelnames=("encoding", "kind"),
+)
+
+
+def record_turn_audio_bytes(encoding: str, stream_bytes: int, stored_bytes: int) -> None:
+    """记录单轮对话推送与存储的音频字节数"""
+    for kind, size in (("stream", stream_bytes), ("stored", stored_bytes)):
+        if size:
+            TTS_AUDIO_BYTES.inc(size, encoding=encoding, kind=kind)
+            TTS_TURN_AUDIO_BYTES.observe(size, encoding=encoding, kind=kind)
+
+
+# =====================
+# 会话锁
+# =====================
+SESSION_LOCK_WAIT = Histogram(
+    "session_lock_wait_seconds",
+    "获取会话锁的等待时间（outcome: acquired 拿到锁 / timeout 等待超时 / rejected 队列已满）",
+    buckets=SECONDS_BUCKETS,
+    labelnames=("outcome",),
+)
+
+
+# =====================
+# 限流
+# =====================
+RATE_LIMIT_REJECTED = Counter(
+    "rate_limit_rejected_total",
+    "被限流拒绝的对话请求数（reason: client / assistant 令牌桶，concurrency 助手并发已满）",
+    labelnames=("reason",),
+)
+
+
+# =====================
+# 对话链路耗时（均从 handle_chat_completion 开始计时，含历史加载）
+# =====================
+CHAT_TIME_TO_FIRST_TOKEN = Histogram(
+    "chat_time_to_first_token_seconds",
+    "从开始处理对话到模型输出第一个文本 token 的时间",
+    buckets=SECONDS_BUCKETS,
+)
+CHAT_TIME_TO_FIRST_AUDIO = Histogram(
+    "chat_time_to_first_audio_seconds",
+    "从开始处理对话到推送第一段语音的时间",
+    buckets=SECONDS_BUCKETS,
+)
+CHAT_TURN_DURATION = Histogram(
+    "chat_turn_duration_seconds",
+    "单轮对话总耗时（status: completed / failed / cancelled）",
+    buckets=SECONDS_BUCKETS,
+    labelnames=("status",),
+)
+HISTORY_LOAD = Histogram(
+    "history_load_seconds",
+    "加载对话历史窗口的耗时（source: cache 命中 Redis 窗口 / db 回源 MySQL）",
+    buckets=FAST_SECONDS_BUCKETS,
+    labelnames=("source",),
+)
+AGENT_TOOL_CALLS = Counter(
+    "agent_tool_calls_total",
+    "Agent 工具调用次数（tool: 工具名，不在 tools_list 中的记为 unknown；status: success / error）",
+    labelnames=("tool", "status"),
+)
+
+
+# =====================
+# 外部服务调用
+# =====================
+TTS_REQUEST = Histogram(
+    "tts_request_seconds",
+    "单次 TTS 合成接口调用耗时（不含缓存命中；outcome: ok / error）",
+    buckets=SECONDS_BUCKETS,
+    labelnames=("outcome",),
+)
+TTS_CACHE_LOOKUPS = Counter(
+    "tts_cache_lookups_total",
+    "TTS 合成缓存查询次数（result: memory_hit / redis_hit / miss）",
+    labelnames=("result",),
+)
+ASR_REQUEST = Histogram(
+    "asr_request_seconds",
+    "单次 ASR 识别接口调用耗时（outcome: ok / error）",
+    buckets=SECONDS_BUCKETS,
+    labelnames=("outcome",),
+)
+OSS_UPLOAD = Histogram(
+    "oss_upload_seconds",
+    "单次对象存储上传耗时（每次重试单独计入；outcome: ok / error）",
+    buckets=SECONDS_BUCKETS,
+    labelnames=("outcome",),
+)
@@ -24,14 +24,81 @@ class Settings(BaseSettings):
     REDIS_DECODE_RESPONSES : bool
 
     HISTORY_MAX_TOKENS:int=5000
+    #Redis 会话窗口缓存：每个线程缓存的最近消息条数上限及过期时间（秒）
+    HISTORY_CACHE_MAX_MESSAGES:int=200
+    HISTORY_CACHE_TTL:int=3600
+    #会话摘要：单次摘要最多读取的未摘要消息条数、折叠的 token 数，工具输出截断长度
+    SUMMARY_MAX_INPUT_MESSAGES:int=500
+    SUMMARY_MAX_INPUT_TOKENS:int=8000
+    SUMMARY_TOOL_CONTENT_CHARS:int=500
+    #聊天消息合并写入：攒批最长等待时间（毫秒）、单次 INSERT 最大行数、队列容量
+    MESSAGE_WRITER_FLUSH_INTERVAL_MS:float=20
+    MESSAGE_WRITER_BATCH_ROWS:int=500
+    MESSAGE_WRITER_QUEUE_SIZE:int=10000
+
+    #会话锁：租约（秒，持有期间自动续期）、最长排队等待时间（秒）、单个会话最多排队的请求数
+    SESSION_LOCK_LEASE:float=60
+    SESSION_LOCK_WAIT_TIMEOUT:float=30
+    SESSION_LOCK_MAX_WAITERS:int=8
+    #对话限流（令牌桶）：每个客户端 / 每个助手每分钟补充的令牌数及桶容量（允许的突发数），<=0 不限制
+    RATE_LIMIT_CLIENT_PER_MINUTE:float=5
+    RATE_LIMIT_CLIENT_BURST:int=5
+    RATE_LIMIT_ASSISTANT_PER_MINUTE:float=120
+    RATE_LIMIT_ASSISTANT_BURST:int=20
+    #每个助手同时进行的对话数上限（<=0 不限制）及并发租约时长（秒，进程崩溃时到期回收）
+    ASSISTANT_MAX_CONCURRENCY:int=8
+    ASSISTANT_CONCURRENCY_LEASE:float=600
+    #流式对话无输出时发送保活帧的间隔（秒），用于及时发现客户端断开并取消对话
+    STREAM_KEEPALIVE_INTERVAL:float=15
+    #请求日志是否记录请求体、最多记录的字节数及记录请求体的 content-type（前缀匹配，其余只记录长度）
+    LOG_REQUEST_BODY:bool=True
+    LOG_BODY_MAX_BYTES:int=1024
+    LOG_BODY_CONTENT_TYPES:List[str]=["application/json", "application/x-www-form-urlencoded", "text/plain"]
+
+    #已编译 Agent 缓存数量（按助手模型/提示词配置区分）
+    AGENT_CACHE_SIZE:int=32
+    #会话/助手配置进程内缓存数量及过期时间（秒）
+    CONFIG_CACHE_SIZE:int=1024
+    CONFIG_CACHE_TTL:float=300
 
     DEV:bool=True
     TTS_AND_ASR_API_KEY:str
 
+    #语音接口（TTS/ASR）共享连接池配置
+    VOICE_HTTP_POOL_LIMIT:int=100
+    VOICE_HTTP_POOL_LIMIT_PER_HOST:int=20
+    VOICE_HTTP_KEEPALIVE_TIMEOUT:float=30
+    #语音接口超时时间（秒）
+    VOICE_HTTP_TIMEOUT:float=30
+    VOICE_HTTP_CONNECT_TIMEOUT:float=5
+
+    #单轮对话 TTS 并发合成 worker 数量
+    TTS_PIPELINE_WORKERS:int=3
+    #单轮对话 TTS 待合成队列容量
+    TTS_PIPELINE_QUEUE_SIZE:int=16
+
+    #TTS 合成缓存：进程内 LRU 条目数
+    TTS_CACHE_MAX_ENTRIES:int=1024
+    #TTS 合成缓存：Redis 过期时间（秒）
+    TTS_CACHE_TTL:int=7 * 24 * 3600
+    #TTS 合成缓存：超过该长度的文本不缓存
+    TTS_CACHE_MAX_TEXT_LEN:int=64
+
     KOBO_ACCESS_KEY:str
     KOBO_SECRET_KEY:str
     KOBO_BUCKET_NAME:str
     KOBO_BUCKET_DOMAIN:str
+
+    #对象存储后台上传队列容量
+    UPLOAD_QUEUE_SIZE:int=256
+    #对象存储并发上传 worker 数量
+    UPLOAD_WORKERS:int=4
+    #上传失败最大重试次数及首次退避时间（秒）
+    UPLOAD_MAX_RETRIES:int=3
+    UPLOAD_RETRY_BACKOFF:float=0.5
+    #上传最终失败时的本地落盘目录及重放间隔（秒）
+    UPLOAD_SPOOL_DIR:str="spool/uploads"
+    UPLOAD_SPOOL_REPLAY_INTERVAL:float=60
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class TurnStatus(str, Enum):
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+    cancelled = "cancelled"
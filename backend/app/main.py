@@ -1,3 +1,4 @@
+import asyncio
 import os
 
 from fastapi import FastAPI
@@ -7,11 +8,20 @@ from starlette.middleware.cors import CORSMiddleware
 
 
 from backend.app.core.connection import engine, redis_client
-from backend.app.core.database import Base
+from backend.app.core.logging_config import stop_logging
+from backend.app.migrations.runner import run_migrations
 from backend.app.core.settings import settings
 from backend.app.routers import router as api_router
+from backend.app.routers import metrics as metrics_router
+from backend.app.services.config_cache_service import listen_config_invalidations
+from backend.app.services.turn_cancel_service import listen_turn_cancellations
+from backend.app.services.voice_service import prewarm_voice_prompts
+from backend.app.services.message_writer import message_writer
 
 from backend.app.middlewares.logging import LoggingMiddleware
+from backend.app.utils.upload_queue import upload_queue
+from backend.app.utils.task_util import shutdown_background_tasks
+from backend.app.utils.voice_util import close_http_session
 from fastapi_cache.backends.redis import RedisBackend
 
 app = FastAPI()
@@ -25,9 +35,10 @@ if settings.HTTPS_PROXY is not None:
 
 app.add_middleware(
     LoggingMiddleware,
-    skip_paths=["/docs", "/openapi.json", "/favicon.ico"],
-    log_body=True  # 根据需要设置为 True/False
-
+    skip_paths=["/docs", "/openapi.json", "/favicon.ico", "/metrics"],
+    log_body=settings.LOG_REQUEST_BODY,
+    max_body_bytes=settings.LOG_BODY_MAX_BYTES,
+    body_content_types=settings.LOG_BODY_CONTENT_TYPES,
 )
 # 添加跨域中间件
 app.add_middleware(
@@ -36,18 +47,50 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 列表接口通过响应头返回下一页游标
+    expose_headers=["X-Next-Cursor"],
 )
 app.include_router(api_router, prefix="/v1")
+# Prometheus 抓取接口（不带版本前缀）
+app.include_router(metrics_router.router)
 class Item(BaseModel):
     text: str
-# 在应用启动时建表（可选）
 
 @app.on_event("startup")
 async def startup_event():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # 执行未完成的数据库迁移（包含建表）
+    await run_migrations(engine)
 
     FastAPICache.init(
         RedisBackend(redis_client),
         prefix="fastapi-cache"   # 缓存 Key 前缀
         )
+    # 订阅会话/助手配置缓存的跨 worker 失效通知
+    app.state.config_invalidation_task = asyncio.create_task(listen_config_invalidations())
+    # 订阅对话取消通知（取消请求可能由其他 worker 收到）
+    app.state.turn_cancellation_task = asyncio.create_task(listen_turn_cancellations())
+    # 启动聊天消息合并写入任务
+    await message_writer.start()
+    # 启动对象存储后台上传队列（同时重放本地 spool 中未完成的上传）
+    await upload_queue.start()
+    # 后台预热工具调用语音提示，不阻塞启动
+    app.state.tts_prewarm_task = asyncio.create_task(prewarm_voice_prompts())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.config_invalidation_task.cancel()
+    app.state.turn_cancellation_task.cancel()
+    # 停止未完成的语音提示预热（其合成请求使用下面关闭的共享连接池）
+    app.state.tts_prewarm_task.cancel()
+    await asyncio.gather(app.state.tts_prewarm_task, return_exceptions=True)
+    # 等待后台任务（如会话摘要）结束
+    await shutdown_background_tasks()
+    # 写完队列中已提交的聊天消息
+    await message_writer.stop()
+    # 等待后台上传完成，未完成的写入本地 spool
+    await upload_queue.stop()
+    # 关闭语音接口共享连接池
+    await close_http_session()
+    # 写完日志队列中剩余的日志
+    stop_logging()
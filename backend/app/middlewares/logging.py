@@ -1,57 +1,109 @@
+"""
+logging.py - 请求日志中间件（纯 ASGI 实现）
+----------------------------------------------
+- 只包装 receive / send，不缓冲响应体：SSE 等流式响应照常逐帧下发；
+- 请求体只在 content-type 命中白名单时记录，且最多记录 max_body_bytes 字节，
+  只截取应用自己读取的部分，不额外读取请求体（/completions 的 base64 音频不会被整体缓冲）；
+- 日志写入经 logging_config 的队列交给后台线程，中间件本身不做文件 I/O。
+"""
 import time
-from typing import Optional, List
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Iterable, List, Optional
 
 from backend.app.core.logging_config import get_logger
 
 logger = get_logger(__name__)
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+DEFAULT_BODY_CONTENT_TYPES = ("application/json", "application/x-www-form-urlencoded", "text/plain")
+
+
+class LoggingMiddleware:
     def __init__(
         self,
         app,
         skip_paths: Optional[List[str]] = None,
-        log_body: bool = False
+        log_body: bool = False,
+        max_body_bytes: int = 1024,
+        body_content_types: Iterable[str] = DEFAULT_BODY_CONTENT_TYPES,
     ):
-        super().__init__(app)
-        self.skip_paths = skip_paths or []
-        self.log_body = log_body
+        """
+        :param skip_paths: 不记录日志的路径前缀
+        :param log_body: 是否记录请求体
+        :param max_body_bytes: 请求体最多记录的字节数，超出部分截断
+        :param body_content_types: 记录请求体的 content-type（前缀匹配），其余只记录长度
+        """
+        self.app = app
+        self.skip_paths = tuple(skip_paths or ())
+        self.log_body = log_body and max_body_bytes > 0
+        self.max_body_bytes = max_body_bytes
+        self.body_content_types = tuple(t.lower() for t in body_content_types)
 
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
+    def _should_capture(self, scope) -> bool:
+        if not self.log_body:
+            return False
+        for name, value in scope.get("headers", ()):
+            if name == b"content-type":
+                return value.decode("latin-1").lower().startswith(self.body_content_types)
+        return False
 
-        if any(path.startswith(skip) for skip in self.skip_paths):
-            return await call_next(request)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.skip_paths):
+            await self.app(scope, receive, send)
+            return
 
-        start_time = time.time()
-        method = request.method
+        start_time = time.perf_counter()
+        method, path = scope["method"], scope["path"]
+        capture = self._should_capture(scope)
+        body = bytearray()
+        state = {"body_size": 0, "status": None, "first_byte": None, "sent": 0}
 
-        body_str = ""
-        if self.log_body:
-            try:
-                body_bytes = await request.body()
-                body_str = body_bytes.decode("utf-8")
-            except Exception:
-                body_str = "<Failed to read body>"
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                state["body_size"] += len(chunk)
+                room = self.max_body_bytes - len(body)
+                if capture and room > 0:
+                    body.extend(chunk[:room])
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["first_byte"] = time.perf_counter()
+            elif message["type"] == "http.response.body":
+                state["sent"] += len(message.get("body", b""))
+            await send(message)
 
         try:
-            response: Response = await call_next(request)
+            await self.app(scope, receive_wrapper, send_wrapper)
         except Exception as exc:
-            process_time = (time.time() - start_time) * 1000
+            process_time = (time.perf_counter() - start_time) * 1000
             logger.error(
                 f"[ERROR] {method} {path} failed in {process_time:.2f}ms\n"
                 f"Exception: {str(exc)}\n"
-                f"Body: {body_str if self.log_body else '[Not Logged]'}",
+                f"Body: {self._format_body(body, state['body_size'], capture)}",
                 exc_info=True
             )
             raise
 
-        process_time = (time.time() - start_time) * 1000
+        end_time = time.perf_counter()
+        # 流式响应的总耗时包含整个推流过程，另外记录首字节时间
+        first_byte = state["first_byte"] or end_time
         logger.info(
             f"[SUCCESS] {method} {path} "
-            f"Status: {response.status_code} "
-            f"Time: {process_time:.2f}ms"
-            + (f" Body: {body_str}" if self.log_body else "")
+            f"Status: {state['status']} "
+            f"Time: {(end_time - start_time) * 1000:.2f}ms "
+            f"TTFB: {(first_byte - start_time) * 1000:.2f}ms "
+            f"Sent: {state['sent']}B"
+            + (f" Body: {self._format_body(body, state['body_size'], capture)}" if self.log_body else "")
         )
-        return response
\ No newline at end of file
+
+    def _format_body(self, body: bytearray, size: int, capture: bool) -> str:
+        if not self.log_body:
+            return "[Not Logged]"
+        if not capture:
+            return f"[{size} bytes not logged]" if size else ""
+        text = body.decode("utf-8", errors="replace")
+        if size > len(body):
+            text += f"...[truncated, {size} bytes]"
+        return text
@@ -0,0 +1,102 @@
+"""
+迁移脚本公用的 DDL 工具函数。
+
+所有函数均为幂等操作（先检查再变更），MySQL 下优先使用在线 DDL
+（ADD COLUMN 使用 ALGORITHM=INSTANT，ADD INDEX 使用 ALGORITHM=INPLACE, LOCK=NONE），
+执行期间不阻塞表的读写。
+"""
+from typing import Sequence
+
+from sqlalchemy import inspect, text, Table
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from backend.app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _is_mysql(conn: AsyncConnection) -> bool:
+    return conn.dialect.name == "mysql"
+
+
+async def has_table(conn: AsyncConnection, table: str) -> bool:
+    return await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(table))
+
+
+async def has_column(conn: AsyncConnection, table: str, column: str) -> bool:
+    columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns(table))
+    return any(c["name"] == column for c in columns)
+
+
+async def has_index(conn: AsyncConnection, table: str, index: str) -> bool:
+    def _indexes(sync_conn):
+        inspector = inspect(sync_conn)
+        names = {i["name"] for i in inspector.get_indexes(table)}
+        names.update(c["name"] for c in inspector.get_unique_constraints(table))
+        return names
+    return index in await conn.run_sync(_indexes)
+
+
+async def create_table(conn: AsyncConnection, table: Table) -> bool:
+    """按模型定义创建表（已存在则跳过），同时创建模型中声明的索引"""
+    if await has_table(conn, table.name):
+        return False
+    await conn.run_sync(lambda sync_conn: table.create(sync_conn, checkfirst=True))
+    return True
+
+
+async def add_column(conn: AsyncConnection, table: str, column: str, ddl: str) -> bool:
+    """
+    添加列（已存在则跳过）。
+
+    参数:
+        table: 表名
+        column: 列名
+        ddl: 列定义，例如 "INT NULL COMMENT 'xx'"
+
+    返回:
+        bool: 是否实际执行了变更
+    """
+    if await has_column(conn, table, column):
+        return False
+    statement = f"ALTER TABLE `{table}` ADD COLUMN `{column}` {ddl}"
+    if _is_mysql(conn):
+        try:
+            await conn.execute(text(statement + ", ALGORITHM=INSTANT"))
+            return True
+        except DBAPIError as e:
+            # 低版本 MySQL 不支持 INSTANT，回退为默认算法
+            logger.warning(f"instant add column {table}.{column} not supported, fallback: {e.orig}")
+    await conn.execute(text(statement))
+    return True
+
+
+async def add_index(conn: AsyncConnection, table: str, index: str, columns: Sequence[str], unique: bool = False) -> bool:
+    """
+    添加索引（已存在则跳过），MySQL 下使用在线 DDL，不锁表。
+
+    返回:
+        bool: 是否实际执行了变更
+    """
+    if await has_index(conn, table, index):
+        return False
+    cols = ", ".join(f"`{c}`" for c in columns)
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    if _is_mysql(conn):
+        await conn.execute(text(
+            f"ALTER TABLE `{table}` ADD {kind} `{index}` ({cols}), ALGORITHM=INPLACE, LOCK=NONE"
+        ))
+    else:
+        await conn.execute(text(f"CREATE {kind} {index} ON {table} ({cols})"))
+    return True
+
+
+async def drop_index(conn: AsyncConnection, table: str, index: str) -> bool:
+    if not await has_index(conn, table, index):
+        return False
+    if _is_mysql(conn):
+        await conn.execute(text(f"ALTER TABLE `{table}` DROP INDEX `{index}`, ALGORITHM=INPLACE, LOCK=NONE"))
+    else:
+        await conn.execute(text(f"DROP INDEX {index}"))
+    return True
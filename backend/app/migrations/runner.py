@@ -0,0 +1,89 @@
+"""
+版本化数据库迁移执行器。
+
+- 已执行的版本记录在 schema_migrations 表中，启动时按版本号顺序执行未执行的迁移；
+- MySQL 下通过 GET_LOCK 保证多个 worker 同时启动时只有一个在执行迁移；
+- 每个迁移模块提供 VERSION、DESCRIPTION 与 async upgrade(conn)，且应保证幂等。
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, DateTime, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from backend.app.core.logging_config import get_logger
+from backend.app.migrations import (
+    v0001_baseline,
+    v0002_assistant_audio_encoding,
+    v0003_chat_message_thread_index,
+    v0004_chat_message_token_count,
+    v0005_thread_summary,
+    v0006_chat_turn,
+    v0007_session_list_index,
+    v0008_chat_branch,
+)
+
+logger = get_logger(__name__)
+
+# 按版本号排列的迁移列表，新增迁移时追加到末尾
+MIGRATIONS = [
+    v0001_baseline,
+    v0002_assistant_audio_encoding,
+    v0003_chat_message_thread_index,
+    v0004_chat_message_token_count,
+    v0005_thread_summary,
+    v0006_chat_turn,
+    v0007_session_list_index,
+    v0008_chat_branch,
+]
+
+MIGRATION_LOCK_NAME = "schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 600
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+async def run_migrations(engine: AsyncEngine) -> list[int]:
+    """
+    执行所有未执行的迁移。
+
+    返回:
+        list[int]: 本次执行的迁移版本号
+    """
+    applied_now = []
+    async with engine.connect() as conn:
+        is_mysql = conn.dialect.name == "mysql"
+        if is_mysql:
+            locked = await conn.scalar(
+                text("SELECT GET_LOCK(:name, :timeout)"),
+                {"name": MIGRATION_LOCK_NAME, "timeout": MIGRATION_LOCK_TIMEOUT},
+            )
+            if locked != 1:
+                raise RuntimeError("failed to acquire schema migration lock")
+        try:
+            await conn.run_sync(_metadata.create_all)
+            await conn.commit()
+
+            applied = set((await conn.scalars(select(schema_migrations.c.version))).all())
+            for migration in sorted(MIGRATIONS, key=lambda m: m.VERSION):
+                if migration.VERSION in applied:
+                    continue
+                logger.info(f"applying migration v{migration.VERSION:04d}: {migration.DESCRIPTION}")
+                await migration.upgrade(conn)
+                await conn.execute(schema_migrations.insert().values(
+                    version=migration.VERSION,
+                    description=migration.DESCRIPTION,
+                    applied_at=datetime.now(),
+                ))
+                await conn.commit()
+                applied_now.append(migration.VERSION)
+        finally:
+            if is_mysql:
+                await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK_NAME})
+    return applied_now
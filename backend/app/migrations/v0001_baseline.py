@@ -0,0 +1,16 @@
+"""
+基线：按当前模型创建缺失的表（替代原先启动时的 Base.metadata.create_all）。
+已存在的表不做修改，后续结构变更由之后的迁移完成。
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from backend.app.core.database import Base
+# 导入全部模型，确保其注册到 Base.metadata
+from backend.app.models import assistant_config, chat_config, chat_message, session_assistant  # noqa: F401
+
+VERSION = 1
+DESCRIPTION = "baseline tables"
+
+
+async def upgrade(conn: AsyncConnection):
+    await conn.run_sync(Base.metadata.create_all)
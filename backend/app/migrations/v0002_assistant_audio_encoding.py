@@ -0,0 +1,16 @@
+"""
+assistant 表新增 TTS 音频编码列（早于迁移机制创建的库中缺失该列）。
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from backend.app.migrations.helpers import add_column
+
+VERSION = 2
+DESCRIPTION = "assistant.audio_encoding"
+
+
+async def upgrade(conn: AsyncConnection):
+    await add_column(
+        conn, "assistant", "audio_encoding",
+        "VARCHAR(16) NOT NULL DEFAULT 'wav' COMMENT 'TTS 音频编码（wav/mp3/ogg_opus）'",
+    )
@@ -0,0 +1,15 @@
+"""
+chat_message 热点查询索引：
+- (thread_id, id)：按会话取最近 N 条消息（WHERE thread_id=? ORDER BY id DESC LIMIT n）
+  以及按 id 游标翻页，避免全表扫描与 filesort。
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from backend.app.migrations.helpers import add_index
+
+VERSION = 3
+DESCRIPTION = "chat_message (thread_id, id) index"
+
+
+async def upgrade(conn: AsyncConnection):
+    await add_index(conn, "chat_message", "ix_chat_message_thread_id_id", ["thread_id", "id"])
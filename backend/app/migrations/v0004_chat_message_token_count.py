@@ -0,0 +1,18 @@
+"""
+chat_message 新增 token_count 列（按 token 预算截取历史窗口），
+并新增覆盖索引 (thread_id, id, token_count)：选取窗口时只扫描索引，不回表。
+v0003 的 (thread_id, id) 是该索引的前缀，随之删除，减少写入时的索引维护。
+历史数据 token_count 为 NULL，查询时按正文长度估算。
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from backend.app.migrations.helpers import add_column, add_index, drop_index
+
+VERSION = 4
+DESCRIPTION = "chat_message.token_count"
+
+
+async def upgrade(conn: AsyncConnection):
+    await add_column(conn, "chat_message", "token_count", "INT NULL COMMENT '消息 token 数'")
+    await add_index(conn, "chat_message", "ix_chat_message_thread_id_id_tokens", ["thread_id", "id", "token_count"])
+    await drop_index(conn, "chat_message", "ix_chat_message_thread_id_id")
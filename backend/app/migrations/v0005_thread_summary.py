@@ -0,0 +1,22 @@
+"""
+会话滚动摘要：assistant 表新增摘要开关与触发阈值，新建 thread_summary 表。
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from backend.app.migrations.helpers import add_column, create_table
+from backend.app.models.thread_summary import ThreadSummary
+
+VERSION = 5
+DESCRIPTION = "thread_summary"
+
+
+async def upgrade(conn: AsyncConnection):
+    await add_column(
+        conn, "assistant", "summary_enabled",
+        "TINYINT(1) NOT NULL DEFAULT 0 COMMENT '是否开启会话滚动摘要'",
+    )
+    await add_column(
+        conn, "assistant", "summary_trigger_tokens",
+        "INT NOT NULL DEFAULT 3000 COMMENT '未摘要消息超过该 token 数时生成摘要'",
+    )
+    await create_table(conn, ThreadSummary.__table__)
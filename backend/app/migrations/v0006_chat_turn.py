@@ -0,0 +1,14 @@
+"""
+新建 chat_turn 表：记录每轮对话的执行状态（消息改为生成过程中逐条落库）。
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from backend.app.migrations.helpers import create_table
+from backend.app.models.chat_turn import ChatTurn
+
+VERSION = 6
+DESCRIPTION = "chat_turn"
+
+
+async def upgrade(conn: AsyncConnection):
+    await create_table(conn, ChatTurn.__table__)
@@ -0,0 +1,13 @@
+"""
+session 表新增 (created_at, session_id) 索引：会话列表按创建时间倒序键集分页。
+"""
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from backend.app.migrations.helpers import add_index
+
+VERSION = 7
+DESCRIPTION = "session (created_at, session_id) index"
+
+
+async def upgrade(conn: AsyncConnection):
+    await add_index(conn, "session", "ix_session_created_at_session_id", ["created_at", "session_id"])
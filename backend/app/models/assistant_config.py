@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime, UTC
 
-from sqlalchemy import Column, String, TIMESTAMP, Integer, Text, DECIMAL
+from sqlalchemy import Column, String, TIMESTAMP, Integer, Text, DECIMAL, Boolean
 
 from backend.app.core.database import Base
 
@@ -22,12 +22,15 @@ class Assistant(Base):
 
     prompt_text = Column(Text,default="你是一个助手")
     window_size = Column(Integer, default=30)
+    summary_enabled = Column(Boolean, nullable=False, default=False, comment='是否开启会话滚动摘要')
+    summary_trigger_tokens = Column(Integer, nullable=False, default=3000, comment='未摘要消息超过该 token 数时生成摘要')
 
     voice_type = Column(String(100), nullable=False, default='甜美教学小源')
     voice_name = Column(String(100),nullable=False,default='甜美教学小源')
 
 
     speed_ratio = Column(DECIMAL(5, 2), default=1.00)
+    audio_encoding = Column(String(16), nullable=False, default='wav', comment='TTS 音频编码（wav/mp3/ogg_opus）')
     created_at = Column(TIMESTAMP, default=datetime.now(UTC))
     updated_at = Column(TIMESTAMP, default=datetime.now(UTC), onupdate=datetime.now(UTC))
 
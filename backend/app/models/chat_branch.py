@@ -0,0 +1,24 @@
+from datetime import datetime, UTC
+
+from sqlalchemy import Column, String, TIMESTAMP, Integer, JSON
+
+from backend.app.core.database import Base
+
+
+class ChatBranch(Base):
+    """
+    对话分支：从某条消息处分叉出的一条新对话路径，分叉点之前的消息与父分支共享，不复制。
+
+    ancestry 物化了从根分支到本分支的祖先路径 [[branch_id, until_id], ...]：
+    祖先分支中 id <= until_id 的消息对本分支可见，再加上本分支自己的全部消息。
+    读取任意分支的历史只需一次主键查询取得 ancestry，无需递归回溯父分支。
+    """
+    __tablename__ = "chat_branch"
+
+    branch_id = Column(String(64), primary_key=True, comment="分支ID")
+    thread_id = Column(String(64), nullable=False, index=True, comment="对话线程ID")
+    parent_branch_id = Column(String(64), nullable=False, comment="父分支ID")
+    fork_message_id = Column(Integer, nullable=False, comment="父分支上最后一条可见消息的主键id")
+    fork_langgraph_id = Column(String(64), nullable=True, comment="分叉点消息 LangGraph UUID")
+    ancestry = Column(JSON, nullable=False, comment="祖先路径 [[branch_id, until_id], ...]")
+    created_at = Column(TIMESTAMP, default=lambda: datetime.now(UTC))
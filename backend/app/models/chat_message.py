@@ -6,13 +6,19 @@ from backend.app.core.database import Base
 
 
 from sqlalchemy import (
-    Column, Integer, String, Text, JSON, TIMESTAMP
+    Column, Integer, String, Text, JSON, TIMESTAMP, Index
 )
 from datetime import datetime, UTC
 
 
 class ChatMessage(Base):
     __tablename__ = "chat_message"
+    __table_args__ = (
+        # 按会话取最近消息 / 游标翻页 / 按 token 预算选取历史窗口（覆盖索引）
+        Index("ix_chat_message_thread_id_id_tokens", "thread_id", "id", "token_count"),
+        # 按分支段取消息 / 按 token 预算选取分支历史窗口（覆盖索引）
+        Index("ix_chat_message_branch_id_id_tokens", "branch_id", "id", "token_count"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True, comment="主键id，自增")
 
@@ -23,6 +29,8 @@ class ChatMessage(Base):
     artifact = Column(Text, comment="生成的副产物（如代码、文档等）")
 
     thread_id = Column(String(64), nullable=False, comment="属于哪个对话线程")
+    # 根分支的 branch_id 即 thread_id，重新生成/编辑时分叉出的分支见 chat_branch 表
+    branch_id = Column(String(64), nullable=True, comment="所属分支ID")
 
     tool_calls = Column(JSON, comment="工具调用信息（JSON格式）")
 
@@ -31,5 +39,6 @@ class ChatMessage(Base):
     name = Column(String(255), comment="工具调用名")
     message_group_id = Column(String(64), comment="消息分组ID")
     tts_key=Column(String(255),comment="对象存储key",nullable=True)
+    token_count = Column(Integer, nullable=True, comment="消息 token 数")
     created_at = Column(TIMESTAMP, default=datetime.now(UTC))
     updated_at = Column(TIMESTAMP, default=datetime.now(UTC), onupdate=datetime.now(UTC))
@@ -0,0 +1,25 @@
+from datetime import datetime, UTC
+
+from sqlalchemy import Column, String, TIMESTAMP, Integer, Index
+
+from backend.app.core.database import Base
+
+
+class ChatTurn(Base):
+    """
+    一轮对话（用户输入 + 模型/工具的全部响应）的执行状态。
+    消息在生成过程中逐条落库，status 为 running 且长时间未更新的轮次即为中途中断的轮次。
+    """
+    __tablename__ = "chat_turn"
+    __table_args__ = (
+        Index("ix_chat_turn_status_updated_at", "status", "updated_at"),
+    )
+
+    # 与该轮消息的 message_group_id 相同（即用户消息的 langgraph_id）
+    turn_id = Column(String(64), primary_key=True, comment="轮次ID")
+    thread_id = Column(String(64), nullable=False, index=True, comment="属于哪个对话线程")
+    status = Column(String(16), nullable=False, default="running", comment="running/completed/failed/cancelled")
+    message_count = Column(Integer, nullable=False, default=0, comment="已落库的消息数")
+    created_at = Column(TIMESTAMP, default=datetime.now(UTC))
+    updated_at = Column(TIMESTAMP, default=datetime.now(UTC), onupdate=datetime.now(UTC))
+    finished_at = Column(TIMESTAMP, nullable=True, comment="结束时间")
@@ -1,12 +1,16 @@
 from datetime import datetime, UTC
 
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey
+from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Index
 
 from backend.app.core.database import Base
 
 
 class SessionAssistant(Base):
     __tablename__ = "session"
+    __table_args__ = (
+        # 会话列表按 (created_at, session_id) 倒序键集分页
+        Index("ix_session_created_at_session_id", "created_at", "session_id"),
+    )
 
     session_id = Column(String(64), primary_key=True, index=True)
     assistant_id = Column(
@@ -14,5 +18,8 @@ class SessionAssistant(Base):
         ForeignKey("assistant.id", onupdate="CASCADE", ondelete="CASCADE"),
         nullable=False
     )
-    created_at = Column(DateTime, default=datetime.now(UTC))
-    updated_at = Column(DateTime, default=datetime.now(UTC), onupdate=datetime.now(UTC))
\ No newline at end of file
+    # 当前选中的分支，为空表示根分支（branch_id 即 session_id）
+    active_branch_id = Column(String(64), nullable=True)
+    # 传入函数而非调用结果，每条记录取写入时的时间（会话列表按创建时间排序）
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+    updated_at = Column(DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
\ No newline at end of file
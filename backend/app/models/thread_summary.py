@@ -0,0 +1,22 @@
+from datetime import datetime, UTC
+
+from sqlalchemy import Column, String, TIMESTAMP, Integer, Text
+
+from backend.app.core.database import Base
+
+
+class ThreadSummary(Base):
+    """
+    会话线程的滚动摘要：covered_until_id 及之前的消息已折叠进摘要，
+    之后的消息仍以原文参与上下文。
+    """
+    __tablename__ = "thread_summary"
+
+    # 摘要按分支保存：根分支的 branch_id 即 thread_id，其他分支为 chat_branch.branch_id
+    thread_id = Column(String(64), primary_key=True, comment="对话线程ID（分支ID）")
+    content = Column(Text, nullable=False, comment="摘要内容")
+    covered_until_id = Column(Integer, nullable=False, comment="已折叠的最后一条消息主键id")
+    covered_until_langgraph_id = Column(String(64), nullable=False, comment="已折叠的最后一条消息 LangGraph UUID")
+    token_count = Column(Integer, nullable=False, default=0, comment="摘要 token 数")
+    created_at = Column(TIMESTAMP, default=datetime.now(UTC))
+    updated_at = Column(TIMESTAMP, default=datetime.now(UTC), onupdate=datetime.now(UTC))
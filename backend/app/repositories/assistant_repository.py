@@ -1,3 +1,5 @@
+from typing import Optional, Sequence
+
 from fastapi import HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -10,4 +12,26 @@ async def get_assistant_by_id(assistant_id: int, db: AsyncSession):
     assistant = result.scalar_one_or_none()
     if not assistant:
         raise HTTPException(status_code=404, detail="Assistant not found")
-    return assistant
\ No newline at end of file
+    return assistant
+
+
+async def list_assistants_page(
+        db: AsyncSession,
+        limit: int,
+        after_id: Optional[int] = None,
+        columns: Optional[Sequence] = None,
+):
+    """
+    按 id 键集分页获取助手列表。
+
+    参数:
+        limit: 返回数量
+        after_id: 只取 id 大于该值的助手（上一页最后一个助手的 id）
+        columns: 只查询指定列（返回行），为空时返回完整的 Assistant 对象
+    """
+    stmt = select(*columns) if columns else select(Assistant)
+    if after_id is not None:
+        stmt = stmt.where(Assistant.id > after_id)
+    stmt = stmt.order_by(Assistant.id).limit(limit)
+    result = await db.execute(stmt)
+    return result.all() if columns else result.scalars().all()
@@ -0,0 +1,49 @@
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.models.chat_branch import ChatBranch
+from backend.app.models.session_assistant import SessionAssistant
+
+
+async def get_branch(db: AsyncSession, branch_id: str) -> Optional[ChatBranch]:
+    result = await db.execute(select(ChatBranch).where(ChatBranch.branch_id == branch_id))
+    return result.scalar_one_or_none()
+
+
+async def insert_branch(db: AsyncSession, branch: ChatBranch):
+    """新增分支（未自动提交）"""
+    db.add(branch)
+
+
+async def list_branches(db: AsyncSession, thread_id: str) -> list[ChatBranch]:
+    """按创建时间获取线程的全部分支（不含根分支）"""
+    result = await db.execute(
+        select(ChatBranch).where(ChatBranch.thread_id == thread_id).order_by(ChatBranch.created_at)
+    )
+    return list(result.scalars().all())
+
+
+async def get_active_branch(db: AsyncSession, thread_id: str) -> Optional[tuple[Optional[str], Optional[list]]]:
+    """
+    一次联表查询获取会话当前分支及其祖先路径，返回 (active_branch_id, ancestry)；
+    根分支时两者均为 None，会话不存在时返回 None。
+    """
+    result = await db.execute(
+        select(SessionAssistant.active_branch_id, ChatBranch.ancestry)
+        .outerjoin(ChatBranch, ChatBranch.branch_id == SessionAssistant.active_branch_id)
+        .where(SessionAssistant.session_id == thread_id)
+    )
+    row = result.first()
+    return tuple(row) if row else None
+
+
+async def set_active_branch(db: AsyncSession, thread_id: str, branch_id: Optional[str]) -> bool:
+    """切换会话当前分支（None 表示根分支，未自动提交），返回会话是否存在"""
+    result = await db.execute(
+        update(SessionAssistant)
+        .where(SessionAssistant.session_id == thread_id)
+        .values(active_branch_id=branch_id)
+    )
+    return result.rowcount > 0
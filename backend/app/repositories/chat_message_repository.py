@@ -1,17 +1,11 @@
-
-
-
-from typing import Optional, List
-from sqlalchemy import select, update, text, Result
+from typing import Optional, Sequence
+from sqlalchemy import select, func, or_, and_, union_all
 
 from backend.app.models.chat_message import ChatMessage
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.sql import text
-from sqlalchemy.engine import Result
 
-from typing import List
-import json
+
 async def insert_message(
     message: ChatMessage,
     db: AsyncSession,
@@ -44,130 +38,208 @@ async def insert_messages_batch(
 
 
 
-async def get_messages_by_thread_id(
+# 分支可见范围：按时间顺序排列的 (branch_id, until_id) 段，until_id 为 None 表示不设上限。
+# 各段的 id 区间互不重叠且依次递增（子分支的消息都在分叉之后写入），见 models.chat_branch。
+Segments = Sequence[tuple[str, Optional[int]]]
+
+
+def _segment_filters(branch_id: str, until_id: Optional[int]) -> list:
+    filters = [ChatMessage.branch_id == branch_id]
+    if until_id is not None:
+        filters.append(ChatMessage.id <= until_id)
+    return filters
+
+
+async def _scan_segments(db: AsyncSession, stmt, segments: Segments, limit: int, newest_first: bool = True) -> list:
+    """
+    按分支段逐段执行查询（每段走 (branch_id, id) 索引的一个范围），凑够 limit 行即停止。
+    newest_first 时从最新的段往前取、每段按 id 倒序，否则从最早的段往后取、按 id 正序。
+    """
+    rows = []
+    order = ChatMessage.id.desc() if newest_first else ChatMessage.id
+    for branch_id, until_id in (reversed(segments) if newest_first else segments):
+        remaining = limit - len(rows)
+        if remaining <= 0:
+            break
+        result = await db.execute(stmt.where(*_segment_filters(branch_id, until_id)).order_by(order).limit(remaining))
+        rows.extend(result.all())
+    return rows
+
+
+async def get_messages_in_segments(
         db: AsyncSession,
-        thread_id: str,
+        segments: Segments,
         limit: int,
-        langgraph_id: Optional[str] = None
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
 ) -> list[ChatMessage]:
     """
-    根据会话 ID 获取对应的聊天消息记录（支持基于 langgraph_id 的历史回溯查询）。
+    获取分支可见的聊天消息（按 id 的键集分页）。
 
     参数:
         db (AsyncSession): 异步数据库会话对象。
-        session_id (str): 会话的唯一标识。
+        segments (Segments): 分支可见范围。
         limit (int): 限制返回的消息数量。
-        langgraph_id (Optional[str]): （可选）若提供，则只返回在此消息之前的消息。
+        before_id (Optional[int]): （可选）只取 id 小于该值的消息中最新的 limit 条（向前翻页）。
+        after_id (Optional[int]): （可选）只取 id 大于该值的消息中最早的 limit 条（获取新消息）。
 
     返回:
         list[ChatMessage]: 返回按时间正序排列的消息列表。
     """
-
-    # 如果提供了 langgraph_id，则查找对应的消息 ID（ChatMessage.id）
-    before_id = None
-    if langgraph_id:
-
-        return await get_message_chain(db, langgraph_id, thread_id)
-
-    # 构建主查询：按 session_id 获取未被逻辑删除的消息
-    stmt = (
-        select(ChatMessage)
-        .where(ChatMessage.thread_id == thread_id)
-
-    )
+    stmt = select(ChatMessage)
+    if after_id is not None:
+        # 从 after_id 之后按时间正序取
+        rows = await _scan_segments(db, stmt.where(ChatMessage.id > after_id), segments, limit, newest_first=False)
+        return [row[0] for row in rows]
 
     # 如果设置了 before_id，则只取比该 ID 更早的消息
     if before_id is not None:
         stmt = stmt.where(ChatMessage.id < before_id)
-
-    # 按消息 ID 降序排列（从最新往前取），并限制返回数量
-    stmt = stmt.order_by(ChatMessage.id.desc()).limit(limit)
-
-    # 执行查询并获取结果
-    result = await db.execute(stmt)
-    messages = result.scalars().all()
-
+    rows = await _scan_segments(db, stmt, segments, limit)
     # 返回按 ID 升序（即时间正序）的消息列表
-    return list(reversed(messages))
-
+    return [row[0] for row in reversed(rows)]
 
 
-async def get_message_chain(db: AsyncSession, langgraph_id: str,thread_id:str) -> List[ChatMessage]:
-    sql = text("""
-        WITH RECURSIVE message_chain AS (
-            SELECT * FROM chat_message WHERE langgraph_id = :langgraph_id and thread_id = :thread_id
-            UNION ALL
-            SELECT m.* FROM chat_message m
-            JOIN message_chain c ON m.langgraph_id = c.parent_message_id
+async def get_last_message_of_type(
+        db: AsyncSession,
+        segments: Segments,
+        message_type: str,
+        until_id: Optional[int] = None,
+) -> Optional[ChatMessage]:
+    """获取分支可见范围内（id <= until_id）最后一条指定类型的消息"""
+    stmt = select(ChatMessage).where(ChatMessage.type == message_type)
+    if until_id is not None:
+        stmt = stmt.where(ChatMessage.id <= until_id)
+    rows = await _scan_segments(db, stmt, segments, 1)
+    return rows[0][0] if rows else None
+
+
+async def get_segments_previews_and_counts(
+        db: AsyncSession,
+        views: dict[str, Segments],
+        preview_chars: int = 100,
+) -> dict[str, tuple[Optional[str], int]]:
+    """
+    批量获取多个分支可见范围的最后一条消息预览（human/ai 且内容非空）及消息数，返回 key -> (预览, 消息数)。
+    共两次查询：消息数按分支分组计数（只扫描 (branch_id, id) 索引），
+    预览为各段「按 id 倒序取第一条」的 UNION ALL，再按可见范围取 id 最大的一条。
+    各分支只属于一个会话，同一分支在不同可见范围中不会以不同的上限出现。
+    """
+    segments = [(key, branch_id, until_id) for key, view in views.items() for branch_id, until_id in view]
+    if not segments:
+        return {}
+    result = await db.execute(
+        select(ChatMessage.branch_id, func.count())
+        .where(or_(*(and_(*_segment_filters(branch_id, until_id)) for _, branch_id, until_id in segments)))
+        .group_by(ChatMessage.branch_id)
+    )
+    counts = dict(result.all())
+
+    previews = [
+        select(ChatMessage.branch_id, ChatMessage.id, func.left(ChatMessage.content, preview_chars))
+        .where(
+            *_segment_filters(branch_id, until_id),
+            ChatMessage.type.in_(("human", "ai")),
+            ChatMessage.content != "",
         )
-        SELECT * FROM message_chain
-        ORDER BY id ASC;
-    """)
-
-    result: Result = await db.execute(sql, {"langgraph_id": langgraph_id, "thread_id": thread_id})
-
-    rows = result.mappings().all()
-
-    messages = []
-    for row in rows:
-        row_dict = dict(row)
-
-        # 👇 修正 JSON 字段（防止 tool_calls 是字符串 'null'）
-        tool_calls = row_dict.get("tool_calls")
-        if isinstance(tool_calls, str):
-            try:
-                row_dict["tool_calls"] = json.loads(tool_calls)
-            except json.JSONDecodeError:
-                row_dict["tool_calls"] = None
-
-        messages.append(ChatMessage(**row_dict))
-
-    return messages
-
-
-async def get_ids_after_langgraph_id(
-    db: AsyncSession,
-    session_id: str,
-    langgraph_id: str
-) -> List[int]:
+        .order_by(ChatMessage.id.desc())
+        .limit(1)
+        for _, branch_id, until_id in segments
+    ]
+    owner = {branch_id: key for key, branch_id, _ in segments}
+    latest: dict[str, tuple[int, str]] = {}
+    result = await db.execute(previews[0] if len(previews) == 1 else union_all(*previews))
+    for branch_id, message_id, preview in result.all():
+        key = owner[branch_id]
+        if key not in latest or message_id > latest[key][0]:
+            latest[key] = (message_id, preview)
+
+    return {
+        key: (latest[key][1] if key in latest else None, sum(counts.get(branch_id, 0) for branch_id, _ in view))
+        for key, view in views.items()
+    }
+
+
+# 构造对话历史所需的列（langgraph_id 以 id 返回，与历史记录结构一致）
+HISTORY_COLUMNS = (
+    ChatMessage.langgraph_id.label("id"),
+    ChatMessage.type,
+    ChatMessage.content,
+    ChatMessage.tool_calls,
+    ChatMessage.tool_call_id,
+    ChatMessage.name,
+    ChatMessage.artifact,
+    ChatMessage.tts_key,
+    ChatMessage.token_count,
+    ChatMessage.message_group_id,
+)
+
+
+async def get_messages_by_token_budget(
+        db: AsyncSession,
+        segments: Segments,
+        limit: int,
+        max_tokens: Optional[int],
+        from_id: Optional[int] = None,
+) -> tuple[list[dict], bool]:
     """
-    获取指定 langgraph_id 对应消息及其之后的所有消息 ID（同一 session 中，未被逻辑删除）。
+    按 token 预算获取分支最近的消息：先逐段只扫描 (branch_id, id, token_count) 覆盖索引，
+    从最新往前累加 token 数确定起点，再用 Core 只查询起点之后构造历史所需的列（HISTORY_COLUMNS）。
+
+    返回的消息包含第一条超出预算的消息（调用方据此确认预算已用尽），
+    历史数据 token_count 为 NULL 时按 0 计（多取不少取，由调用方精确计算）。
 
     参数:
         db (AsyncSession): 异步数据库会话对象。
-        session_id (str): 聊天会话的唯一标识。
-        langgraph_id (str): 起始消息的 langgraph 唯一标识。
+        segments (Segments): 分支可见范围。
+        limit (int): 最多返回的消息数量。
+        max_tokens (Optional[int]): token 预算，None 表示不限。
+        from_id (Optional[int]): （可选）只取 id >= from_id 的消息（如摘要已覆盖的位置）。
 
     返回:
-        List[int]: 所有满足条件的消息 ID 列表（按 ID 升序排列）。
+        tuple[list[dict], bool]: 按时间正序排列的历史记录，以及是否已取到范围内的全部消息。
     """
+    if from_id is not None:
+        # 只保留与 id >= from_id 有交集的段
+        segments = [(b, u) for b, u in segments if u is None or u >= from_id]
+    stmt = select(ChatMessage.id, func.coalesce(ChatMessage.token_count, 0))
+    if from_id is not None:
+        stmt = stmt.where(ChatMessage.id >= from_id)
+    rows = await _scan_segments(db, stmt, segments, limit)
+    if not rows:
+        return [], True
+
+    total = 0
+    start_id = rows[-1][0]
+    complete = len(rows) < limit
+    for message_id, tokens in rows:
+        total += tokens
+        if max_tokens is not None and total > max_tokens:
+            start_id, complete = message_id, False
+            break
+
+    stmt = select(*HISTORY_COLUMNS).where(ChatMessage.id >= start_id)
+    segments = [(b, u) for b, u in segments if u is None or u >= start_id]
+    result = await _scan_segments(db, stmt, segments, len(rows), newest_first=False)
+    return [dict(row._mapping) for row in result], complete
+
+
+async def get_messages_after_id(
+        db: AsyncSession,
+        segments: Segments,
+        after_id: Optional[int],
+        limit: int,
+) -> list[ChatMessage]:
+    """
+    获取分支可见范围内 id > after_id 的消息（按时间正序，最多 limit 条），after_id 为 None 时从头开始。
+    """
+    stmt = select(ChatMessage)
+    if after_id is not None:
+        stmt = stmt.where(ChatMessage.id > after_id)
+        segments = [(b, u) for b, u in segments if u is None or u > after_id]
+    rows = await _scan_segments(db, stmt, segments, limit, newest_first=False)
+    return [row[0] for row in rows]
 
-    # 查找 langgraph_id 对应的消息 ID（仅限有效消息）
-    sub_stmt = (
-        select(ChatMessage.id)
-
-        .where(ChatMessage.langgraph_id == langgraph_id,ChatMessage.is_effect == 0)
-        .limit(1)
-    )
-    result = await db.execute(sub_stmt)
-    current_id = result.scalar_one_or_none()
-    # 若未找到对应消息，说明 langgraph_id 不存在或已被删除，直接返回空列表
-    if current_id is None:
-        return []  # 没找到则返回空列表
-
-    # 查找当前消息及其之后（id >= current_id）在同一 session 内的所有有效消息 ID
-    stmt = (
-        select(ChatMessage.id)
-        .where(ChatMessage.session_id == session_id)
-        .where(ChatMessage.is_effect == 0)
-        .where(ChatMessage.id >= current_id)
-        .order_by(ChatMessage.id)
-    )
-    # 执行查询，获取 ID 列表
-    result = await db.execute(stmt)
-    ids = result.scalars().all()
-
-    return ids
 
 async def get_message_by_langgraph_id(
     db: AsyncSession,
@@ -194,28 +266,3 @@ async def get_message_by_langgraph_id(
     # 获取结果（如果没有匹配记录则为 None）
     message = result.scalar_one_or_none()
     return message
-
-async def delete_messages_by_ids(
-    db: AsyncSession,
-    ids: List[int]
-) -> None:
-    """
-    根据给定的消息 ID 列表逻辑删除对应消息（设置 is_effect = 1）。
-
-    参数:
-        db (AsyncSession): 异步数据库会话对象。
-        ids (List[int]): 需要删除的消息 ID 列表。
-
-    返回:
-        None
-    """
-    if not ids:
-        return  # 空列表直接返回，不执行操作
-    # 构造更新语句，将指定 ID 列表中的消息逻辑删除（is_effect = 1）
-    stmt = (
-        update(ChatMessage)
-        .where(ChatMessage.id.in_(ids))
-        .values(is_effect=1)
-    )
-    # 执行更新操作（注意：需要外部手动 commit）
-    await db.execute(stmt)
\ No newline at end of file
@@ -0,0 +1,47 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.models.chat_turn import ChatTurn
+
+
+async def upsert_chat_turn(
+        db: AsyncSession,
+        turn_id: str,
+        thread_id: str,
+        status: str,
+        message_count: int = 0,
+        finished_at: Optional[datetime] = None,
+):
+    """写入或更新轮次状态（未自动提交）"""
+    now = datetime.now()
+    stmt = insert(ChatTurn).values(
+        turn_id=turn_id,
+        thread_id=thread_id,
+        status=status,
+        message_count=message_count,
+        created_at=now,
+        updated_at=now,
+        finished_at=finished_at,
+    )
+    stmt = stmt.on_duplicate_key_update(
+        status=stmt.inserted.status,
+        message_count=stmt.inserted.message_count,
+        updated_at=stmt.inserted.updated_at,
+        finished_at=stmt.inserted.finished_at,
+    )
+    await db.execute(stmt)
+
+
+async def get_unfinished_turns(db: AsyncSession, updated_before: datetime, limit: int = 100) -> list[ChatTurn]:
+    """获取在 updated_before 之前就停止更新、仍处于 running 状态的轮次（进程崩溃等导致的中断）"""
+    result = await db.execute(
+        select(ChatTurn)
+        .where(ChatTurn.status == "running", ChatTurn.updated_at < updated_before)
+        .order_by(ChatTurn.updated_at)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
@@ -1,9 +1,14 @@
 from datetime import datetime, UTC
 
-from sqlalchemy import select
+from typing import Optional
+
+from sqlalchemy import select, or_, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.app.models.assistant_config import Assistant
+from backend.app.models.chat_branch import ChatBranch
 from backend.app.models.session_assistant import SessionAssistant
+from backend.app.repositories.chat_message_repository import get_segments_previews_and_counts
 
 
 async def create_or_update_session(db: AsyncSession, session_id: str, assistant_id: int):
@@ -25,9 +30,79 @@ async def get_session(db: AsyncSession, session_id: str):
     result = await db.execute(select(SessionAssistant).where(SessionAssistant.session_id == session_id))
     return result.scalar_one_or_none()
 
-async def get_all_sessions(db: AsyncSession):
-    result = await db.execute(select(SessionAssistant))
-    return result.scalars().all()
+async def get_session_with_assistant(db: AsyncSession, session_id: str):
+    """一次联表查询同时获取会话及其助手，返回 (SessionAssistant, Assistant)，不存在时返回 None"""
+    result = await db.execute(
+        select(SessionAssistant, Assistant)
+        .join(Assistant, Assistant.id == SessionAssistant.assistant_id)
+        .where(SessionAssistant.session_id == session_id)
+    )
+    row = result.first()
+    return tuple(row) if row else None
+
+async def list_sessions_page(
+        db: AsyncSession,
+        limit: int,
+        after: Optional[tuple[datetime, str]] = None,
+        preview_chars: int = 100,
+) -> list[dict]:
+    """
+    按 (created_at, session_id) 倒序键集分页获取会话列表，同时返回助手名称，
+    以及会话当前分支上的最后一条消息预览和消息数（不含其他分支的消息）。
+    会话一次查询（联表取当前分支的祖先路径），预览与消息数按本页会话批量查询。
+
+    参数:
+        limit: 返回数量
+        after: 上一页最后一个会话的 (created_at, session_id)
+        preview_chars: 消息预览的最大字符数
+
+    返回:
+        dict 列表，字段与 SessionListItem 对应
+    """
+    stmt = (
+        select(
+            SessionAssistant.session_id,
+            SessionAssistant.assistant_id,
+            SessionAssistant.created_at,
+            SessionAssistant.updated_at,
+            Assistant.name.label("assistant_name"),
+            SessionAssistant.active_branch_id,
+            ChatBranch.ancestry,
+        )
+        .outerjoin(Assistant, Assistant.id == SessionAssistant.assistant_id)
+        .outerjoin(ChatBranch, ChatBranch.branch_id == SessionAssistant.active_branch_id)
+    )
+    if after is not None:
+        created_at, session_id = after
+        stmt = stmt.where(or_(
+            SessionAssistant.created_at < created_at,
+            and_(SessionAssistant.created_at == created_at, SessionAssistant.session_id < session_id),
+        ))
+    stmt = stmt.order_by(SessionAssistant.created_at.desc(), SessionAssistant.session_id.desc()).limit(limit)
+    rows = (await db.execute(stmt)).all()
+
+    # 当前分支的可见范围（与 branch_service 一致：未切换过分支或分支不存在时为根分支）
+    views = {}
+    for row in rows:
+        if row.active_branch_id is None or row.ancestry is None:
+            views[row.session_id] = ((row.session_id, None),)
+        else:
+            views[row.session_id] = tuple((b, u) for b, u in row.ancestry) + ((row.active_branch_id, None),)
+    stats = await get_segments_previews_and_counts(db, views, preview_chars)
+
+    items = []
+    for row in rows:
+        preview, count = stats[row.session_id]
+        items.append({
+            "session_id": row.session_id,
+            "assistant_id": row.assistant_id,
+            "created_at": row.created_at,
+            "updated_at": row.updated_at,
+            "assistant_name": row.assistant_name,
+            "last_message_preview": preview,
+            "message_count": count,
+        })
+    return items
 
 async def delete_session(db: AsyncSession, session_id: str):
     result = await db.execute(select(SessionAssistant).where(SessionAssistant.session_id == session_id))
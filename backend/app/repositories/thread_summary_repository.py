@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select, delete, case
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.models.thread_summary import ThreadSummary
+
+
+async def get_thread_summary(db: AsyncSession, thread_id: str) -> Optional[ThreadSummary]:
+    result = await db.execute(select(ThreadSummary).where(ThreadSummary.thread_id == thread_id))
+    return result.scalar_one_or_none()
+
+
+async def upsert_thread_summary(
+        db: AsyncSession,
+        thread_id: str,
+        content: str,
+        covered_until_id: int,
+        covered_until_langgraph_id: str,
+        token_count: int,
+):
+    """
+    写入或更新线程摘要（未自动提交）。
+    仅当新的覆盖位置更靠后时才覆盖，避免并发的旧摘要回写。
+    """
+    now = datetime.now()
+    stmt = insert(ThreadSummary).values(
+        thread_id=thread_id,
+        content=content,
+        covered_until_id=covered_until_id,
+        covered_until_langgraph_id=covered_until_langgraph_id,
+        token_count=token_count,
+        created_at=now,
+        updated_at=now,
+    )
+    newer = stmt.inserted.covered_until_id > ThreadSummary.covered_until_id
+    # MySQL 按顺序执行赋值，covered_until_id 必须最后更新，前面的条件才会比较旧值
+    stmt = stmt.on_duplicate_key_update([
+        (column, case((newer, stmt.inserted[column]), else_=ThreadSummary.__table__.c[column]))
+        for column in ("content", "covered_until_langgraph_id", "token_count", "updated_at", "covered_until_id")
+    ])
+    await db.execute(stmt)
+
+
+async def delete_thread_summary(db: AsyncSession, thread_id: str):
+    await db.execute(delete(ThreadSummary).where(ThreadSummary.thread_id == thread_id))
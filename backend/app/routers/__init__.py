@@ -13,4 +13,4 @@ router.include_router(chat_assistant.router, prefix="/assistants", tags=["assist
 
 router.include_router(session.router, prefix="/session", tags=["session"])
 
-router.include_router(oss.router, prefix="/oss", tags=["oss"])
\ No newline at end of file
+router.include_router(oss.router, prefix="/oss", tags=["oss"])
@@ -1,8 +1,13 @@
+import asyncio
 import base64
 import traceback
+import uuid
+from contextlib import aclosing
+from typing import Optional
 
 
-from fastapi import APIRouter, Path, Body, Depends
+from fastapi import APIRouter, Path, Body, Depends, WebSocket, WebSocketDisconnect, Query, HTTPException, Request
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.responses import StreamingResponse
 
@@ -12,80 +17,359 @@ from backend.app.core.settings import settings
 from backend.app.schemas.completion import CompletionRequest
 from backend.app.services.agent_service import handle_chat_completion
 import backend.app.utils.kobo_util as oss_util
-from backend.app.services.chat_message_service import fetch_valid_langgraph_chat_messages
-from backend.app.utils.redis_util import acquire_lock, release_lock
+from backend.app.repositories.chat_branch_repository import get_branch
+from backend.app.schemas.chat_branch import ChatBranchCreate, ChatBranchList, ChatBranchOut
+from backend.app.schemas.chat_message import ChatMessagePage
+from backend.app.services.branch_service import (
+    fork_for_regenerate, fork_branch, activate_branch, list_session_branches,
+)
+from backend.app.services.chat_message_service import list_chat_messages_page
+from backend.app.services.config_cache_service import get_session_assistant_config
+from backend.app.services.turn_cancel_service import register_turn, unregister_turn, cancel_turn, request_cancel
+from backend.app.utils.agent_util import SSETransport, WebSocketTransport
+from backend.app.utils.upload_queue import upload_queue
+from backend.app.utils import process_registry
+from backend.app.utils.rate_limiter import RateLimitDecision, rate_limiter
+from backend.app.utils.session_lock import SessionLock
+from backend.app.utils.task_util import spawn
 from backend.app.utils.voice_util import ASRClient
 
 logger = get_logger(__name__)
 router = APIRouter()
 
+# 对话任务与响应之间的帧缓冲（客户端读取慢时对话任务等待）
+TURN_FRAME_BUFFER = 64
+
+
+async def resolve_user_content(chat_message: CompletionRequest) -> str:
+    """
+    获取用户输入文本：语音消息先上传对象存储再调用 ASR 识别，文本消息直接返回。
+
+    异常:
+        HTTPException: 语音上传失败（502），此时不调用 ASR
+    """
+    if chat_message.type == "audio":
+        audio_bytes = base64.b64decode(chat_message.content)
+        # ASR 需要读取已上传的音频，这里等待上传完成（不阻塞事件循环）
+        if not await upload_queue.upload(audio_bytes,"audios/user"+chat_message.id,"audio/webm"):
+            logger.error(f"user audio upload failed, message_id={chat_message.id}")
+            raise HTTPException(status_code=502, detail="Failed to upload audio, please try again later.")
+        user_audio_url =oss_util.get_private_url("audios/user"+chat_message.id)
+        asr=ASRClient(settings.TTS_AND_ASR_API_KEY)
+        return await asr.speech_to_text(user_audio_url)
+    return chat_message.content
+
+
+async def _turn_frames(
+        session_id: str, chat_message: Optional[CompletionRequest], transport,
+        regenerate_message_id: Optional[str] = None,
+):
+    """单轮对话的输出帧（不含 start/done），出错时输出 error 事件；被取消时直接结束"""
+    lock = SessionLock(session_id)
+    async with get_db_ctx() as db:
+        try:
+            content = await resolve_user_content(chat_message) if chat_message is not None else None
+
+            # 1. 加锁：同一会话的上一轮未结束时排队等待，排队位置变化时通知客户端
+            async for position in lock.wait():
+                yield transport.event("queue", {"position": position})
+            if not lock.acquired:
+                yield transport.event("error", {"message": "Session is busy, please try again later."})
+                return
+            # 拿到锁后才登记，显式取消只会作用于持锁执行中的对话，不会误取消排队中的对话
+            register_turn(session_id, asyncio.current_task())
+            process_registry.reset(session_id)
+
+            # 重新生成：在会话锁内分叉，避免与进行中的对话交错
+            branch = None
+            if regenerate_message_id is not None:
+                try:
+                    branch = await fork_for_regenerate(db, session_id, regenerate_message_id)
+                except ValueError as e:
+                    yield transport.event("error", {"message": str(e)})
+                    return
+                yield transport.event("branch", {"branch_id": branch.branch_id})
+            turn_id = chat_message.id if chat_message is not None else uuid.uuid4().hex
+            #验证是否有session
+            # 本任务被取消时确保内层生成器同步关闭（已完成的消息在其中落库）
+            async with aclosing(handle_chat_completion(
+                thread_id=session_id, content=content, id=turn_id, db=db, transport=transport,
+                branch=branch, regenerate=branch is not None,
+            )) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+
+        except HTTPException as e:
+            # 输入无效、语音上传失败等可预期的错误，原样告知客户端
+            await db.rollback()
+            yield transport.event("error", {"message": e.detail, "status": e.status_code})
+        except Exception as e:
+            await db.rollback()
+            tb_str = traceback.format_exc()  # 获取完整堆栈信息字符串
+            logger.error(f"chat generation failed: {e}\nTraceback:\n{tb_str}")
+            yield transport.event("error", {"message": "Internal server error occurred."})
+        finally:
+            # 3. 释放锁（仍在排队时退出队列），并通知下一个等待者
+            unregister_turn(session_id, asyncio.current_task())
+            await lock.release()
+
+
+_END = object()
+
+
+async def _pump(frames, queue: asyncio.Queue):
+    """对话任务：把输出帧依次放入队列（队列满时等待，保持背压），结束时放入 _END"""
+    try:
+        async for frame in frames:
+            await queue.put(frame)
+    finally:
+        await frames.aclose()
+        await queue.put(_END)
+
+
+async def admit_turn(session_id: str, client_key: str) -> RateLimitDecision:
+    """
+    对话开始前（推流之前）的限流检查：客户端、助手令牌桶及助手并发上限，一次 Redis 调用。
+
+    异常:
+        HTTPException: 会话不存在（404）或被限流（429，带 Retry-After）
+    """
+    async with get_db_ctx() as db:
+        assistant_config = await get_session_assistant_config(db, session_id)
+    if assistant_config is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    decision = await rate_limiter.acquire(client_key, assistant_config.id)
+    if not decision.allowed:
+        logger.warning(f"rate limited, client={client_key} assistant_id={assistant_config.id} reason={decision.reason}")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests. Please try again later.",
+            headers={"Retry-After": decision.retry_after_header},
+        )
+    return decision
+
+
+def _client_key(connection) -> str:
+    return connection.client.host if connection.client else "unknown"
+
+
+async def chat_turn_stream(
+        session_id: str, chat_message: Optional[CompletionRequest], transport,
+        regenerate_message_id: Optional[str] = None, admission: Optional[RateLimitDecision] = None,
+):
+    """
+    单轮对话的输出帧流（与传输方式无关）：start -> 消息/音频 -> done，出错时插入 error 事件。
+    regenerate_message_id 不为空时不新增用户消息，从该消息处分叉出新分支重新生成（先推送 branch 事件）。
+    admission 为 admit_turn 的结果，对话结束时释放其占用的助手并发租约。
+
+    对话在独立任务中执行，以下情况会取消该任务（LangGraph 流、TTS 合成、工具子进程随之结束，
+    已完成的消息照常落库）：
+    - 客户端断开：传输层关闭本生成器；长时间无输出时定期发送保活帧，以便及时发现断开；
+    - 显式取消：任意 worker 收到取消请求后经 Redis 广播（见 turn_cancel_service），此时推送 cancelled 事件。
+    """
+    # 先创建对话任务再推送 start：生成器一旦开始执行，租约就由对话任务的生命周期接管，
+    # 即使在第一帧处被关闭（客户端立即断开），也会经下面的 finally 取消任务并释放租约
+    queue: asyncio.Queue = asyncio.Queue(maxsize=TURN_FRAME_BUFFER)
+    producer = asyncio.create_task(
+        _pump(_turn_frames(session_id, chat_message, transport, regenerate_message_id), queue),
+        name=f"turn:{session_id}",
+    )
+    if admission is not None:
+        # 对话任务结束时在后台释放并发租约：客户端断开时本生成器的 finally 处于已取消的作用域中，
+        # 在其中 await 释放可能被跳过，租约会一直占用到过期
+        producer.add_done_callback(lambda _: spawn(admission.release(), name=f"release-lease:{session_id}"))
+
+    try:
+        yield transport.event("start", {"message": "stream start"})
+        while True:
+            try:
+                frame = await asyncio.wait_for(queue.get(), settings.STREAM_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield transport.keepalive()
+                continue
+            if frame is _END:
+                break
+            yield frame
+        # _END 是对话任务放入的最后一帧，任务随即结束
+        await asyncio.wait({producer})
+        if producer.cancelled():
+            yield transport.event("cancelled", {"message": "turn cancelled"})
+    finally:
+        if not producer.done():
+            # 生成器在对话结束前被关闭：客户端已断开，只取消本次对话（不影响同一会话排队中的其他对话）
+            cancel_turn(session_id, producer, "client disconnected")
+            # 丢弃未读取的帧，保证对话任务收尾时 _END 能放入队列
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.wait({producer})
+
+    yield transport.event("done", {"message": "DONE"})
+
+
+class TurnStreamingResponse(StreamingResponse):
+    """
+    对话推流响应：响应结束时（正常结束、客户端断开、开始推流前出错）总是释放并发租约。
+    传输层在迭代响应体之前失败时 chat_turn_stream 不会开始执行，其中的释放逻辑不会运行；
+    Starlette 的 background 在客户端断开时也会被跳过，因此在 __call__ 外层兜底（release 幂等）。
+    """
+
+    def __init__(self, content, admission: RateLimitDecision, **kwargs):
+        super().__init__(content, **kwargs)
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            spawn(self.admission.release(), name="release-lease")
+
 
 @router.post("/{session_id}/completions", description="Server-Sent Events (SSE) endpoint")
 async def chat_completions(
+    request: Request,
     session_id: str = Path(..., description="The ID of the thread_id"),
     chat_message: CompletionRequest = Body(..., description="The content of the chat"),
 ) -> StreamingResponse:
+    # 限流：超限时在推流之前直接返回 429
+    admission = await admit_turn(session_id, _client_key(request))
+    return TurnStreamingResponse(
+        chat_turn_stream(session_id, chat_message, SSETransport(), admission=admission),
+        admission,
+        media_type="text/event-stream",
+    )
 
 
+@router.websocket("/{session_id}/ws")
+async def chat_websocket(websocket: WebSocket, session_id: str):
+    """
+    WebSocket 传输：客户端每发送一条 CompletionRequest JSON 即开始一轮对话；
+    文本/事件以 JSON 文本帧返回，音频片段以二进制帧按播放顺序返回。
+    """
+    await websocket.accept()
+    transport = WebSocketTransport()
+    try:
+        while True:
+            try:
+                chat_message = CompletionRequest.model_validate(await websocket.receive_json())
+            except (ValidationError, ValueError) as e:
+                await websocket.send_text(transport.event("error", {"message": f"invalid request: {e}"}))
+                continue
 
-    # 限流逻辑
-    # if not await check_rate_limit(request):
-    #     # 限流 SSE 错误格式响应
-    #
-    #     async def limited_event():
-    #         logger.warning(f"{request.client.host}请求过于频繁")
-    #         yield start_msg
-    #         yield 'event: error\ndata: {"message":"Too many requests. Please try again later."}\n\n'
-    #         yield end_msg
-    #     return StreamingResponse(limited_event(), media_type="text/event-stream")
+            try:
+                admission = await admit_turn(session_id, _client_key(websocket))
+            except HTTPException as e:
+                data = {"message": e.detail, "status": e.status_code}
+                if e.headers and "Retry-After" in e.headers:
+                    data["retry_after"] = int(e.headers["Retry-After"])
+                await websocket.send_text(transport.event("error", data))
+                continue
 
-    if chat_message.type == "audio":
-        audio_bytes = base64.b64decode(chat_message.content)
-        oss_util.upload_data(audio_bytes,"audios/user"+chat_message.id,"audio/webm")
-        user_audio_url =oss_util.get_private_url("audios/user"+chat_message.id)
-        asr=ASRClient(settings.TTS_AND_ASR_API_KEY)
-        content=asr.speech_to_text(user_audio_url)
-    else:
-        content=chat_message.content
+            # 发送失败（连接已断开）时立即关闭生成器，取消进行中的对话
+            async with aclosing(chat_turn_stream(session_id, chat_message, transport, admission=admission)) as frames:
+                async for frame in frames:
+                    if frame is None:
+                        continue
+                    if isinstance(frame, bytes):
+                        await websocket.send_bytes(frame)
+                    else:
+                        await websocket.send_text(frame)
+    except WebSocketDisconnect:
+        logger.info(f"websocket disconnected, session_id={session_id}")
 
-    async def event_generator():
-        start_msg = "event: start\ndata: {\"message\":\"stream start\"}\n\n"
-        end_msg = "event: done\ndata: {\"message\":\"DONE\"}\n\n"
-        yield start_msg
+@router.post(
+    "/{session_id}/messages/{message_id}/regenerate",
+    description="重新生成（SSE）：从该消息所属轮次的用户消息处分叉出新分支并生成新的回复，原回复保留在原分支",
+)
+async def regenerate_message(
+    request: Request,
+    session_id: str = Path(..., description="The ID of the thread_id"),
+    message_id: str = Path(..., description="要重新生成的消息 ID（映射 langgraph_id）"),
+) -> StreamingResponse:
+    admission = await admit_turn(session_id, _client_key(request))
+    return TurnStreamingResponse(
+        chat_turn_stream(session_id, None, SSETransport(), regenerate_message_id=message_id, admission=admission),
+        admission,
+        media_type="text/event-stream",
+    )
 
-        async with get_db_ctx() as db:
-            try:
-                # 1. 加锁
-                lock_value = await acquire_lock(session_id)
-                if not lock_value:
-                    logger.warning(f"failed to acquire lock for session {session_id}")
-                    raise ValueError(f"failed to acquire lock for session {session_id}")
-                #验证是否有session
-                async for chunk in handle_chat_completion(thread_id=session_id,content=content,id=chat_message.id,db=db):
-                    yield chunk
+
+@router.post("/{session_id}/cancel")
+async def cancel_completion(session_id: str = Path(..., description="The ID of the thread_id")):
+    """取消会话正在进行的对话（对话可以在任意 worker 上执行），已完成的消息会保留"""
+    await request_cancel(session_id, "user")
+    return {"message": "cancel requested"}
+
+
+@router.get("/{session_id}/messages/", response_model=ChatMessagePage)
+async def list_messages(
+    session_id: str = Path(..., description="线程 ID"),
+    limit: int = Query(100, ge=1, le=500, description="每页消息数"),
+    before_cursor: Optional[str] = Query(None, description="加载更早的消息：传入上一页返回的 before_cursor"),
+    after_cursor: Optional[str] = Query(None, description="获取新消息：传入上一次返回的 after_cursor"),
+    branch_id: Optional[str] = Query(None, description="分支 ID，默认为会话当前分支"),
+    db: AsyncSession = Depends(get_db),
+):
+    """获取指定线程的聊天记录（键集分页，不传游标时返回最新一页）"""
+    try:
+        return await list_chat_messages_page(session_id, db, limit, before_cursor, after_cursor, branch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _branch_list(db: AsyncSession, session_id: str) -> ChatBranchList:
+    active_branch_id, branches = await list_session_branches(db, session_id)
+    return ChatBranchList(
+        active_branch_id=active_branch_id,
+        branches=[ChatBranchOut(branch_id=session_id)] + [ChatBranchOut.model_validate(b) for b in branches],
+    )
+
+
+@router.get("/{session_id}/branches", response_model=ChatBranchList)
+async def list_branches(
+    session_id: str = Path(..., description="线程 ID"),
+    db: AsyncSession = Depends(get_db),
+):
+    """获取会话的全部分支及当前分支"""
+    return await _branch_list(db, session_id)
+
+
+@router.post("/{session_id}/branches", response_model=ChatBranchOut)
+async def create_branch(
+    session_id: str = Path(..., description="线程 ID"),
+    body: ChatBranchCreate = Body(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """从任意消息处分叉出新分支并设为当前分支（不复制历史），之后的对话写入新分支"""
+    # 不排队：会话有对话在进行或排队时直接返回 409
+    lock = SessionLock(session_id, wait_timeout=0)
+    if not await lock.acquire():
+        await lock.release()
+        raise HTTPException(status_code=409, detail="session is busy")
+    try:
+        view = await fork_branch(db, session_id, body.message_id, body.include)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    finally:
+        await lock.release()
+    return ChatBranchOut.model_validate(await get_branch(db, view.branch_id))
 
 
-            except Exception as e:
-                await db.rollback()
-                tb_str = traceback.format_exc()  # 获取完整堆栈信息字符串
-                logger.error(f"SSE chat generation failed: {e}\nTraceback:\n{tb_str}")
-                yield "event: error\ndata: {\"message\":\"Internal server error occurred.\"}\n\n"
-            finally:
-                # 3. 释放锁
-                if lock_value:  # 检查，锁有可能已经过期
-                    try:
-                        released = await release_lock(session_id, lock_value)
-                        if not released:
-                            logger.warning(f"[Lock] Failed to release lock for session_id={session_id}")
-                    except Exception as e:
-                        logger.error(f"[Lock] Exception during lock release: {e}")
-
-                yield end_msg
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
-
-@router.get("/{session_id}/messages/")
-async def list_messages(session_id: str = Path(..., description="线程 ID"),db: AsyncSession = Depends(get_db)):
-    """获取指定线程的聊天记录"""
-    messages=await fetch_valid_langgraph_chat_messages(session_id,db,100)
-
-    return {"messages":messages}
\ No newline at end of file
+@router.put("/{session_id}/branches/{branch_id}/active", response_model=ChatBranchList)
+async def set_active_branch(
+    session_id: str = Path(..., description="线程 ID"),
+    branch_id: str = Path(..., description="分支 ID（根分支即线程 ID）"),
+    db: AsyncSession = Depends(get_db),
+):
+    """切换会话当前分支"""
+    # 不排队：会话有对话在进行或排队时直接返回 409
+    lock = SessionLock(session_id, wait_timeout=0)
+    if not await lock.acquire():
+        await lock.release()
+        raise HTTPException(status_code=409, detail="session is busy")
+    try:
+        await activate_branch(db, session_id, branch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    finally:
+        await lock.release()
+    return await _branch_list(db, session_id)
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from backend.app.core.database import get_db
 from backend.app.models.assistant_config import Assistant
-from backend.app.repositories.assistant_repository import get_assistant_by_id
-from backend.app.schemas.assistant_config import AssistantCreate, AssistantResponse, AssistantUpdate
+from backend.app.repositories.assistant_repository import get_assistant_by_id, list_assistants_page
+from backend.app.services.config_cache_service import invalidate_config
+from backend.app.schemas.assistant_config import AssistantCreate, AssistantResponse, AssistantUpdate, AssistantSummary
+from backend.app.utils.cursor_util import encode_cursor, decode_cursor
 
 router = APIRouter()
 
@@ -18,11 +22,36 @@ async def create_assistant(assistant: AssistantCreate, db: AsyncSession = Depend
     await db.refresh(db_assistant)
     return db_assistant
 
-# 获取所有助手
-@router.get("/", response_model=list[AssistantResponse])
-async def list_assistants(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Assistant))
-    return result.scalars().all()
+# 精简视图只查询这些列（不读取 prompt_text 等大字段）
+SUMMARY_COLUMNS = [getattr(Assistant, name) for name in AssistantSummary.model_fields]
+
+
+# 获取助手列表（按 id 键集分页，下一页游标通过 X-Next-Cursor 响应头返回，没有下一页时不返回）
+@router.get("/", response_model=list[AssistantResponse] | list[AssistantSummary])
+async def list_assistants(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    view: Literal["full", "summary"] = Query("full", description="full: 完整字段；summary: 精简字段"),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        after_id = decode_cursor(cursor).get("id") if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if after_id is not None and not isinstance(after_id, int):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+    # 多取一条判断是否还有下一页
+    if view == "summary":
+        rows = await list_assistants_page(db, limit + 1, after_id, columns=SUMMARY_COLUMNS)
+        items = [AssistantSummary.model_validate(row._mapping) for row in rows[:limit]]
+    else:
+        rows = await list_assistants_page(db, limit + 1, after_id)
+        items = [AssistantResponse.model_validate(row) for row in rows[:limit]]
+    if len(rows) > limit:
+        response.headers["X-Next-Cursor"] = encode_cursor({"id": items[-1].id})
+    return items
 
 # 根据ID获取助手
 @router.get("/{assistant_id}", response_model=AssistantResponse)
@@ -40,6 +69,7 @@ async def update_assistant(assistant_id: int, assistant_update: AssistantUpdate,
         setattr(assistant, key, value)
     await db.commit()
     await db.refresh(assistant)
+    await invalidate_config("assistant", assistant_id)
     return assistant
 
 # 删除助手
@@ -51,4 +81,5 @@ async def delete_assistant(assistant_id: int, db: AsyncSession = Depends(get_db)
         raise HTTPException(status_code=404, detail="Assistant not found")
     await db.delete(assistant)
     await db.commit()
+    await invalidate_config("assistant", assistant_id)
     return {"message": "Assistant deleted successfully"}
\ No newline at end of file
@@ -1,19 +1,26 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.app.core.database import get_db
-from backend.app.repositories.session_repository import create_or_update_session, get_session, get_all_sessions, \
+from backend.app.repositories.chat_branch_repository import list_branches
+from backend.app.repositories.session_repository import create_or_update_session, get_session, list_sessions_page, \
     delete_session
-from backend.app.schemas.session_assistant import SessionAssistantCreate, SessionAssistantOut
+from backend.app.services.config_cache_service import invalidate_config
+from backend.app.services.history_cache_service import invalidate_history_cache
+from backend.app.schemas.session_assistant import SessionAssistantCreate, SessionAssistantOut, SessionListItem
+from backend.app.utils.cursor_util import encode_cursor, decode_cursor
 
 # 新增或更新
 
 router = APIRouter()
 @router.post("/{session_id}", response_model=SessionAssistantOut)
 async def create_or_update(session_id: str, body: SessionAssistantCreate, db: AsyncSession = Depends(get_db)):
-    return await create_or_update_session(db, session_id, body.assistant_id)
+    record = await create_or_update_session(db, session_id, body.assistant_id)
+    await invalidate_config("session", session_id)
+    return record
 
 # 查询单个
 @router.get("/{session_id}", response_model=SessionAssistantOut)
@@ -23,15 +30,41 @@ async def get_one(session_id: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Session not found")
     return record
 
-# 查询全部
-@router.get("/", response_model=List[SessionAssistantOut])
-async def get_all(db: AsyncSession = Depends(get_db)):
-    return await get_all_sessions(db)
+# 查询会话列表（按创建时间倒序键集分页，下一页游标通过 X-Next-Cursor 响应头返回，没有下一页时不返回）
+@router.get("/", response_model=List[SessionListItem])
+async def get_all(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    db: AsyncSession = Depends(get_db),
+):
+    after = None
+    if cursor:
+        try:
+            key = decode_cursor(cursor)
+            after = (datetime.fromisoformat(key["created_at"]), str(key["session_id"]))
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="invalid cursor")
+
+    # 多取一条判断是否还有下一页
+    rows = await list_sessions_page(db, limit + 1, after)
+    items = [SessionListItem.model_validate(row) for row in rows[:limit]]
+    if len(rows) > limit:
+        last = items[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            {"created_at": last.created_at.isoformat(), "session_id": last.session_id}
+        )
+    return items
 
 # 删除
 @router.delete("/{session_id}")
 async def delete_one(session_id: str, db: AsyncSession = Depends(get_db)):
+    branches = await list_branches(db, session_id)
     success = await delete_session(db, session_id)
     if not success:
         raise HTTPException(status_code=404, detail="Session not found")
+    await invalidate_config("session", session_id)
+    # 根分支及各分支的会话窗口缓存
+    for branch_id in [session_id] + [b.branch_id for b in branches]:
+        await invalidate_history_cache(branch_id)
     return {"message": "Deleted successfully"}
\ No newline at end of file
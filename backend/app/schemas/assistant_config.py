@@ -1,7 +1,10 @@
 
 
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, Literal
+
+# TTS 音频编码：wav 无损但体积大，mp3/ogg_opus 为压缩编码
+AudioEncoding = Literal["wav", "mp3", "ogg_opus"]
 
 class AssistantCreate(BaseModel):
     name: str
@@ -13,9 +16,12 @@ class AssistantCreate(BaseModel):
     avatar: Optional[str] = None
     prompt_text: Optional[str] = None
     window_size: Optional[int] = 30
+    summary_enabled: bool = False
+    summary_trigger_tokens: int = Field(3000, ge=500)
     voice_name: Optional[str] = None
     voice_type: Optional[str] = None
     speed_ratio: float = 1.0
+    audio_encoding: AudioEncoding = "wav"
     system_type: Optional[str] = None
     base_file_path: str = None
 
@@ -32,8 +38,11 @@ class AssistantUpdate(BaseModel):
     avatar: Optional[str] = None
     prompt_text: Optional[str] = None
     window_size: Optional[int] = None
+    summary_enabled: Optional[bool] = None
+    summary_trigger_tokens: Optional[int] = Field(None, ge=500)
     voice_type: Optional[str] = None
     speed_ratio: float = 1.0
+    audio_encoding: Optional[AudioEncoding] = None
     base_file_path: Optional[str] = None
     voice_name: Optional[str] = None
     system_type: Optional[str] = None
@@ -49,11 +58,56 @@ class AssistantResponse(BaseModel):
     avatar: Optional[str]
     prompt_text: Optional[str]
     window_size: int
+    summary_enabled: bool = False
+    summary_trigger_tokens: int = 3000
     voice_type: Optional[str] = None
     speed_ratio: float = 1.0
+    audio_encoding: Optional[str] = "wav"
     base_file_path: str = None
     voice_name: Optional[str] = None
     system_type: Optional[str] = None
     model_config = {
         "from_attributes": True
     }
+
+
+class AssistantConfig(BaseModel):
+    """
+    对话执行所需的助手配置快照（进程内缓存使用，不含展示类字段）
+    """
+    id: int
+    name: Optional[str] = None
+    base_url: Optional[str] = None
+    provider: str
+    model_name: str
+    api_key: Optional[str] = None
+    prompt_text: Optional[str] = None
+    window_size: Optional[int] = 30
+    summary_enabled: bool = False
+    summary_trigger_tokens: int = 3000
+    voice_type: Optional[str] = None
+    speed_ratio: float = 1.0
+    audio_encoding: Optional[str] = "wav"
+    system_type: Optional[str] = None
+    base_file_path: Optional[str] = None
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class AssistantSummary(BaseModel):
+    """
+    助手列表的精简视图（不含提示词、API Key 等大字段/敏感字段）
+    """
+    id: int
+    name: str
+    description: Optional[str] = None
+    avatar: Optional[str] = None
+    provider: str
+    model_name: str
+    voice_name: Optional[str] = None
+    voice_type: Optional[str] = None
+    window_size: Optional[int] = None
+    model_config = {
+        "from_attributes": True
+    }
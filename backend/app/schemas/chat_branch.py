@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Optional, List
+
+from pydantic import BaseModel, Field
+
+
+class ChatBranchOut(BaseModel):
+    """对话分支（根分支的 branch_id 即会话 ID，没有父分支）"""
+    branch_id: str = Field(..., description="分支ID")
+    parent_branch_id: Optional[str] = Field(None, description="父分支ID")
+    fork_langgraph_id: Optional[str] = Field(None, description="分叉点消息 ID（映射 langgraph_id）")
+    created_at: Optional[datetime] = Field(None, description="创建时间")
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
+class ChatBranchList(BaseModel):
+    active_branch_id: str = Field(..., description="会话当前分支ID")
+    branches: List[ChatBranchOut] = Field(default_factory=list, description="全部分支（第一个为根分支）")
+
+
+class ChatBranchCreate(BaseModel):
+    message_id: str = Field(..., description="分叉点消息 ID（映射 langgraph_id）")
+    include: bool = Field(True, description="新分支是否包含该消息（编辑用户消息时传 false，随后发送修改后的内容）")
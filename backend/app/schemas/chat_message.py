@@ -14,6 +14,7 @@ class ChatMessageBase(BaseModel):
     name: Optional[str] = Field(None, description="工具调用名")
     artifact: Optional[str] = Field(None, description="artifact")
     tts_key:Optional[str]=Field(None,description="tts_key")
+    token_count: Optional[int] = Field(None, description="消息 token 数")
     parent_message_id: Optional[str] = Field(None, description="<UNK>ID")
     message_group_id: Optional[str] = Field(None, description="<UNK>ID")
     # 使用 model_validator 实现 langgraph_id 到 id 的映射
@@ -33,4 +34,10 @@ class ChatMessageBase(BaseModel):
 
     model_config = {
         "from_attributes": True
-    }
\ No newline at end of file
+    }
+
+class ChatMessagePage(BaseModel):
+    """聊天记录分页结果（消息按时间正序）"""
+    messages: List[ChatMessageBase] = Field(default_factory=list, description="本页消息")
+    before_cursor: Optional[str] = Field(None, description="加载更早消息的游标（作为 before_cursor 传入），没有更早消息时为空")
+    after_cursor: Optional[str] = Field(None, description="获取之后新消息的游标（作为 after_cursor 传入）")
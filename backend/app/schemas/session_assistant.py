@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -17,4 +19,10 @@ class SessionAssistantOut(SessionAssistantBase):
 
     model_config = {
         "from_attributes": True
-    }
\ No newline at end of file
+    }
+
+class SessionListItem(SessionAssistantOut):
+    """会话列表项：附带助手名称、最后一条消息预览及消息数"""
+    assistant_name: Optional[str] = None
+    last_message_preview: Optional[str] = None
+    message_count: int = 0
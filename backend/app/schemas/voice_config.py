@@ -6,6 +6,7 @@ from pydantic import BaseModel
 class VoiceConfigBase(BaseModel):
     voice_type: Optional[str] = None
     speed_ratio:  Optional[float] = 1.0
+    audio_encoding: Optional[str] = "wav"
     model_config = {
         "from_attributes": True
     }
\ No newline at end of file
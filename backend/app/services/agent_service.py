@@ -1,135 +1,222 @@
+import asyncio
+import time
+from typing import Optional
+
 from fastapi import HTTPException
-from langchain_core.messages import AIMessage, HumanMessage, AIMessageChunk
+from langchain_core.messages import AIMessage, HumanMessage, AIMessageChunk, ToolMessage
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.app.agents.files_manager_agent.graph import get_file_agent
+from backend.app.agents.files_manager_agent.tools import tools_list
+from backend.app.core.metrics import (
+    record_turn_audio_bytes,
+    AGENT_TOOL_CALLS,
+    CHAT_TIME_TO_FIRST_AUDIO,
+    CHAT_TIME_TO_FIRST_TOKEN,
+    CHAT_TURN_DURATION,
+)
 from backend.app.core.settings import settings
-from backend.app.repositories.assistant_repository import get_assistant_by_id
-from backend.app.repositories.session_repository import get_session
+from backend.app.services.summary_service import schedule_thread_summary
+from backend.app.services.branch_service import BranchView, resolve_active_branch
 from backend.app.schemas.model_config import ModelConfig
 from backend.app.schemas.voice_config import VoiceConfigBase
-from backend.app.services.chat_message_service import (
-    fetch_valid_langgraph_chat_messages,
-    save_chat_messages_batch
-)
+from backend.app.services.config_cache_service import get_session_assistant_config
+from backend.app.enums.turn_status import TurnStatus
+from backend.app.services.chat_message_service import fetch_history_base_messages
+from backend.app.services.chat_turn_service import TurnRecorder
 from backend.app.utils.agent_util import (
-    chat_messages_base2base_message,
-    base_message2chat_messages_base,
-    sse_format,
     voice_prompts,
-    base64_format
+    SSETransport
 )
+from backend.app.utils.audio_util import AUDIO_FORMATS, base64_decoded_size
+from backend.app.utils.text_segmenter import SentenceSegmenter
+from backend.app.utils.tts_pipeline import TTSPipeline
 from backend.app.utils.voice_util import (
     TTSClient,
-    text_to_speech_segments,
     merge_audio_base64_segments
 )
-import backend.app.utils.kobo_util as oss_util
+from backend.app.utils.upload_queue import upload_queue
+
+# 工具调用计数的 tool 标签只取已注册的工具名，避免模型臆造的工具名产生无限多的标签
+TOOL_NAMES = frozenset(t.name for t in tools_list)
+
 
+def record_tool_calls(messages) -> None:
+    for message in messages:
+        if isinstance(message, ToolMessage):
+            name = message.name if message.name in TOOL_NAMES else "unknown"
+            AGENT_TOOL_CALLS.inc(tool=name, status=message.status)
 
-async def handle_chat_completion(id: str, thread_id: str, content: str, db: AsyncSession):
+
+async def handle_chat_completion(
+        id: str, thread_id: str, content: Optional[str], db: AsyncSession, transport=None,
+        branch: Optional[BranchView] = None, regenerate: bool = False,
+):
     """
-    处理聊天内容生成的核心逻辑，支持正常新增消息与重新生成（覆盖）消息两种模式。
+    处理聊天内容生成的核心逻辑，支持正常新增消息与重新生成消息两种模式。
+
+    transport 决定输出帧的格式（默认 SSE；WebSocket 下音频为二进制帧），见 agent_util 中的 Transport 类。
+    branch 为本轮读取历史、写入消息的分支（默认为会话当前分支）；
+    regenerate 时不新增用户消息，直接对分支末尾的用户消息重新生成回复（分支由 branch_service.fork_for_regenerate 创建），
+    此时 id 为新的轮次 ID。
     """
-    # 1. 获取会话元数据
-    session = await get_session(db, thread_id)
-    if session is None:
+    transport = transport or SSETransport()
+    start = time.perf_counter()
+    # 1. 获取会话绑定的助手配置（进程内缓存，未命中时联表查询）
+    assistant_config = await get_session_assistant_config(db, thread_id)
+    if assistant_config is None:
         raise HTTPException(400, "no session")
 
-    assistant_orm = await get_assistant_by_id(session.assistant_id, db)
-
     # 2. 构建模型执行所需配置
-    base_file_path = assistant_orm.base_file_path
-    system_type = assistant_orm.system_type
+    base_file_path = assistant_config.base_file_path
+    system_type = assistant_config.system_type
 
-    voice_config=VoiceConfigBase.model_validate(assistant_orm)
-    model_config = ModelConfig.model_validate(assistant_orm)
+    voice_config=VoiceConfigBase.model_validate(assistant_config)
+    model_config = ModelConfig.model_validate(assistant_config)
 
-    graph = get_file_agent(**model_config.model_dump(), system_type=system_type)
+    graph = get_file_agent(**model_config.model_dump(), system_type=system_type, assistant_id=assistant_config.id)
 
-    # 3. 取历史上下文消息（窗口限制以避免上下文溢出）
-    window_size = assistant_orm.window_size
-    chat_message_bases = await fetch_valid_langgraph_chat_messages(
+    # 3. 取历史上下文消息（条数窗口 + token 预算，避免上下文溢出）
+    window_size = assistant_config.window_size
+    branch = branch or await resolve_active_branch(db, thread_id)
+    messages = await fetch_history_base_messages(
         session_id=thread_id,
         db=db,
-        windows_size=window_size
+        windows_size=window_size,
+        max_tokens=settings.HISTORY_MAX_TOKENS,
+        with_summary=assistant_config.summary_enabled,
+        branch=branch,
     )
-    messages = chat_messages_base2base_message(chat_message_bases)
 
     # 4. 校验输入
-    if not content:
+    if regenerate:
+        if not messages or not isinstance(messages[-1], HumanMessage):
+            raise HTTPException(400, "no user message to regenerate")
+    elif not content:
         raise HTTPException(400, "no messages or no voice")
 
-    # 新增用户输入消息
-    user_message = HumanMessage(content=content, id=id)
-    messages.append(user_message)
-
-    # 用于存储待写入数据库的消息与对应的语音 keys
-    messages_pending = [user_message]
-    tts_key_pending = [None]
+    # 本轮消息逐条落库（用户消息 id 作为轮次 id），不在内存中累积
+    recorder = TurnRecorder(turn_id=id, thread_id=thread_id, branch_id=branch.branch_id)
+    if not regenerate:
+        # 新增用户输入消息
+        user_message = HumanMessage(content=content, id=id)
+        messages.append(user_message)
+        await recorder.add(user_message)
     # 初始化 TTS 客户端
     tts = TTSClient(settings.TTS_AND_ASR_API_KEY, **voice_config.model_dump())
 
-    # 流式 Token 及 TTS 语音缓存
-    stream_tokens = []
+    # 流式断句器及 TTS 语音缓存
+    segmenter = SentenceSegmenter()
     audio_segments = []
-
-    # 5. 执行 LLM Graph，启用流式更新
-    async for update_type, chunk in graph.astream(
-        input={"messages": messages, "base_file_path": base_file_path},
-        stream_mode=["updates", "messages"]
-    ):
-        # -------------------------- #
-        # 更新类型：模型完整响应（分段）
-        # -------------------------- #
-        if update_type == "updates":
-            only_key = next(iter(chunk))
-            res_message = chunk[only_key]['messages'][-1]
-            messages_pending.append(res_message)
-
-            tts_key = None
-
-            # 若 AI 消息生成完成，合并现有全部音频段并上传
-            if isinstance(res_message, AIMessage) and res_message.content:
-                merged_audio = merge_audio_base64_segments(audio_segments)
-                if merged_audio:
-                    tts_key = res_message.id + ".wav"
-                    oss_util.upload_data(merged_audio, tts_key, mime_type="audio/wav")
-
-            # 如果包含工具调用，追加语音化提示
-            if isinstance(res_message, AIMessage) and res_message.tool_calls:
-                tool_text = "".join(voice_prompts[t["name"]] for t in res_message.tool_calls)
-                tool_audio = tts.text_to_speech(tool_text)
-                yield base64_format(tool_audio)
-
-            tts_key_pending.append(tts_key)
-
-            # 推送 AI 文本消息 SSE
-            if isinstance(res_message, AIMessage):
-                yield sse_format(res_message, tts_key)
-            # 清空tokens缓存和消息缓存
-            stream_tokens.clear()
-            audio_segments.clear()
-
-        # -------------------------- #
-        # 流类型：逐 Token 输出 + TTS 流式片段
-        # -------------------------- #
-        else:
-            tmp_message = chunk[0]
-
-            if isinstance(tmp_message, AIMessageChunk) and tmp_message.content:
-                stream_tokens.append(tmp_message.content)
-
-                # 按可拆分语音片段处理
-                new_segments, remain = text_to_speech_segments(stream_tokens, tts.text_to_speech)
-
-                for seg in new_segments:
-                    yield base64_format(seg)
-                    audio_segments.append(seg)
-
-                stream_tokens = [remain]
-
-    # 6. 转回 ORM 对象，插入数据库
-    new_chat_message_bases = base_message2chat_messages_base(messages_pending, tts_key_pending)
-    await save_chat_messages_batch(messages=new_chat_message_bases, db=db, thread_id=thread_id)
-    await db.commit()  # 提交操作，确保事务生效
+    # 音频编码及本轮音频字节统计（推送片段 / 上传整段）
+    audio_extension, audio_mime_type = AUDIO_FORMATS.get(tts.encoding, AUDIO_FORMATS["wav"])
+    stream_audio_bytes = 0
+    stored_audio_bytes = 0
+    first_token_seen = first_audio_seen = False
+
+    def audio_frame(seg: Optional[str]):
+        """生成语音帧：累计推送字节数，并记录首段语音时间"""
+        nonlocal stream_audio_bytes, first_audio_seen
+        if seg and not first_audio_seen:
+            first_audio_seen = True
+            CHAT_TIME_TO_FIRST_AUDIO.observe(time.perf_counter() - start)
+        stream_audio_bytes += base64_decoded_size(seg)
+        return transport.audio(seg)
+
+    status = TurnStatus.failed
+    try:
+        # 5. 执行 LLM Graph，启用流式更新；语音片段交给流水线并发合成，按句子顺序推送
+        async with TTSPipeline(
+            tts.text_to_speech,
+            workers=settings.TTS_PIPELINE_WORKERS,
+            queue_size=settings.TTS_PIPELINE_QUEUE_SIZE,
+        ) as tts_pipeline:
+            async for update_type, chunk in graph.astream(
+                input={"messages": messages, "base_file_path": base_file_path},
+                # 工具按会话登记子进程，对话取消时一并结束（见 process_registry）
+                config={"configurable": {"thread_id": thread_id}},
+                stream_mode=["updates", "messages"]
+            ):
+                # -------------------------- #
+                # 更新类型：模型完整响应（分段）
+                # -------------------------- #
+                if update_type == "updates":
+                    only_key = next(iter(chunk))
+                    update_messages = chunk[only_key]['messages']
+                    res_message = update_messages[-1]
+                    record_tool_calls(update_messages)
+                    # 并行工具调用时一次更新包含多条工具结果，除最后一条外直接落库
+                    for tool_message in update_messages[:-1]:
+                        await recorder.add(tool_message)
+
+                    # 消息结束：剩余未成句的文本也送去合成
+                    rest = segmenter.flush()
+                    if rest:
+                        await tts_pipeline.submit(rest)
+
+                    # 等待本条消息剩余的语音片段全部合成完成，并按顺序推送
+                    for seg in await tts_pipeline.drain():
+                        yield audio_frame(seg)
+                        audio_segments.append(seg)
+
+                    # 如果包含工具调用，追加语音化提示（每个提示单独合成，以便命中缓存），并计入本条消息的音频
+                    if isinstance(res_message, AIMessage) and res_message.tool_calls:
+                        tool_texts = [voice_prompts[t["name"]] for t in res_message.tool_calls if t["name"] in voice_prompts]
+                        for tool_audio in await asyncio.gather(*(tts.text_to_speech(t) for t in tool_texts)):
+                            yield audio_frame(tool_audio)
+                            audio_segments.append(tool_audio)
+
+                    tts_key = None
+
+                    # 若 AI 消息生成完成，合并现有全部音频段（含工具语音提示）并上传
+                    if isinstance(res_message, AIMessage) and res_message.content:
+                        merged_audio = await asyncio.to_thread(merge_audio_base64_segments, list(audio_segments), tts.encoding)
+                        if merged_audio:
+                            tts_key = f"{res_message.id}.{audio_extension}"
+                            # 后台上传，tts_key 立即入库
+                            upload_queue.enqueue(merged_audio, tts_key, mime_type=audio_mime_type)
+                            stored_audio_bytes += len(merged_audio)
+
+                    # 消息完成即提交落库（后台合并写入，不阻塞推流）
+                    await recorder.add(res_message, tts_key)
+
+                    # 推送 AI 文本消息
+                    if isinstance(res_message, AIMessage):
+                        yield transport.message(res_message, tts_key)
+                    # 清空消息音频缓存
+                    audio_segments.clear()
+
+                # -------------------------- #
+                # 流类型：逐 Token 输出 + TTS 流式片段
+                # -------------------------- #
+                else:
+                    tmp_message = chunk[0]
+
+                    if isinstance(tmp_message, AIMessageChunk) and tmp_message.content:
+                        if not first_token_seen:
+                            first_token_seen = True
+                            CHAT_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start)
+                        # 增量断句，成句后提交到流水线（不等待合成结果）
+                        for piece in segmenter.feed(tmp_message.content):
+                            await tts_pipeline.submit(piece)
+
+                    # 推送已按顺序合成完毕的语音片段
+                    for seg in tts_pipeline.ready():
+                        yield audio_frame(seg)
+                        audio_segments.append(seg)
+
+        status = TurnStatus.completed
+    except (asyncio.CancelledError, GeneratorExit):
+        status = TurnStatus.cancelled
+        raise
+    finally:
+        # 6. 等待本轮消息全部落库并记录轮次状态（屏蔽取消，保证已生成的消息不丢失）
+        status = await asyncio.shield(recorder.finish(status))
+        CHAT_TURN_DURATION.observe(time.perf_counter() - start, status=status.value)
+
+    # 记录本轮音频字节数，用于评估压缩编码的收益
+    record_turn_audio_bytes(tts.encoding, stream_audio_bytes, stored_audio_bytes)
+
+    # 7. 后台更新会话摘要（不在请求路径上）
+    if status == TurnStatus.completed:
+        schedule_thread_summary(assistant_config, branch)
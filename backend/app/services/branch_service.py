@@ -0,0 +1,162 @@
+"""
+branch_service.py - 对话分支
+----------------------------------------------
+重新生成或编辑消息时不删除、也不复制历史，而是从分叉点新建分支：分叉点及之前的消息与父分支共享，
+之后生成的消息写入新分支（chat_message.branch_id）。根分支的 branch_id 即 thread_id。
+
+每个分支在 chat_branch.ancestry 中物化了祖先路径，确定任意分支的可见范围（BranchView.segments）
+只需一次查询，不随分叉层数递归回溯；历史记录、Redis 会话窗口与摘要均按分支区分。
+"""
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.core.logging_config import get_logger
+from backend.app.enums.message_type import MessageType
+from backend.app.models.chat_branch import ChatBranch
+from backend.app.models.chat_message import ChatMessage
+from backend.app.repositories.chat_branch_repository import (
+    get_branch, insert_branch, get_active_branch, set_active_branch, list_branches,
+)
+from backend.app.repositories.chat_message_repository import get_message_by_langgraph_id, get_last_message_of_type
+from backend.app.repositories.thread_summary_repository import get_thread_summary, upsert_thread_summary
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class BranchView:
+    thread_id: str
+    branch_id: str
+    # 祖先段 + 本分支 (branch_id, None)，见 chat_message_repository.Segments
+    segments: tuple[tuple[str, Optional[int]], ...]
+
+    @property
+    def is_root(self) -> bool:
+        return self.branch_id == self.thread_id
+
+
+def root_branch(thread_id: str) -> BranchView:
+    return BranchView(thread_id, thread_id, ((thread_id, None),))
+
+
+def _view(thread_id: str, branch_id: str, ancestry: list) -> BranchView:
+    segments = tuple((parent, until_id) for parent, until_id in ancestry) + ((branch_id, None),)
+    return BranchView(thread_id, branch_id, segments)
+
+
+async def resolve_active_branch(db: AsyncSession, thread_id: str) -> BranchView:
+    """获取会话当前分支的可见范围（会话不存在或未切换过分支时为根分支）"""
+    row = await get_active_branch(db, thread_id)
+    if row is None or row[0] is None:
+        return root_branch(thread_id)
+    active_branch_id, ancestry = row
+    if ancestry is None:
+        logger.warning(f"active branch {active_branch_id} not found, fallback to root, thread_id={thread_id}")
+        return root_branch(thread_id)
+    return _view(thread_id, active_branch_id, ancestry)
+
+
+async def get_branch_view(db: AsyncSession, thread_id: str, branch_id: str) -> BranchView:
+    """
+    获取指定分支的可见范围。
+
+    异常:
+        ValueError: 分支不存在或不属于该会话
+    """
+    if branch_id == thread_id:
+        return root_branch(thread_id)
+    branch = await get_branch(db, branch_id)
+    if branch is None or branch.thread_id != thread_id:
+        raise ValueError(f"branch not found: {branch_id}")
+    return _view(thread_id, branch.branch_id, branch.ancestry)
+
+
+async def get_message_view(db: AsyncSession, thread_id: str, langgraph_id: str) -> tuple[BranchView, ChatMessage]:
+    """
+    获取消息及其所在分支的可见范围。
+
+    异常:
+        ValueError: 消息不存在或不属于该会话
+    """
+    message = await get_message_by_langgraph_id(db, langgraph_id)
+    if message is None or message.thread_id != thread_id:
+        raise ValueError(f"message not found: {langgraph_id}")
+    return await get_branch_view(db, thread_id, message.branch_id or thread_id), message
+
+
+def segments_until(view: BranchView, until_id: int) -> tuple[tuple[str, Optional[int]], ...]:
+    """分支可见范围截止到 until_id（含）"""
+    return view.segments[:-1] + ((view.branch_id, until_id),)
+
+
+async def _fork(db: AsyncSession, view: BranchView, message: ChatMessage, until_id: int) -> BranchView:
+    """在 view 分支的 until_id 处分叉出新分支并设为当前分支（提交事务）"""
+    branch_id = uuid.uuid4().hex
+    ancestry = [list(segment) for segment in segments_until(view, until_id)]
+    await insert_branch(db, ChatBranch(
+        branch_id=branch_id,
+        thread_id=view.thread_id,
+        parent_branch_id=view.branch_id,
+        fork_message_id=until_id,
+        fork_langgraph_id=message.langgraph_id,
+        ancestry=ancestry,
+    ))
+    await set_active_branch(db, view.thread_id, branch_id)
+    # 父分支摘要覆盖的消息都在分叉点之前时，新分支直接沿用，不必重新生成
+    summary = await get_thread_summary(db, view.branch_id)
+    if summary is not None and summary.covered_until_id <= until_id:
+        await upsert_thread_summary(
+            db, branch_id, summary.content,
+            covered_until_id=summary.covered_until_id,
+            covered_until_langgraph_id=summary.covered_until_langgraph_id,
+            token_count=summary.token_count,
+        )
+    await db.commit()
+    logger.info(f"branch forked, thread_id={view.thread_id} parent={view.branch_id} branch={branch_id} until_id={until_id}")
+    return _view(view.thread_id, branch_id, ancestry)
+
+
+async def fork_branch(db: AsyncSession, thread_id: str, langgraph_id: str, include: bool = True) -> BranchView:
+    """
+    从任意消息处分叉出新分支并设为当前分支。
+
+    :param include: 新分支是否包含该消息（编辑用户消息时传 False，随后发送修改后的内容）
+    """
+    view, message = await get_message_view(db, thread_id, langgraph_id)
+    return await _fork(db, view, message, message.id if include else message.id - 1)
+
+
+async def fork_for_regenerate(db: AsyncSession, thread_id: str, langgraph_id: str) -> BranchView:
+    """
+    重新生成：从该消息所属轮次的用户消息处分叉（新分支包含该用户消息，回复由新一轮对话生成），
+    原回复保留在父分支中，可随时切换回去。
+    """
+    view, message = await get_message_view(db, thread_id, langgraph_id)
+    if message.type != MessageType.human:
+        message = await get_last_message_of_type(db, view.segments, MessageType.human.value, until_id=message.id)
+        if message is None:
+            raise ValueError(f"no user message before {langgraph_id}")
+    return await _fork(db, view, message, message.id)
+
+
+async def activate_branch(db: AsyncSession, thread_id: str, branch_id: str) -> BranchView:
+    """
+    切换会话当前分支（提交事务）。
+
+    异常:
+        ValueError: 会话或分支不存在
+    """
+    view = await get_branch_view(db, thread_id, branch_id)
+    if not await set_active_branch(db, thread_id, None if view.is_root else view.branch_id):
+        raise ValueError(f"session not found: {thread_id}")
+    await db.commit()
+    return view
+
+
+async def list_session_branches(db: AsyncSession, thread_id: str) -> tuple[str, list[ChatBranch]]:
+    """返回 (当前分支ID, 全部非根分支)"""
+    active = await resolve_active_branch(db, thread_id)
+    return active.branch_id, await list_branches(db, thread_id)
@@ -1,121 +1,212 @@
-from typing import List
+import asyncio
+import time
+from typing import List, Optional
+
+from langchain_core.messages import BaseMessage
 
-from fastapi import HTTPException
-from pydantic_core import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from datetime import datetime
 from backend.app.core.logging_config import get_logger
-from backend.app.enums.error.app_error import AppError
-from backend.app.models.chat_message import ChatMessage
-from backend.app.repositories.chat_message_repository import insert_messages_batch, insert_message, get_messages_by_thread_id
-from backend.app.schemas.chat_message import ChatMessageBase
+from backend.app.core.metrics import HISTORY_LOAD
+from backend.app.enums.message_type import MessageType
+from backend.app.repositories.chat_message_repository import (
+    get_messages_in_segments,
+    get_messages_by_token_budget,
+)
+from backend.app.schemas.chat_message import ChatMessageBase, ChatMessagePage
+from backend.app.core.settings import settings
+from backend.app.services.history_cache_service import (
+    read_cached_history,
+    populate_history_cache,
+)
+from backend.app.models.thread_summary import ThreadSummary
+from backend.app.repositories.thread_summary_repository import get_thread_summary
+from backend.app.services.branch_service import (
+    BranchView, resolve_active_branch, get_branch_view,
+)
+from backend.app.services.message_writer import message_writer
+from backend.app.services.summary_service import summary_record
+from backend.app.utils.agent_util import records_to_base_messages
+from backend.app.utils.cursor_util import encode_cursor, decode_cursor
+from backend.app.utils.token_util import count_message_tokens
 
 logger = get_logger(__name__)
-async def fetch_valid_langgraph_chat_messages(session_id: str, db: AsyncSession,windows_size:int,langgraph_id:str=None) -> List[ChatMessageBase]:
+def select_history_window(
+        records: List[dict], windows_size: int, max_tokens: Optional[int] = None,
+) -> tuple[List[dict], bool]:
     """
-    服务层：获取指定会话的有效聊天消息，并转换为 Pydantic 模型对象列表。
+    从按时间正序排列的历史记录中，自最新一条往前选取历史窗口：
+    条数不超过 windows_size，token 总数不超过 max_tokens（None 表示不限）。
 
-    参数:
-        session_id: 聊天会话 ID
-        db: 数据库异步会话对象
-        windows_size: 滑动窗口大小（+1 是为了多取一条供后续过滤）
-        langgraph_id: 可选参数，用于指定起始的 langgraph 节点 ID
+    窗口不会以 tool 消息开头（对应的工具调用已被截掉，GPT 会报错）。
 
     返回:
-        List[ChatMessageBase]: 聊天消息列表（Pydantic 格式）
-
-    异常:
-        HTTPException: 若模型转换失败或数据异常，则抛出 500 错误
+        (窗口记录, 是否受限): 受限表示因条数或 token 预算而截断，
+        否则说明 records 已全部选入（调用方需确认 records 是否覆盖了足够的历史）
     """
-    # 获取原始聊天消息（含 tool 类型），预留多一条供上下文过滤
-    chat_messages = await get_messages_by_thread_id(db, session_id,windows_size,langgraph_id)
-    # 从第一个非 tool 类型消息开始截取，避免 GPT 报错（因为开头不能是 tool）
-    try:
-        # 转换为标准 Pydantic 对象列表
-        return [ChatMessageBase.model_validate(msg) for msg in chat_messages]
-    except ValidationError as e:
-        # 转换失败时记录日志并抛出异常
-        logger.error(f"session id {session_id} windows_size {windows_size} Failed to convert chat message format: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail={"code":AppError.INTERNAL_SERVER_ERROR.code(), "message": AppError.INTERNAL_SERVER_ERROR.message()}
-
-        )
-async def save_chat_messages_batch(
-    messages: list[ChatMessageBase], db: AsyncSession,
-    thread_id:str,
-) :
+    if windows_size <= 0:
+        return [], True
+    total = 0
+    start = len(records)
+    bounded = False
+    for index in range(len(records) - 1, -1, -1):
+        if len(records) - index > windows_size:
+            bounded = True
+            break
+        record = records[index]
+        tokens = record.get("token_count")
+        if tokens is None:
+            tokens = record["token_count"] = count_message_tokens(record.get("content"), record.get("tool_calls"))
+        if max_tokens is not None and total + tokens > max_tokens:
+            bounded = True
+            break
+        total += tokens
+        start = index
+    while start < len(records) and records[start]["type"] == MessageType.tool:
+        start += 1
+    return records[start:], bounded
+
+
+def _strip_summarized(records: List[dict], summary: ThreadSummary) -> tuple[List[dict], bool]:
+    """去掉摘要已覆盖的消息，返回 (剩余记录, 是否找到摘要边界)"""
+    for index in range(len(records) - 1, -1, -1):
+        if records[index]["id"] == summary.covered_until_langgraph_id:
+            return records[index + 1:], True
+    return records, False
+
+
+async def load_history_records(
+        session_id: str, db: AsyncSession, windows_size: int,
+        max_tokens: Optional[int] = None, with_summary: bool = False,
+        branch: Optional[BranchView] = None,
+) -> List[dict]:
     """
-    批量保存聊天消息至数据库。
+    获取会话的历史窗口（历史记录 dict，见 agent_util.HISTORY_FIELDS）：
+    优先读取 Redis 会话窗口，未命中时用 Core 只查询所需的列。
 
     参数:
-        messages: 聊天消息列表（Pydantic 格式）
-        db: 异步数据库会话对象
-        user_id: 发送消息的用户 ID
-        user_name: 用户名称
-        session_id: 所属聊天会话 ID
-        user_type: 用户类型（如 0=普通用户，1=HR 等）
-
-    返回:
-        无（直接写入数据库）
+        session_id: 聊天会话 ID
+        db: 数据库异步会话对象
+        windows_size: 滑动窗口大小（最多返回的消息条数，不含摘要）
+        max_tokens: 可选参数，历史窗口的 token 预算（从最新消息往前累计，含摘要）
+        with_summary: 是否使用线程摘要：存在摘要时返回「摘要 system 消息 + 摘要之后的消息」
+        branch: 可选参数，读取的分支（缓存与摘要均按分支区分），默认为会话当前分支
     """
-    now = datetime.now()
-    objs = [
-        ChatMessage(
-            type=msg.type,
-            content=msg.content,
-            tool_calls=msg.tool_calls,
-            created_at=now,
-            updated_at=now,
-            thread_id=thread_id,
-            langgraph_id=msg.id,
-            tool_call_id=msg.tool_call_id,
-            name=msg.name,
-            message_group_id=msg.message_group_id,
-            artifact=msg.artifact,
-            tts_key=msg.tts_key,
+    start = time.perf_counter()
+    branch = branch or await resolve_active_branch(db, session_id)
+    summary = await get_thread_summary(db, branch.branch_id) if with_summary else None
+    prefix = [summary_record(summary)] if summary else []
+    if summary and max_tokens is not None:
+        max_tokens = max(0, max_tokens - summary.token_count)
+
+    # 优先读取 Redis 中的热点会话窗口（由写入时同步维护）
+    cached = await read_cached_history(branch.branch_id, windows_size + (1 if summary else 0))
+    if cached is not None:
+        cached_records, complete = cached
+        if summary:
+            cached_records, found = _strip_summarized(cached_records, summary)
+            complete = complete or found
+        window, bounded = select_history_window(cached_records, windows_size, max_tokens)
+        # 缓存中的消息足以确定窗口（已触及条数/预算上限、已到摘要边界或即为全部历史）时直接返回
+        if bounded or complete:
+            HISTORY_LOAD.observe(time.perf_counter() - start, source="cache")
+            return prefix + window
+
+    # 获取原始聊天消息（含 tool 类型），只取预算内需要的行
+    if summary:
+        # 从摘要边界那条消息开始取（边界消息留在缓存中，供之后的读取定位）
+        records, _ = await get_messages_by_token_budget(
+            db, branch.segments, windows_size + 1, max_tokens, from_id=summary.covered_until_id,
         )
-        for msg in messages
-    ]
-    # 批量插入数据库
-    await insert_messages_batch(db=db, messages=objs)
-
-async def save_chat_message(
-    message: ChatMessageBase, db: AsyncSession,    user_id,
-    user_name:str,
-    thread_id:str,
-    user_type:int,
-
-) :
+        complete = False
+        tail = _strip_summarized(records, summary)[0]
+    else:
+        records, complete = await get_messages_by_token_budget(db, branch.segments, windows_size, max_tokens)
+        tail = records
+    window, _ = select_history_window(tail, windows_size, max_tokens)
+    # 回源结果（已补齐 token 数）作为最近的一段连续历史写入缓存
+    await populate_history_cache(branch.branch_id, records, complete)
+    HISTORY_LOAD.observe(time.perf_counter() - start, source="db")
+    return prefix + window
+
+
+async def fetch_history_base_messages(
+        session_id: str, db: AsyncSession, windows_size: int,
+        max_tokens: Optional[int] = None, with_summary: bool = False,
+        branch: Optional[BranchView] = None,
+) -> List[BaseMessage]:
+    """对话链路使用：历史记录直接构造为 LangChain 消息，不经过 ChatMessageBase"""
+    records = await load_history_records(session_id, db, windows_size, max_tokens, with_summary, branch)
+    return records_to_base_messages(records)
+
+
+def _cursor_id(cursor: Optional[str]) -> Optional[int]:
+    if cursor is None:
+        return None
+    message_id = decode_cursor(cursor).get("id")
+    if not isinstance(message_id, int):
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    return message_id
+
+
+async def list_chat_messages_page(
+        session_id: str, db: AsyncSession, limit: int,
+        before_cursor: Optional[str] = None, after_cursor: Optional[str] = None,
+        branch_id: Optional[str] = None,
+) -> ChatMessagePage:
     """
-    批量保存聊天消息至数据库。
+    按 (branch_id, id) 键集分页获取分支可见的聊天记录，每页代价与页大小成正比，与会话总长度无关。
 
     参数:
-        messages: 聊天消息列表（Pydantic 格式）
-        db: 异步数据库会话对象
-        user_id: 发送消息的用户 ID
-        user_name: 用户名称
-        session_id: 所属聊天会话 ID
-        user_type: 用户类型（如 0=普通用户，1=HR 等）
+        session_id: 聊天会话 ID
+        db: 数据库异步会话对象
+        limit: 每页消息数
+        before_cursor: 可选，取该游标之前更早的一页（向前翻页）
+        after_cursor: 可选，取该游标之后的新消息（轮询）；不传游标时返回最新一页
+        branch_id: 可选，读取的分支，默认为会话当前分支
 
-    返回:
-        无（直接写入数据库）
+    异常:
+        ValueError: 游标不合法、同时指定了两个方向或分支不存在
     """
-    now = datetime.now()
-
-    obj=ChatMessage(
-
-            type=message.type,
-            content=message.content,
-            tool_calls=message.tool_calls,
-            created_at=now,
-            updated_at=now,
-            thread_id=thread_id,
-            langgraph_id=message.id,
-            tool_call_id=message.tool_call_id,
-            name=message.name,
+    before_id, after_id = _cursor_id(before_cursor), _cursor_id(after_cursor)
+    if before_id is not None and after_id is not None:
+        raise ValueError("before_cursor and after_cursor are mutually exclusive")
+    if branch_id is None:
+        segments = (await resolve_active_branch(db, session_id)).segments
+    else:
+        segments = (await get_branch_view(db, session_id, branch_id)).segments
+
+    if after_id is not None:
+        rows = await get_messages_in_segments(db, segments, limit, after_id=after_id)
+        return ChatMessagePage(
+            messages=[ChatMessageBase.model_validate(row) for row in rows],
+            after_cursor=encode_cursor({"id": rows[-1].id}) if rows else after_cursor,
         )
 
-    # 批量插入数据库
-    await insert_message(db=db, message=obj)
\ No newline at end of file
+    # 多取一条判断是否还有更早的消息
+    rows = await get_messages_in_segments(db, segments, limit + 1, before_id=before_id)
+    has_more = len(rows) > limit
+    rows = rows[-limit:] if limit > 0 else []
+    if rows:
+        newest_id = rows[-1].id
+    else:
+        newest_id = 0 if before_id is None else None
+    return ChatMessagePage(
+        messages=[ChatMessageBase.model_validate(row) for row in rows],
+        before_cursor=encode_cursor({"id": rows[0].id}) if has_more and rows else None,
+        after_cursor=encode_cursor({"id": newest_id}) if newest_id is not None else None,
+    )
+
+
+async def submit_message_records(
+        records: List[dict], thread_id: str, branch_id: Optional[str] = None,
+) -> asyncio.Future:
+    """
+    把历史记录提交到合并写入队列（与其他对话的消息同批 INSERT），返回落库完成的 future；
+    落库后同步追加到所属分支（为空时为根分支）的 Redis 会话窗口缓存。
+    """
+    for record in records:
+        # 写入时计算 token 数，供按预算截取历史窗口（缓存条目同样携带）
+        if record.get("token_count") is None:
+            record["token_count"] = count_message_tokens(record.get("content"), record.get("tool_calls"))
+    return await message_writer.submit(thread_id, records, branch_id)
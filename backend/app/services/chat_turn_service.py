@@ -0,0 +1,81 @@
+"""
+chat_turn_service.py - 单轮对话的增量持久化
+----------------------------------------------
+每条完成的消息（用户输入、AI 步骤、工具结果）立即提交到合并写入队列，不阻塞推流；
+轮次状态写入 chat_turn 表，轮次结束时等待本轮消息全部落库后更新为最终状态。
+"""
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+
+from langchain_core.messages import BaseMessage
+
+from backend.app.core.database import get_db_ctx
+from backend.app.core.logging_config import get_logger
+from backend.app.enums.turn_status import TurnStatus
+from backend.app.repositories.chat_turn_repository import upsert_chat_turn
+from backend.app.services.chat_message_service import submit_message_records
+from backend.app.utils.agent_util import message_record
+from backend.app.utils.task_util import spawn
+
+logger = get_logger(__name__)
+
+
+async def _save_turn_status(turn_id: str, thread_id: str, status: TurnStatus, message_count: int = 0):
+    finished_at = None if status == TurnStatus.running else datetime.now()
+    async with get_db_ctx() as db:
+        await upsert_chat_turn(db, turn_id, thread_id, status.value, message_count, finished_at)
+        await db.commit()
+
+
+class TurnRecorder:
+    def __init__(self, turn_id: str, thread_id: str, branch_id: Optional[str] = None):
+        """
+        :param turn_id: 轮次ID（用户消息的 langgraph_id，重新生成时为新的 ID），同时作为本轮消息的 message_group_id
+        :param thread_id: 对话线程ID
+        :param branch_id: 本轮消息写入的分支，为空时写入根分支
+        """
+        self.turn_id = turn_id
+        self.thread_id = thread_id
+        self.branch_id = branch_id
+        self.message_count = 0
+        self.failed = False
+        # 只保留尚未落库的写入 future，已完成的及时移除，内存占用与轮次长度无关
+        self._pending: List[asyncio.Future] = []
+        self._started = spawn(
+            _save_turn_status(turn_id, thread_id, TurnStatus.running),
+            name=f"turn-start:{turn_id}",
+        )
+
+    async def add(self, message: BaseMessage, tts_key: str = None) -> None:
+        """提交一条已完成的消息（入队即返回）"""
+        record = message_record(message, tts_key)
+        record["message_group_id"] = self.turn_id
+        self._pending.append(await submit_message_records([record], self.thread_id, self.branch_id))
+        self.message_count += 1
+        self._collect_done()
+
+    def _collect_done(self) -> None:
+        pending = []
+        for future in self._pending:
+            if not future.done():
+                pending.append(future)
+            elif future.exception() is not None:
+                self.failed = True
+        self._pending = pending
+
+    async def finish(self, status: TurnStatus) -> TurnStatus:
+        """等待本轮消息全部落库并写入最终状态；有消息写入失败时状态为 failed"""
+        results = await asyncio.gather(*self._pending, return_exceptions=True)
+        self._pending = []
+        if any(isinstance(r, BaseException) for r in results):
+            self.failed = True
+        if self.failed:
+            logger.error(f"some messages of turn {self.turn_id} failed to persist")
+            status = TurnStatus.failed
+        try:
+            await asyncio.gather(self._started, return_exceptions=True)
+            await _save_turn_status(self.turn_id, self.thread_id, status, self.message_count)
+        except Exception as e:
+            logger.error(f"failed to save turn status, turn_id={self.turn_id} status={status.value}: {e!r}")
+        return status
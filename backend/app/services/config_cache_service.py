@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.app.agents.files_manager_agent.graph import invalidate_file_agent
+from backend.app.core.connection import redis_client
+from backend.app.core.logging_config import get_logger
+from backend.app.core.settings import settings
+from backend.app.repositories.assistant_repository import get_assistant_by_id
+from backend.app.repositories.session_repository import get_session_with_assistant
+from backend.app.schemas.assistant_config import AssistantConfig
+from backend.app.utils.cache_util import LRUCache
+
+logger = get_logger(__name__)
+
+# 跨 worker 的缓存失效通知频道
+INVALIDATION_CHANNEL = "config-cache-invalidate"
+
+# session_id -> assistant_id
+_session_cache = LRUCache(maxsize=settings.CONFIG_CACHE_SIZE, ttl=settings.CONFIG_CACHE_TTL)
+# assistant_id -> AssistantConfig
+_assistant_cache = LRUCache(maxsize=settings.CONFIG_CACHE_SIZE, ttl=settings.CONFIG_CACHE_TTL)
+
+
+async def get_session_assistant_config(db: AsyncSession, session_id: str) -> AssistantConfig | None:
+    """
+    服务层：读取会话绑定的助手配置（进程内 TTL 缓存，未命中时一次联表查询回填）。
+
+    参数:
+        db: 数据库异步会话对象
+        session_id: 聊天会话 ID
+
+    返回:
+        AssistantConfig | None: 助手配置快照；会话不存在时返回 None
+    """
+    assistant_id = _session_cache.get(session_id)
+    if assistant_id is not None:
+        config = _assistant_cache.get(assistant_id)
+        if config is not None:
+            return config
+        # 会话已缓存但助手配置已过期：只查助手表
+        config = AssistantConfig.model_validate(await get_assistant_by_id(assistant_id, db))
+        _assistant_cache.set(assistant_id, config)
+        return config
+
+    row = await get_session_with_assistant(db, session_id)
+    if row is None:
+        return None
+    session, assistant = row
+    config = AssistantConfig.model_validate(assistant)
+    _session_cache.set(session_id, session.assistant_id)
+    _assistant_cache.set(assistant.id, config)
+    return config
+
+
+def invalidate_local(kind: str, key) -> None:
+    """仅失效当前进程内的缓存"""
+    if kind == "assistant":
+        _assistant_cache.pop(int(key))
+        invalidate_file_agent(int(key))
+    elif kind == "session":
+        _session_cache.pop(str(key))
+
+
+async def invalidate_config(kind: str, key) -> None:
+    """
+    失效助手/会话配置缓存：先失效本进程，再通过 Redis pub/sub 通知其他 worker。
+
+    参数:
+        kind: "assistant" 或 "session"
+        key: 助手 ID 或会话 ID
+    """
+    invalidate_local(kind, key)
+    try:
+        await redis_client.publish(INVALIDATION_CHANNEL, json.dumps({"kind": kind, "key": key}))
+    except Exception as e:
+        logger.error(f"failed to publish config invalidation {kind}:{key}: {e!r}")
+
+
+async def listen_config_invalidations():
+    """后台任务：订阅失效通知并清理本进程缓存，连接断开后自动重连"""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                data = message["data"]
+                if isinstance(data, bytes):
+                    data = data.decode("utf-8")
+                payload = json.loads(data)
+                invalidate_local(payload["kind"], payload["key"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 重连期间可能错过通知，清空缓存以保证一致性
+            logger.error(f"config invalidation listener failed, reconnecting: {e!r}")
+            _session_cache.clear()
+            _assistant_cache.clear()
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
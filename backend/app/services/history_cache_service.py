@@ -0,0 +1,114 @@
+import json
+from typing import List, Optional
+
+from backend.app.core.connection import redis_client
+from backend.app.core.logging_config import get_logger
+from backend.app.core.settings import settings
+
+logger = get_logger(__name__)
+
+# 缓存条目结构变化时递增版本号，旧版本的 key 自然失效
+# 条目为历史记录（agent_util.HISTORY_FIELDS）的 JSON
+HISTORY_CACHE_VERSION = 3
+
+# 仅当缓存已就绪（ready 标记存在）时追加消息，并裁剪到上限、续期；
+# 发生裁剪后 list 不再是完整历史，ready 标记改为 0
+_APPEND_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    return 0
+end
+for i = 3, #ARGV do
+    redis.call('RPUSH', KEYS[1], ARGV[i])
+end
+if redis.call('LLEN', KEYS[1]) > tonumber(ARGV[1]) then
+    redis.call('LTRIM', KEYS[1], -tonumber(ARGV[1]), -1)
+    redis.call('SET', KEYS[2], 0, 'KEEPTTL')
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+
+def _keys(branch_id: str) -> tuple[str, str]:
+    base = f"chat-history:v{HISTORY_CACHE_VERSION}:{branch_id}"
+    # 按分支缓存（根分支的 branch_id 即 thread_id）：list 保存该分支最近的一段连续消息（可以为空）；
+    # ready 标记存在表示缓存可用，值为 1 表示 list 即为该分支的全部历史
+    return base, base + ":ready"
+
+
+async def read_cached_history(branch_id: str, windows_size: int) -> Optional[tuple[List[dict], bool]]:
+    """
+    从 Redis 读取分支最近至多 windows_size 条消息。
+
+    返回:
+        (历史记录列表, 是否为完整历史) | None: 缓存未就绪、窗口超过缓存上限或 Redis 异常时返回 None（调用方回源 MySQL）。
+        列表可能少于 windows_size 条，由调用方判断是否足够。
+    """
+    if windows_size > settings.HISTORY_CACHE_MAX_MESSAGES:
+        return None
+    if windows_size <= 0:
+        return [], True
+    list_key, ready_key = _keys(branch_id)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.get(ready_key)
+            pipe.lrange(list_key, -windows_size, -1)
+            ready, items = await pipe.execute()
+    except Exception as e:
+        logger.warning(f"history cache read failed, branch_id={branch_id}: {e!r}")
+        return None
+    if ready is None:
+        return None
+    complete = ready in (1, "1", b"1")
+    return [json.loads(item) for item in items], complete
+
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, default=str)
+
+
+async def populate_history_cache(branch_id: str, messages: List[dict], complete: bool) -> None:
+    """
+    用 MySQL 中最近的一段连续消息（按时间正序）重建分支缓存。
+
+    :param complete: messages 是否为该分支的全部历史
+    """
+    list_key, ready_key = _keys(branch_id)
+    if len(messages) > settings.HISTORY_CACHE_MAX_MESSAGES:
+        messages, complete = messages[-settings.HISTORY_CACHE_MAX_MESSAGES:], False
+    items = [_dumps(m) for m in messages]
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(list_key)
+            if items:
+                pipe.rpush(list_key, *items)
+                pipe.expire(list_key, settings.HISTORY_CACHE_TTL)
+            pipe.set(ready_key, int(complete), ex=settings.HISTORY_CACHE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"history cache populate failed, branch_id={branch_id}: {e!r}")
+
+
+async def append_history_cache(branch_id: str, messages: List[dict]) -> None:
+    """消息写入数据库并提交后调用：追加到分支缓存（缓存未就绪时不做任何事）"""
+    if not messages:
+        return
+    list_key, ready_key = _keys(branch_id)
+    try:
+        await redis_client.eval(
+            _APPEND_SCRIPT, 2, list_key, ready_key,
+            settings.HISTORY_CACHE_MAX_MESSAGES, settings.HISTORY_CACHE_TTL,
+            *[_dumps(m) for m in messages],
+        )
+    except Exception as e:
+        # 追加失败时丢弃缓存，避免之后读到缺失消息的历史
+        logger.warning(f"history cache append failed, branch_id={branch_id}: {e!r}")
+        await invalidate_history_cache(branch_id)
+
+
+async def invalidate_history_cache(branch_id: str) -> None:
+    try:
+        await redis_client.delete(*_keys(branch_id))
+    except Exception as e:
+        logger.error(f"history cache invalidate failed, branch_id={branch_id}: {e!r}")
@@ -0,0 +1,207 @@
+"""
+message_writer.py - 聊天消息合并写入（group commit）
+----------------------------------------------
+所有进行中的对话把待写入的消息（历史记录 dict，见 agent_util.HISTORY_FIELDS）提交到同一个队列，后台写入任务每隔 flush_interval 秒
+或攒够 max_batch_rows 行时，用一条多行 Core INSERT 在一个事务内写入：
+高并发时把大量小事务合并为少量大事务，也省去 ORM 的 identity map 开销。
+合并写入失败时逐个任务单独事务重试，一条坏数据只让所属的对话写入失败。
+
+提交后返回 future，需要确认落库的调用方 await 即可；写入成功后按分支追加 Redis 会话窗口缓存。
+
+示例：
+    await message_writer.start()
+    future = await message_writer.submit(thread_id, records)    # 入队即返回
+    await future                                                # 需要时等待落库
+    await message_writer.write(thread_id, records)              # 等价于上面两步
+    await message_writer.stop()                                 # 写完队列中剩余的消息
+"""
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import Table, insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from backend.app.core.connection import engine
+from backend.app.core.logging_config import get_logger
+from backend.app.core.settings import settings
+from backend.app.models.chat_message import ChatMessage
+from backend.app.services.history_cache_service import append_history_cache
+
+logger = get_logger(__name__)
+
+
+def chat_message_row(record: dict, thread_id: str, now: datetime, branch_id: Optional[str] = None) -> dict:
+    """历史记录 -> chat_message 表的一行（branch_id 为空时写入根分支）"""
+    return {
+        "type": record["type"],
+        "content": record["content"],
+        "tool_calls": record.get("tool_calls"),
+        "created_at": now,
+        "updated_at": now,
+        "thread_id": thread_id,
+        "branch_id": branch_id or thread_id,
+        "langgraph_id": record["id"],
+        "tool_call_id": record.get("tool_call_id"),
+        "name": record.get("name"),
+        "message_group_id": record.get("message_group_id"),
+        "artifact": record.get("artifact"),
+        "tts_key": record.get("tts_key"),
+        "token_count": record.get("token_count"),
+    }
+
+
+@dataclass
+class WriteJob:
+    thread_id: str
+    branch_id: str
+    records: List[dict]
+    rows: List[dict]
+    future: asyncio.Future = field(repr=False)
+
+
+class MessageWriter:
+    def __init__(
+        self,
+        db_engine: AsyncEngine,
+        table: Table,
+        flush_interval: float = 0.02,
+        max_batch_rows: int = 500,
+        max_pending_jobs: int = 10000,
+        after_flush: Optional[Callable[[str, List[dict]], Awaitable[None]]] = None,
+    ):
+        """
+        :param db_engine: 数据库引擎
+        :param table: 写入的表
+        :param flush_interval: 攒批的最长等待时间（秒），从批次中第一条消息入队开始计算
+        :param max_batch_rows: 单次 INSERT 的最大行数
+        :param max_pending_jobs: 队列容量，写满后 submit 等待（背压）
+        :param after_flush: 每个分支的消息落库后调用（按分支、按提交顺序）
+        """
+        self.engine = db_engine
+        self.table = table
+        self.flush_interval = flush_interval
+        self.max_batch_rows = max(1, max_batch_rows)
+        self.max_pending_jobs = max_pending_jobs
+        self.after_flush = after_flush
+        self._queue: Optional[asyncio.Queue[WriteJob]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending_jobs)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止写入：等待队列中已提交的消息全部写完"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._queue = None
+
+    async def submit(self, thread_id: str, records: List[dict], branch_id: Optional[str] = None) -> asyncio.Future:
+        """
+        提交一组消息（保持顺序、同批落库），返回落库完成的 future（结果为 None，失败时为异常）。
+        branch_id 为空时写入根分支；写入任务未启动时直接写入。
+        """
+        now = datetime.now()
+        branch_id = branch_id or thread_id
+        future = asyncio.get_running_loop().create_future()
+        job = WriteJob(
+            thread_id=thread_id,
+            branch_id=branch_id,
+            records=list(records),
+            rows=[chat_message_row(r, thread_id, now, branch_id) for r in records],
+            future=future,
+        )
+        if not job.rows:
+            future.set_result(None)
+        elif self._queue is None:
+            await self._flush([job])
+        else:
+            await self._queue.put(job)
+        return future
+
+    async def write(self, thread_id: str, records: List[dict], branch_id: Optional[str] = None) -> None:
+        """提交并等待落库"""
+        await (await self.submit(thread_id, records, branch_id))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            rows = len(batch[0].rows)
+            deadline = loop.time() + self.flush_interval
+            while rows < self.max_batch_rows:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        job = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    job = self._queue.get_nowait()
+                batch.append(job)
+                rows += len(job.rows)
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _insert(self, jobs: List[WriteJob]) -> None:
+        rows = [row for job in jobs for row in job.rows]
+        async with self.engine.begin() as conn:
+            for start in range(0, len(rows), self.max_batch_rows):
+                await conn.execute(insert(self.table).values(rows[start:start + self.max_batch_rows]))
+
+    async def _flush(self, batch: List[WriteJob]):
+        try:
+            await self._insert(batch)
+            written = batch
+        except Exception as e:
+            logger.error(f"message writer flush failed, jobs={len(batch)}: {e!r}")
+            if len(batch) == 1:
+                written = []
+                if not batch[0].future.done():
+                    batch[0].future.set_exception(e)
+            else:
+                # 合并写入失败时逐个任务单独事务重试，只有出错的任务收到异常，不影响同批的其他对话
+                written = []
+                for job in batch:
+                    try:
+                        await self._insert([job])
+                        written.append(job)
+                    except Exception as job_error:
+                        logger.error(f"message writer job failed, thread_id={job.thread_id} rows={len(job.rows)}: {job_error!r}")
+                        if not job.future.done():
+                            job.future.set_exception(job_error)
+
+        if self.after_flush is not None:
+            per_branch: dict[str, List[dict]] = {}
+            for job in written:
+                per_branch.setdefault(job.branch_id, []).extend(job.records)
+            for branch_id, records in per_branch.items():
+                try:
+                    await self.after_flush(branch_id, records)
+                except Exception as e:
+                    logger.warning(f"message writer after_flush failed, branch_id={branch_id}: {e!r}")
+        for job in written:
+            if not job.future.done():
+                job.future.set_result(None)
+
+message_writer = MessageWriter(
+    db_engine=engine,
+    table=ChatMessage.__table__,
+    flush_interval=settings.MESSAGE_WRITER_FLUSH_INTERVAL_MS / 1000,
+    max_batch_rows=settings.MESSAGE_WRITER_BATCH_ROWS,
+    max_pending_jobs=settings.MESSAGE_WRITER_QUEUE_SIZE,
+    after_flush=append_history_cache,
+)
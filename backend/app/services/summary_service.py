@@ -0,0 +1,171 @@
+"""
+summary_service.py - 会话滚动摘要
+----------------------------------------------
+开启摘要的助手，在每轮对话结束后于后台检查当前分支中未被摘要覆盖的消息（摘要按分支保存，根分支即线程）：
+超过助手配置的 token 阈值时，把较早的部分与已有摘要合并成新摘要（增量生成），
+最近约一半阈值的消息保留原文。读取历史时返回「摘要 + 之后的原文消息」。
+"""
+import asyncio
+from typing import List, Optional
+
+from langchain.chat_models import init_chat_model
+from langchain_core.messages import SystemMessage, HumanMessage
+
+from backend.app.core.database import get_db_ctx
+from backend.app.core.logging_config import get_logger
+from backend.app.core.settings import settings
+from backend.app.enums.message_type import MessageType
+from backend.app.models.chat_message import ChatMessage
+from backend.app.models.thread_summary import ThreadSummary
+from backend.app.repositories.chat_message_repository import get_messages_after_id
+from backend.app.repositories.thread_summary_repository import get_thread_summary, upsert_thread_summary
+from backend.app.schemas.assistant_config import AssistantConfig
+from backend.app.services.branch_service import BranchView
+from backend.app.utils.cache_util import LRUCache
+from backend.app.utils.task_util import spawn
+from backend.app.utils.token_util import count_message_tokens
+
+logger = get_logger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "你是对话摘要助手。请把【已有摘要】和【新增对话】合并为一份新的摘要，供后续对话作为上下文使用。"
+    "保留用户的目标与偏好、已确认的事实、涉及的文件路径与命令执行结果、尚未完成的任务；"
+    "省略寒暄与重复内容。使用与对话相同的语言，直接输出摘要正文。"
+)
+
+# 摘要使用的模型客户端缓存：key 为 (provider, model_name, base_url, api_key)
+_summary_models = LRUCache(maxsize=settings.AGENT_CACHE_SIZE)
+# 分支 ID -> 正在执行的摘要任务（同一分支同时只有一个）
+_running: dict[str, asyncio.Task] = {}
+
+
+def summary_record(summary: ThreadSummary) -> dict:
+    """把线程摘要转换为放在历史最前面的 system 消息（历史记录结构）"""
+    return {
+        "id": f"summary-{summary.thread_id}",
+        "type": MessageType.system.value,
+        "content": f"以下是本次会话更早内容的摘要：\n{summary.content}",
+        "token_count": summary.token_count,
+    }
+
+
+def _message_tokens(message: ChatMessage) -> int:
+    if message.token_count is None:
+        return count_message_tokens(message.content, message.tool_calls)
+    return message.token_count
+
+
+def find_fold_boundary(messages: List[ChatMessage], keep_tokens: int, max_fold_tokens: int) -> int:
+    """
+    计算需要折叠进摘要的消息数 n（折叠 messages[:n]）：
+    - 保留最近约 keep_tokens 的消息原文，且保留部分必须从 human 消息开始（不拆开一轮对话）；
+    - 单次折叠的 token 数不超过 max_fold_tokens（超出部分留给下一次摘要）。
+    """
+    boundary = len(messages)
+    total = 0
+    for index in range(len(messages) - 1, -1, -1):
+        total += _message_tokens(messages[index])
+        if total > keep_tokens:
+            break
+        if messages[index].type == MessageType.human:
+            boundary = index
+
+    folded = 0
+    for index in range(boundary):
+        folded += _message_tokens(messages[index])
+        if folded > max_fold_tokens:
+            # 回退到本次可折叠范围内最后一个 human 消息之前
+            for cut in range(index, 0, -1):
+                if messages[cut].type == MessageType.human:
+                    return cut
+            return boundary
+    return boundary
+
+
+def _format_transcript(messages: List[ChatMessage]) -> str:
+    limit = settings.SUMMARY_TOOL_CONTENT_CHARS
+    lines = []
+    for m in messages:
+        if m.type == MessageType.human:
+            lines.append(f"用户：{m.content}")
+        elif m.type == MessageType.ai:
+            if m.content:
+                lines.append(f"助手：{m.content}")
+            for call in m.tool_calls or []:
+                lines.append(f"助手调用工具 {call.get('name')}：{call.get('args')}")
+        elif m.type == MessageType.tool:
+            content = m.content or ""
+            if len(content) > limit:
+                content = content[:limit] + "…（已截断）"
+            lines.append(f"工具 {m.name} 返回：{content}")
+    return "\n".join(lines)
+
+
+def _get_summary_model(config: AssistantConfig):
+    key = (config.provider, config.model_name, config.base_url, config.api_key)
+    model = _summary_models.get(key)
+    if model is None:
+        model = init_chat_model(
+            model=config.model_name, model_provider=config.provider,
+            base_url=config.base_url, api_key=config.api_key,
+        )
+        _summary_models.set(key, model)
+    return model
+
+
+async def summarize_thread(config: AssistantConfig, branch: BranchView) -> bool:
+    """
+    检查并增量更新分支摘要，返回是否生成了新摘要。
+    """
+    branch_id = branch.branch_id
+    async with get_db_ctx() as db:
+        summary = await get_thread_summary(db, branch_id)
+        after_id = summary.covered_until_id if summary else None
+        messages = await get_messages_after_id(db, branch.segments, after_id, settings.SUMMARY_MAX_INPUT_MESSAGES)
+
+    threshold = config.summary_trigger_tokens
+    if sum(_message_tokens(m) for m in messages) <= threshold:
+        return False
+    boundary = find_fold_boundary(messages, threshold // 2, settings.SUMMARY_MAX_INPUT_TOKENS)
+    if boundary <= 0:
+        return False
+    folded = messages[:boundary]
+
+    # 调用模型期间不占用数据库连接
+    prompt = (
+        f"【已有摘要】\n{summary.content if summary else '（无）'}\n\n"
+        f"【新增对话】\n{_format_transcript(folded)}"
+    )
+    response = await _get_summary_model(config).ainvoke(
+        [SystemMessage(content=SUMMARY_SYSTEM_PROMPT), HumanMessage(content=prompt)]
+    )
+    content = (response.content if isinstance(response.content, str) else str(response.content)).strip()
+    if not content:
+        logger.warning(f"empty summary generated, branch_id={branch_id}")
+        return False
+
+    last = folded[-1]
+    async with get_db_ctx() as db:
+        await upsert_thread_summary(
+            db, branch_id, content,
+            covered_until_id=last.id,
+            covered_until_langgraph_id=last.langgraph_id,
+            token_count=count_message_tokens(content),
+        )
+        await db.commit()
+    logger.info(f"thread summary updated, branch_id={branch_id} folded={len(folded)} until_id={last.id}")
+    return True
+
+
+def schedule_thread_summary(config: AssistantConfig, branch: BranchView) -> Optional[asyncio.Task]:
+    """对话结束后调用：助手开启摘要时在后台更新分支摘要（同一分支已有任务在执行时跳过）"""
+    if not config.summary_enabled:
+        return None
+    branch_id = branch.branch_id
+    running = _running.get(branch_id)
+    if running is not None and not running.done():
+        return None
+    task = spawn(summarize_thread(config, branch), name=f"summary:{branch_id}")
+    _running[branch_id] = task
+    task.add_done_callback(lambda t: _running.pop(branch_id, None) if _running.get(branch_id) is t else None)
+    return task
@@ -0,0 +1,81 @@
+"""
+turn_cancel_service.py - 取消进行中的对话
+----------------------------------------------
+每个 worker 登记本进程内持有会话锁、正在执行的对话任务（会话ID -> 任务），并订阅 Redis 取消频道：
+取消请求可以由任意 worker 收到，通过 publish_cancel 广播，执行该对话的 worker 取消对应任务，
+同时结束该会话工具启动的子进程。已完成的消息由 TurnRecorder 在任务结束时落库。
+"""
+import asyncio
+
+from backend.app.core.connection import redis_client
+from backend.app.core.logging_config import get_logger
+from backend.app.utils import process_registry
+from backend.app.utils.redis_util import CANCEL_CHANNEL_PREFIX, publish_cancel
+
+logger = get_logger(__name__)
+
+# 会话ID -> 本进程内持有会话锁、正在执行的对话任务（排队中的对话不登记）
+_running: dict[str, asyncio.Task] = {}
+
+
+def register_turn(session_id: str, task: asyncio.Task) -> None:
+    """拿到会话锁后登记对话任务，任务结束时自动移除"""
+    _running[session_id] = task
+    task.add_done_callback(lambda t: unregister_turn(session_id, t))
+
+
+def unregister_turn(session_id: str, task: asyncio.Task) -> None:
+    """释放会话锁前移除登记（该会话已登记的是其他任务时不做任何事）"""
+    if _running.get(session_id) is task:
+        del _running[session_id]
+
+
+def cancel_turn(session_id: str, task: asyncio.Task, reason: str = "cancelled") -> None:
+    """取消指定的对话任务；该任务持有会话锁（已登记）时一并结束会话的工具子进程"""
+    if task.done():
+        return
+    if _running.get(session_id) is task:
+        process_registry.cancel(session_id)
+    logger.info(f"cancelling turn, session_id={session_id} reason={reason}")
+    task.cancel(reason)
+
+
+def cancel_local(session_id: str, reason: str = "cancelled") -> bool:
+    """取消本进程内该会话正在执行的对话，返回是否存在这样的对话"""
+    task = _running.get(session_id)
+    if task is None or task.done():
+        return False
+    cancel_turn(session_id, task, reason)
+    return True
+
+
+async def request_cancel(session_id: str, reason: str = "user") -> None:
+    """请求取消会话正在执行的对话（无论在哪个 worker 上）"""
+    await publish_cancel(session_id, reason)
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+async def listen_turn_cancellations():
+    """后台任务：订阅取消通知并取消本进程内对应的对话，连接断开后自动重连"""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.psubscribe(CANCEL_CHANNEL_PREFIX + "*")
+            async for message in pubsub.listen():
+                if message["type"] != "pmessage":
+                    continue
+                session_id = _decode(message["channel"])[len(CANCEL_CHANNEL_PREFIX):]
+                cancel_local(session_id, _decode(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"turn cancellation listener failed, reconnecting: {e!r}")
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
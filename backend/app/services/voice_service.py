@@ -0,0 +1,49 @@
+import asyncio
+
+from sqlalchemy import select
+
+from backend.app.core.database import get_db_ctx
+from backend.app.core.logging_config import get_logger
+from backend.app.core.settings import settings
+from backend.app.models.assistant_config import Assistant
+from backend.app.utils.agent_util import voice_prompts
+from backend.app.utils.voice_util import TTSClient
+
+logger = get_logger(__name__)
+
+
+async def prewarm_voice_prompts(concurrency: int = 4):
+    """
+    预热 TTS 缓存：为每个已配置的音色（voice_type + speed_ratio + audio_encoding）合成全部工具调用语音提示。
+
+    参数:
+        concurrency: 预热时的最大并发合成数
+
+    返回:
+        无（结果写入 TTS 缓存）
+    """
+    async with get_db_ctx() as db:
+        result = await db.execute(
+            select(Assistant.voice_type, Assistant.speed_ratio, Assistant.audio_encoding).distinct()
+        )
+        voices = result.all()
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm(tts: TTSClient, text: str):
+        async with semaphore:
+            await tts.text_to_speech(text)
+
+    tasks = []
+    for voice_type, speed_ratio, audio_encoding in voices:
+        tts = TTSClient(
+            settings.TTS_AND_ASR_API_KEY,
+            voice_type=voice_type,
+            speed_ratio=float(speed_ratio) if speed_ratio is not None else 1.0,
+            audio_encoding=audio_encoding,
+        )
+        tasks.extend(warm(tts, text) for text in voice_prompts.values())
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failed = sum(1 for r in results if isinstance(r, Exception))
+    logger.info(f"TTS voice prompts prewarmed: voices={len(voices)} prompts={len(tasks)} failed={failed}")
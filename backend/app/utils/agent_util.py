@@ -1,4 +1,5 @@
 import json
+from base64 import b64decode
 from typing import List
 
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage, BaseMessage, message_to_dict
@@ -92,6 +93,68 @@ def chat_messages_base2base_message(raw_messages:List[ChatMessageBase]) -> List[
             langchain_messages.append(HumanMessage(**msg.model_dump() ))
 
     return langchain_messages
+# =====================
+# 历史消息记录（dict）<-> LangChain 消息的快速转换
+# =====================
+# 历史记录的字段（id 即 langgraph_id），数据库查询、Redis 缓存与写入队列均使用该结构，
+# 对话链路上不再经过 ChatMessageBase（Pydantic 模型仅用于接口响应）
+HISTORY_FIELDS = (
+    "id", "type", "content", "tool_calls", "tool_call_id", "name",
+    "artifact", "tts_key", "token_count", "message_group_id",
+)
+
+
+def message_record(msg: BaseMessage, tts_key: str = None) -> dict:
+    """LangChain 消息 -> 历史记录（写入数据库与缓存）"""
+    record = {
+        "id": msg.id,
+        "type": msg.type,
+        "content": msg.content,
+        "tool_calls": None,
+        "tool_call_id": None,
+        "name": None,
+        "artifact": None,
+        "tts_key": tts_key,
+        "token_count": None,
+        "message_group_id": None,
+    }
+    if isinstance(msg, AIMessage):
+        record["type"] = MessageType.ai.value
+        record["tool_calls"] = msg.tool_calls or None
+    elif isinstance(msg, ToolMessage):
+        record["name"] = msg.name
+        record["tool_call_id"] = msg.tool_call_id
+        record["artifact"] = msg.artifact
+    elif not isinstance(msg, SystemMessage):
+        # 其他类型按 human 处理
+        record["type"] = MessageType.human.value
+    return record
+
+
+def records_to_base_messages(records: List[dict]) -> List[BaseMessage]:
+    """
+    历史记录 -> LangChain 消息，直接构造消息对象（与 chat_messages_base2base_message 规则一致）。
+    """
+    human, ai, system, tool = (MessageType.human.value, MessageType.ai.value,
+                               MessageType.system.value, MessageType.tool.value)
+    result = []
+    append = result.append
+    for r in records:
+        msg_type = r["type"]
+        if msg_type == ai:
+            append(AIMessage(content=r["content"], id=r["id"], tool_calls=r.get("tool_calls") or []))
+        elif msg_type == tool:
+            append(ToolMessage(
+                content=r["content"], id=r["id"], name=r.get("name"),
+                tool_call_id=r.get("tool_call_id"), artifact=r.get("artifact"),
+            ))
+        elif msg_type == system:
+            append(SystemMessage(content=r["content"], id=r["id"]))
+        else:
+            append(HumanMessage(content=r["content"], id=r["id"]))
+    return result
+
+
 def sse_format(chunk, tts_key:str=None):
     """
     将 AIMessageChunk 格式化为 SSE 响应格式，支持 metadata 可为空。
@@ -117,6 +180,47 @@ def base64_format(base64:str):
     json_data = json.dumps(data)
     return f"event: audio\ndata: {json_data}\n\n"
 
+
+class SSETransport:
+    """
+    SSE 传输：文本、音频与其他事件均以 `event: xxx\ndata: {json}` 帧推送（兼容旧协议）。
+    """
+    def event(self, name: str, data: dict) -> str:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    def message(self, chunk, tts_key: str = None) -> str:
+        return sse_format(chunk, tts_key)
+
+    def audio(self, audio_base64: str) -> str:
+        return base64_format(audio_base64)
+
+    def keepalive(self) -> str:
+        # SSE 注释行，客户端忽略；长时间无输出时发送，及时发现断开的连接
+        return ": keep-alive\n\n"
+
+
+class WebSocketTransport:
+    """
+    WebSocket 传输：文本与其他事件为 JSON 文本帧 {"event": ..., "data": ...}，
+    每个音频片段为一个二进制帧（原始音频字节，无 base64/JSON 包装），帧顺序即播放顺序。
+    """
+    def event(self, name: str, data: dict) -> str:
+        return json.dumps({"event": name, "data": data})
+
+    def message(self, chunk, tts_key: str = None) -> str:
+        chunk_dict = message_to_dict(chunk)
+        if tts_key:
+            chunk_dict["data"]["tts_key"] = tts_key
+        return self.event("message", {"chunk": chunk_dict})
+
+    def audio(self, audio_base64: str) -> bytes | None:
+        if not audio_base64:
+            return None
+        return b64decode(audio_base64)
+
+    def keepalive(self) -> str:
+        return self.event("ping", {})
+
 voice_prompts = {
     "write_file": "请稍后，正在准备进行写入文件操作。",
     "read_file": "请稍后，正在读取文件内容。",
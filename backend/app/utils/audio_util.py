@@ -0,0 +1,141 @@
+"""
+audio_util.py - 音频容器处理工具
+----------------------------------------------
+不解码音频的前提下直接拼接同格式的音频片段：
+- WAV（RIFF/PCM）：读取各片段的 fmt/data 块，格式一致时只写一个文件头，
+  再把各片段的 PCM 数据依次拷贝进预先分配好的缓冲区；
+- MP3：去掉各片段的 ID3 标签后直接拼接 MPEG 帧。
+无法直接拼接时返回 None，由调用方回退到转码拼接。
+"""
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+# TTS 编码 -> (文件扩展名, MIME 类型)
+AUDIO_FORMATS = {
+    "wav": ("wav", "audio/wav"),
+    "mp3": ("mp3", "audio/mpeg"),
+    "ogg_opus": ("ogg", "audio/ogg"),
+}
+
+def base64_decoded_size(audio_base64: Optional[str]) -> int:
+    """不解码，直接根据 base64 字符串长度计算原始字节数"""
+    if not audio_base64:
+        return 0
+    padding = audio_base64.count("=", -2)
+    return len(audio_base64) * 3 // 4 - padding
+
+
+# WAV 文件头中 data 块大小为 0 或 0xFFFFFFFF 时（流式输出常见），视为“直到文件末尾”
+_STREAMING_SIZES = (0, 0xFFFFFFFF)
+
+
+@dataclass(frozen=True)
+class WavInfo:
+    fmt: bytes          # fmt 块原始内容（决定采样率、声道、位深等）
+    data_offset: int    # PCM 数据起始偏移
+    data_length: int    # PCM 数据长度
+
+    @property
+    def format_key(self) -> bytes:
+        # audio_format, channels, sample_rate, byte_rate, block_align, bits_per_sample
+        return self.fmt[:16]
+
+
+def parse_wav(data: bytes) -> Optional[WavInfo]:
+    """
+    解析 WAV 文件头，返回 fmt 块与 data 块位置；不是合法 RIFF/WAVE 时返回 None。
+    """
+    if len(data) < 12 or data[0:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        (chunk_size,) = struct.unpack_from("<I", data, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            fmt = bytes(data[body:body + chunk_size])
+        elif chunk_id == b"data":
+            if fmt is None or len(fmt) < 16:
+                return None
+            available = len(data) - body
+            if chunk_size in _STREAMING_SIZES or chunk_size > available:
+                chunk_size = available
+            return WavInfo(fmt=fmt, data_offset=body, data_length=chunk_size)
+        # RIFF 块按 2 字节对齐
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def build_wav_header(fmt: bytes, data_length: int) -> bytes:
+    """按给定 fmt 块与 PCM 数据长度生成 WAV 文件头"""
+    fmt_chunk = b"fmt " + struct.pack("<I", len(fmt)) + fmt + (b"\x00" if len(fmt) & 1 else b"")
+    riff_size = 4 + len(fmt_chunk) + 8 + data_length
+    return (
+        b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+        + fmt_chunk
+        + b"data" + struct.pack("<I", data_length)
+    )
+
+
+def concat_wav(segments: list[bytes]) -> Optional[bytes]:
+    """
+    零解码拼接多个 WAV 片段。
+
+    :param segments: WAV 文件字节列表
+    :return: 拼接后的 WAV 字节；存在非 WAV 片段或格式不一致时返回 None
+    """
+    infos = []
+    for segment in segments:
+        info = parse_wav(segment)
+        if info is None:
+            return None
+        infos.append(info)
+    if not infos:
+        return None
+
+    format_key = infos[0].format_key
+    if any(info.format_key != format_key for info in infos):
+        return None
+
+    total = sum(info.data_length for info in infos)
+    header = build_wav_header(infos[0].fmt, total)
+
+    # 预分配输出缓冲区，逐段拷贝 PCM 数据，避免反复拼接产生的复制
+    out = bytearray(len(header) + total)
+    out[:len(header)] = header
+    position = len(header)
+    for segment, info in zip(segments, infos):
+        end = info.data_offset + info.data_length
+        out[position:position + info.data_length] = memoryview(segment)[info.data_offset:end]
+        position += info.data_length
+    return bytes(out)
+
+
+def strip_id3(data: bytes) -> memoryview:
+    """去掉 MP3 开头的 ID3v2 标签与结尾的 ID3v1 标签，返回 MPEG 帧数据视图"""
+    view = memoryview(data)
+    start, end = 0, len(data)
+    if len(data) >= 10 and data[0:3] == b"ID3":
+        # ID3v2 标签大小为 4 个 7-bit 同步安全整数，头部 10 字节，可能附带 10 字节 footer
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        start = 10 + size + (10 if data[5] & 0x10 else 0)
+    if end - start >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    return view[start:end] if start < end else view[0:0]
+
+
+def concat_mp3(segments: list[bytes]) -> Optional[bytes]:
+    """
+    拼接多个 MP3 片段（MPEG 帧可直接首尾相接）。
+
+    :param segments: MP3 文件字节列表
+    :return: 拼接后的 MP3 字节；没有有效片段时返回 None
+    """
+    frames = [strip_id3(segment) for segment in segments]
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return None
+    return b"".join(frames)
@@ -0,0 +1,24 @@
+"""
+cursor_util.py - 分页游标编解码
+----------------------------------------------
+游标对客户端不透明：把排序键（如消息 id）序列化为 JSON 后做 URL 安全的 base64 编码。
+"""
+import base64
+import json
+
+
+def encode_cursor(key: dict) -> str:
+    raw = json.dumps(key, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """解码游标，格式不合法时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+    if not isinstance(key, dict):
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    return key
@@ -1,3 +1,6 @@
+import threading
+import time
+
 import qiniu
 import requests
 from qiniu import Auth
@@ -12,6 +15,27 @@ from backend.app.core.settings import settings
 # 认证对象
 auth = Auth(settings.KOBO_ACCESS_KEY, settings.KOBO_SECRET_KEY)
 
+# 上传凭证有效期（秒）及提前刷新的余量
+UPLOAD_TOKEN_EXPIRES = 3600
+UPLOAD_TOKEN_REFRESH_MARGIN = 300
+
+_upload_token: str | None = None
+_upload_token_deadline = 0.0
+_upload_token_lock = threading.Lock()
+
+
+def get_upload_token() -> str:
+    """
+    获取空间级上传凭证：在有效期内复用，临近过期时重新签发（上传在线程池中执行，需加锁）。
+    """
+    global _upload_token, _upload_token_deadline
+    with _upload_token_lock:
+        now = time.monotonic()
+        if _upload_token is None or now >= _upload_token_deadline:
+            _upload_token = auth.upload_token(settings.KOBO_BUCKET_NAME, expires=UPLOAD_TOKEN_EXPIRES)
+            _upload_token_deadline = now + UPLOAD_TOKEN_EXPIRES - UPLOAD_TOKEN_REFRESH_MARGIN
+        return _upload_token
+
 
 # =====================
 # 上传文件
@@ -24,7 +48,7 @@ def upload_data(data:bytes, key: str, mime_type: str = "audio/mpeg") -> bool:
     :param mime_type: 文件类型
     :return: 上传是否成功
     """
-    token = auth.upload_token(settings.KOBO_BUCKET_NAME)
+    token = get_upload_token()
     ret, info = qiniu.put_data(token, key, data, mime_type=mime_type)
     if ret is not None:
         return True
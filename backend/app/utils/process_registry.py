@@ -0,0 +1,88 @@
+"""
+process_registry.py - 工具子进程登记
+----------------------------------------------
+同步工具（如 run_command）在线程池中执行，取消对话任务无法中断线程本身；
+这里按会话登记工具启动的子进程，对话被取消时结束整个进程组，线程中的 communicate() 随之返回。
+
+会话被取消后直到下一轮开始（reset）前，新登记的进程会被立即结束，
+避免取消时恰好正在启动的命令继续运行。
+"""
+import os
+import signal
+import subprocess
+import threading
+
+from backend.app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_lock = threading.Lock()
+# 会话ID -> 正在运行的子进程
+_processes: dict[str, set[subprocess.Popen]] = {}
+# 已取消、尚未开始下一轮的会话
+_cancelled: set[str] = set()
+
+
+def popen_group_kwargs() -> dict:
+    """Popen 参数：子进程放入独立的进程组，取消时连同其派生的进程一起结束"""
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def cancel_process(proc: subprocess.Popen) -> None:
+    """结束子进程所在的整个进程组"""
+    if proc.poll() is not None:
+        return
+    try:
+        if os.name == "nt":
+            proc.kill()
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError) as e:
+        logger.warning(f"failed to kill process {proc.pid}: {e!r}")
+
+
+def register(scope: str, proc: subprocess.Popen) -> bool:
+    """登记子进程；会话已被取消时立即结束该进程并返回 False"""
+    with _lock:
+        if scope in _cancelled:
+            cancelled = True
+        else:
+            cancelled = False
+            _processes.setdefault(scope, set()).add(proc)
+    if cancelled:
+        cancel_process(proc)
+    return not cancelled
+
+
+def unregister(scope: str, proc: subprocess.Popen) -> None:
+    with _lock:
+        procs = _processes.get(scope)
+        if procs is not None:
+            procs.discard(proc)
+            if not procs:
+                del _processes[scope]
+
+
+def is_cancelled(scope: str) -> bool:
+    with _lock:
+        return scope in _cancelled
+
+
+def cancel(scope: str) -> int:
+    """取消会话：结束其全部子进程，返回结束的进程数"""
+    with _lock:
+        _cancelled.add(scope)
+        procs = list(_processes.pop(scope, ()))
+    for proc in procs:
+        cancel_process(proc)
+    if procs:
+        logger.info(f"killed {len(procs)} tool processes, scope={scope}")
+    return len(procs)
+
+
+def reset(scope: str) -> None:
+    """新一轮对话开始时调用：清除会话的取消标记"""
+    with _lock:
+        _cancelled.discard(scope)
@@ -0,0 +1,170 @@
+"""
+rate_limiter.py - 令牌桶限流 + 助手并发上限
+----------------------------------------------
+每次对话请求只需一次 Redis 调用（一个 Lua 脚本原子执行）：
+- 按客户端、按助手各一个令牌桶：按速率连续补充令牌、允许一定突发，不会像固定窗口那样在窗口边界放大流量；
+- 按助手的并发租约（ZSET，score 为租约到期时间）：限制同时调用同一模型服务的对话数，
+  对话结束时释放，进程崩溃时租约到期自动回收。
+任何一项不满足时都不扣减，返回被拒原因与建议的重试等待时间。
+
+示例：
+    decision = await rate_limiter.acquire(client_key, assistant_id)
+    if not decision.allowed:
+        ...                                     # 429，Retry-After: decision.retry_after
+    try:
+        ...
+    finally:
+        await decision.release()
+"""
+import math
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from backend.app.core.connection import redis_client
+from backend.app.core.logging_config import get_logger
+from backend.app.core.metrics import RATE_LIMIT_REJECTED
+from backend.app.core.settings import settings
+
+logger = get_logger(__name__)
+
+# 返回 {是否通过, 建议重试等待(ms), 被拒原因}
+# KEYS: 客户端令牌桶, 助手令牌桶, 助手并发租约
+# ARGV: 客户端速率(个/ms), 客户端容量, 助手速率(个/ms), 助手容量, 助手最大并发, 租约(ms), 租约ID, 并发已满时的重试等待(ms)
+# 速率或容量 <= 0 的令牌桶、最大并发 <= 0 的并发限制不生效
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local limit = tonumber(ARGV[5])
+if limit > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+    if redis.call('ZCARD', KEYS[3]) >= limit then
+        return {0, tonumber(ARGV[8]), 'concurrency'}
+    end
+end
+
+local buckets = {
+    {KEYS[1], tonumber(ARGV[1]), tonumber(ARGV[2]), 'client'},
+    {KEYS[2], tonumber(ARGV[3]), tonumber(ARGV[4]), 'assistant'},
+}
+local levels = {}
+for i, b in ipairs(buckets) do
+    levels[i] = false
+    if b[2] > 0 and b[3] > 0 then
+        local state = redis.call('HMGET', b[1], 'tokens', 'ts')
+        local tokens = tonumber(state[1]) or b[3]
+        local ts = tonumber(state[2]) or now
+        tokens = math.min(b[3], tokens + math.max(0, now - ts) * b[2])
+        if tokens < 1 then
+            return {0, math.ceil((1 - tokens) / b[2]), b[4]}
+        end
+        levels[i] = tokens
+    end
+end
+
+for i, b in ipairs(buckets) do
+    if levels[i] then
+        redis.call('HSET', b[1], 'tokens', tostring(levels[i] - 1), 'ts', now)
+        redis.call('PEXPIRE', b[1], math.ceil(b[3] / b[2]) + 1000)
+    end
+end
+if limit > 0 then
+    redis.call('ZADD', KEYS[3], now + tonumber(ARGV[6]), ARGV[7])
+    redis.call('PEXPIRE', KEYS[3], ARGV[6])
+end
+return {1, 0, ''}
+"""
+
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    # 建议的重试等待时间（秒）
+    retry_after: float = 0
+    # 被拒原因：client / assistant / concurrency
+    reason: str = ""
+    concurrency_key: Optional[str] = None
+    lease_id: Optional[str] = None
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+    async def release(self) -> None:
+        """释放并发租约（对话结束时调用，可重复调用）"""
+        if self.lease_id is None:
+            return
+        lease_id, self.lease_id = self.lease_id, None
+        try:
+            await redis_client.zrem(self.concurrency_key, lease_id)
+        except Exception as e:
+            # 释放失败时租约到期后自动回收
+            logger.warning(f"failed to release concurrency lease {self.concurrency_key}: {e!r}")
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        client_per_minute: float,
+        client_burst: int,
+        assistant_per_minute: float,
+        assistant_burst: int,
+        assistant_max_concurrency: int,
+        concurrency_lease: float = 600,
+        concurrency_retry_after: float = 1,
+    ):
+        """
+        :param client_per_minute: 单个客户端每分钟补充的令牌数（<= 0 不限制）
+        :param client_burst: 单个客户端令牌桶容量（允许的突发请求数）
+        :param assistant_per_minute: 单个助手每分钟补充的令牌数（<= 0 不限制）
+        :param assistant_burst: 单个助手令牌桶容量
+        :param assistant_max_concurrency: 单个助手同时进行的对话数上限（<= 0 不限制）
+        :param concurrency_lease: 并发租约时长（秒），应大于单轮对话的最长耗时，进程崩溃时到期回收
+        :param concurrency_retry_after: 并发已满时建议的重试等待时间（秒）
+        """
+        self.client_rate = client_per_minute / 60000
+        self.client_burst = client_burst
+        self.assistant_rate = assistant_per_minute / 60000
+        self.assistant_burst = assistant_burst
+        self.assistant_max_concurrency = assistant_max_concurrency
+        self.concurrency_lease = concurrency_lease
+        self.concurrency_retry_after = concurrency_retry_after
+
+    async def acquire(self, client_key: str, assistant_id: int) -> RateLimitDecision:
+        """检查并扣减客户端、助手的令牌，同时占用助手并发租约（一次 Redis 调用）"""
+        concurrency_key = f"rate-limit:concurrency:{assistant_id}"
+        lease_id = uuid.uuid4().hex
+        try:
+            allowed, retry_ms, reason = await redis_client.eval(
+                _ACQUIRE_SCRIPT, 3,
+                f"rate-limit:client:{client_key}",
+                f"rate-limit:assistant:{assistant_id}",
+                concurrency_key,
+                repr(self.client_rate), self.client_burst,
+                repr(self.assistant_rate), self.assistant_burst,
+                self.assistant_max_concurrency,
+                int(self.concurrency_lease * 1000), lease_id,
+                int(self.concurrency_retry_after * 1000),
+            )
+        except Exception as e:
+            # Redis 不可用时放行，避免限流组件拖垮全部对话
+            logger.warning(f"rate limiter unavailable, allowing request: {e!r}")
+            return RateLimitDecision(allowed=True)
+        if not allowed:
+            reason = reason.decode("utf-8") if isinstance(reason, bytes) else reason
+            RATE_LIMIT_REJECTED.inc(reason=reason)
+            return RateLimitDecision(allowed=False, retry_after=int(retry_ms) / 1000, reason=reason)
+        if self.assistant_max_concurrency <= 0:
+            return RateLimitDecision(allowed=True)
+        return RateLimitDecision(allowed=True, concurrency_key=concurrency_key, lease_id=lease_id)
+
+
+rate_limiter = RateLimiter(
+    client_per_minute=settings.RATE_LIMIT_CLIENT_PER_MINUTE,
+    client_burst=settings.RATE_LIMIT_CLIENT_BURST,
+    assistant_per_minute=settings.RATE_LIMIT_ASSISTANT_PER_MINUTE,
+    assistant_burst=settings.RATE_LIMIT_ASSISTANT_BURST,
+    assistant_max_concurrency=settings.ASSISTANT_MAX_CONCURRENCY,
+    concurrency_lease=settings.ASSISTANT_CONCURRENCY_LEASE,
+)
@@ -0,0 +1,210 @@
+"""
+session_lock.py - 会话锁（租约续期 + 公平排队）
+----------------------------------------------
+同一会话同时只有一轮对话在执行：
+- 锁为带租约的 Redis key（SET NX PX），持有期间后台 watchdog 每 lease/3 续期一次，
+  长时间的多工具调用不会因租约到期而丢锁；进程崩溃时租约到期自动释放；
+- 续期失败（租约已过期、锁已被他人持有）时取消持锁的任务，避免两个任务同时操作同一会话；
+- 锁被占用时进入按到达顺序排队的等待队列（ZSET，score 为递增序号），只有队首能拿到锁；
+  等待者定期心跳，超时未心跳（断开、崩溃）的票据会被清理，不会堵住队列；
+- 释放锁时通知队首等待者（BLPOP 其信号 key），无需忙轮询。
+
+示例：
+    lock = SessionLock(session_id)
+    try:
+        async for position in lock.wait():
+            ...                                 # 排队中，position 为前面还有几个（1 表示下一个）
+        if not lock.acquired:
+            ...                                 # 等待超时或队列已满
+        ...
+    finally:
+        await lock.release()                    # 释放锁或退出队列
+"""
+import asyncio
+import uuid
+from typing import AsyncIterator, Optional
+
+from backend.app.core.connection import redis_client
+from backend.app.core.logging_config import get_logger
+from backend.app.core.metrics import SESSION_LOCK_WAIT
+from backend.app.core.settings import settings
+
+logger = get_logger(__name__)
+
+# 返回 0 表示拿到锁，-1 表示队列已满，否则为排队位置（从 1 开始）
+# KEYS: 锁, 等待队列, 票据心跳, 序号；ARGV: 票据, 租约(ms), 票据存活时间(ms), 最大等待数
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local dead = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now)
+for _, ticket in ipairs(dead) do
+    redis.call('ZREM', KEYS[2], ticket)
+    redis.call('ZREM', KEYS[3], ticket)
+end
+if not redis.call('ZSCORE', KEYS[2], ARGV[1]) then
+    if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[4]) then
+        return -1
+    end
+    redis.call('ZADD', KEYS[2], redis.call('INCR', KEYS[4]), ARGV[1])
+end
+local head = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+if head == ARGV[1] and redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('ZREM', KEYS[3], ARGV[1])
+    return 0
+end
+redis.call('ZADD', KEYS[3], now + tonumber(ARGV[3]), ARGV[1])
+for i = 2, 4 do
+    redis.call('PEXPIRE', KEYS[i], ARGV[3])
+end
+return redis.call('ZRANK', KEYS[2], ARGV[1]) + 1
+"""
+
+# 持有者续期租约，返回 1 表示仍持有锁
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 持有者释放锁 / 等待者退出队列；锁空闲时通知新的队首
+# KEYS: 锁, 等待队列, 票据心跳；ARGV: 票据, 信号 key 前缀, 信号存活时间(ms)
+_RELEASE_SCRIPT = """
+local released = 0
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    released = 1
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    local head = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+    if head then
+        redis.call('RPUSH', ARGV[2] .. head, 1)
+        redis.call('PEXPIRE', ARGV[2] .. head, ARGV[3])
+    end
+end
+return released
+"""
+
+SIGNAL_PREFIX = "session-lock-signal:"
+
+
+class SessionLock:
+    def __init__(
+        self,
+        session_id: str,
+        lease: float = settings.SESSION_LOCK_LEASE,
+        wait_timeout: float = settings.SESSION_LOCK_WAIT_TIMEOUT,
+        max_waiters: int = settings.SESSION_LOCK_MAX_WAITERS,
+        poll_interval: float = 1.0,
+    ):
+        """
+        :param session_id: 会话ID
+        :param lease: 锁租约（秒），持有期间自动续期
+        :param wait_timeout: 最长排队等待时间（秒）
+        :param max_waiters: 单个会话最多排队的请求数，超出时直接失败
+        :param poll_interval: 排队时的心跳间隔（秒），同时是未收到释放通知时的重试间隔
+        """
+        self.session_id = session_id
+        self.lease = lease
+        self.wait_timeout = wait_timeout
+        self.max_waiters = max_waiters
+        self.poll_interval = poll_interval
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+        # watchdog 续期失败（锁已过期或已被他人持有）时置位，同时取消持锁的任务
+        self.lost = False
+        self._owner: Optional[asyncio.Task] = None
+        self._watchdog: Optional[asyncio.Task] = None
+        base = f"session-lock:{session_id}"
+        # 锁 key 与原先的 acquire_lock 保持一致
+        self._keys = (base, base + ":queue", base + ":alive", base + ":seq")
+        self._signal_key = SIGNAL_PREFIX + self.token
+
+    async def _try_acquire(self) -> int:
+        ticket_ttl = int(self.poll_interval * 3 * 1000)
+        return int(await redis_client.eval(
+            _ACQUIRE_SCRIPT, len(self._keys), *self._keys,
+            self.token, int(self.lease * 1000), ticket_ttl, self.max_waiters,
+        ))
+
+    async def wait(self) -> AsyncIterator[int]:
+        """
+        排队获取锁：位置变化时产出当前排队位置，拿到锁或放弃（超时、队列已满）后结束迭代，
+        结果见 self.acquired。立即拿到锁时不产出任何位置。
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.wait_timeout
+        last_position = None
+        outcome = "timeout"
+        try:
+            while True:
+                position = await self._try_acquire()
+                if position == 0:
+                    self.acquired = True
+                    outcome = "acquired"
+                    self._owner = asyncio.current_task()
+                    self._watchdog = asyncio.create_task(self._renew_loop())
+                    return
+                if position < 0:
+                    outcome = "rejected"
+                    logger.warning(f"session lock queue full, session_id={self.session_id}")
+                    return
+                if position != last_position:
+                    last_position = position
+                    yield position
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    logger.warning(f"session lock wait timed out, session_id={self.session_id} position={position}")
+                    return
+                # 等待释放通知，最多等一个心跳间隔（持有者崩溃时锁靠租约过期释放，不会发通知）
+                await redis_client.blpop([self._signal_key], timeout=min(remaining, self.poll_interval))
+        finally:
+            SESSION_LOCK_WAIT.observe(loop.time() - started, outcome=outcome)
+
+    async def acquire(self) -> bool:
+        """排队获取锁（不关心排队位置时使用），返回是否拿到锁"""
+        async for _ in self.wait():
+            pass
+        return self.acquired
+
+    async def _renew_loop(self):
+        interval = self.lease / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                renewed = await redis_client.eval(
+                    _RENEW_SCRIPT, 1, self._keys[0], self.token, int(self.lease * 1000)
+                )
+            except Exception as e:
+                # 暂时连不上 Redis 时继续尝试，租约到期前恢复即可
+                logger.warning(f"session lock renew failed, session_id={self.session_id}: {e!r}")
+                continue
+            if not renewed:
+                logger.error(f"session lock lost, cancelling holder, session_id={self.session_id}")
+                self.lost = True
+                if self._owner is not None and not self._owner.done():
+                    self._owner.cancel("session lock lost")
+                return
+
+    async def release(self) -> None:
+        """释放锁（未拿到锁时退出等待队列），并通知下一个等待者；可重复调用"""
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            await asyncio.gather(self._watchdog, return_exceptions=True)
+            self._watchdog = None
+        try:
+            released = await redis_client.eval(
+                _RELEASE_SCRIPT, 3, *self._keys[:3],
+                self.token, SIGNAL_PREFIX, int(self.poll_interval * 3 * 1000),
+            )
+            if self.acquired and not released:
+                logger.warning(f"session lock already expired on release, session_id={self.session_id}")
+        except Exception as e:
+            logger.error(f"session lock release failed, session_id={self.session_id}: {e!r}")
+        finally:
+            self.acquired = False
+            self._owner = None
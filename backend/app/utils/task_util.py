@@ -0,0 +1,43 @@
+"""
+task_util.py - 后台任务管理
+----------------------------------------------
+asyncio.create_task 返回的任务只被事件循环弱引用，未保存引用的任务可能在执行中被回收；
+这里统一持有后台任务的引用，记录未处理的异常，并在关闭时等待其结束。
+"""
+import asyncio
+from typing import Coroutine, Optional
+
+from backend.app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _on_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.error(f"background task {task.get_name()} failed: {exc!r}")
+
+
+def spawn(coro: Coroutine, name: Optional[str] = None) -> asyncio.Task:
+    """创建后台任务（不等待结果），异常只记录日志"""
+    task = asyncio.create_task(coro, name=name)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_done)
+    return task
+
+
+async def shutdown_background_tasks(timeout: float = 10) -> None:
+    """关闭时等待后台任务结束，超时后取消剩余任务"""
+    if not _background_tasks:
+        return
+    _, pending = await asyncio.wait(set(_background_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f"cancelled {len(pending)} background tasks on shutdown")
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,92 @@
+"""
+text_segmenter.py - 流式文本断句器（TTS 用）
+----------------------------------------------
+大模型逐 token 输出时，按句子切分出适合送去合成语音的文本片段：
+- 当长度 >= min_len 且末尾是句末标点时触发；
+- 若长度 >= max_len（且已出现过标点）则强制触发；
+- 避免句子被逗号切断；
+- 增量去除 markdown 加粗标记 "**"（支持跨 token 的 "*" + "*"）。
+
+每个 token 只被扫描一次，单次 feed 的开销与 token 长度成正比，与已输出的总长度无关。
+
+示例：
+    segmenter = SentenceSegmenter()
+    for token in stream:
+        for piece in segmenter.feed(token):
+            synthesize(piece)
+    rest = segmenter.flush()
+    if rest:
+        synthesize(rest)
+"""
+from typing import Optional
+
+# 常见标点（出现后才允许切分）
+PUNCTUATION = frozenset("。？！；，,.!?、")
+# 句末标点
+SENTENCE_END = frozenset("。？！!?")
+
+
+class SentenceSegmenter:
+    def __init__(self, min_len: int = 10, max_len: int = 40):
+        """
+        :param min_len: 触发切分的最小长度
+        :param max_len: 超过该长度（且已出现标点）时强制切分
+        """
+        self.min_len = min_len
+        self.max_len = max_len
+        self._reset()
+
+    def _reset(self):
+        self._parts: list[str] = []
+        self._length = 0
+        self._has_punctuation = False
+        self._last_char = ""
+        # 上一个 token 末尾的单个 "*"，等待与下一个 token 开头拼成 "**"
+        self._pending_star = False
+
+    def feed(self, token: str) -> list[str]:
+        """
+        输入一个新 token，返回本次触发的完整句子片段（可能为空列表）。
+        """
+        if not token:
+            return []
+        if self._pending_star:
+            token = "*" + token
+            self._pending_star = False
+        token = token.replace("**", "")
+        if token.endswith("*"):
+            token = token[:-1]
+            self._pending_star = True
+        if not token:
+            return []
+
+        # 只扫描新增字符
+        self._parts.append(token)
+        self._length += len(token)
+        if not self._has_punctuation and not PUNCTUATION.isdisjoint(token):
+            self._has_punctuation = True
+        stripped = token.rstrip()
+        if stripped:
+            self._last_char = stripped[-1]
+
+        if self._length < self.min_len or not self._has_punctuation:
+            return []
+        if self._last_char not in SENTENCE_END and self._length < self.max_len:
+            # 只是逗号类标点，继续等待更多内容
+            return []
+
+        piece = "".join(self._parts).strip()
+        pending_star = self._pending_star
+        self._reset()
+        self._pending_star = pending_star
+        return [piece] if piece else []
+
+    def flush(self) -> Optional[str]:
+        """
+        取出缓冲区剩余文本（消息结束时调用），并清空状态。
+        """
+        if self._pending_star:
+            self._parts.append("*")
+        rest = "".join(self._parts).strip()
+        self._reset()
+        return rest or None
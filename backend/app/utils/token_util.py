@@ -0,0 +1,48 @@
+"""
+token_util.py - Token 计数工具
+----------------------------------------------
+优先使用 tiktoken（cl100k_base）精确计数；编码表不可用时（如离线环境无法下载）
+退化为估算：CJK 字符按 1 个 token，其余字符按 4 个字符 1 个 token。
+"""
+import json
+from typing import Any, Optional
+
+from backend.app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# 每条消息的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoder = None
+_encoder_failed = False
+
+
+def _get_encoder():
+    global _encoder, _encoder_failed
+    if _encoder is None and not _encoder_failed:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            _encoder_failed = True
+            logger.warning(f"tiktoken unavailable, falling back to estimated token counts: {e!r}")
+    return _encoder
+
+
+def count_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    cjk = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_message_tokens(content: Optional[str], tool_calls: Optional[Any] = None) -> int:
+    """单条消息的 token 数：正文 + 工具调用参数 + 固定开销"""
+    tokens = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+    if tool_calls:
+        tokens += count_tokens(json.dumps(tool_calls, ensure_ascii=False))
+    return tokens
@@ -0,0 +1,122 @@
+"""
+tts_cache.py - TTS 合成结果缓存（内容寻址）
+----------------------------------------------
+缓存键由 (voice_type, speed_ratio, encoding, 归一化文本) 计算得到；
+两级缓存：进程内 LRU -> Redis（带 TTL），命中任一级即跳过供应商调用。
+同一进程内对相同文本的并发合成会合并为一次请求。
+"""
+import asyncio
+import hashlib
+import re
+from typing import Awaitable, Callable, Optional
+
+from backend.app.core.connection import redis_client
+from backend.app.core.logging_config import get_logger
+from backend.app.core.metrics import TTS_CACHE_LOOKUPS
+from backend.app.core.settings import settings
+from backend.app.utils.cache_util import LRUCache
+
+logger = get_logger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_tts_text(text: str) -> str:
+    """归一化待合成文本：去除首尾空白，折叠连续空白"""
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def tts_cache_key(voice_type: str, speed_ratio: float, encoding: str, text: str) -> str:
+    raw = f"{voice_type}|{float(speed_ratio or 1.0):.2f}|{encoding}|{text}"
+    return "tts-cache:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    def __init__(self, max_entries: int, redis_ttl: int, max_text_len: int):
+        """
+        :param max_entries: 进程内 LRU 最大条目数
+        :param redis_ttl: Redis 缓存过期时间（秒）
+        :param max_text_len: 超过该长度的文本不缓存
+        """
+        self.memory = LRUCache[str, str](max_entries)
+        self.redis_ttl = redis_ttl
+        self.max_text_len = max_text_len
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def cacheable(self, text: str) -> bool:
+        return 0 < len(text) <= self.max_text_len
+
+    async def get(self, key: str) -> Optional[str]:
+        audio_b64 = self.memory.get(key)
+        if audio_b64 is not None:
+            TTS_CACHE_LOOKUPS.inc(result="memory_hit")
+            return audio_b64
+
+        try:
+            audio_b64 = await redis_client.get(key)
+        except Exception as e:
+            logger.warning(f"TTS cache redis get failed: {e!r}")
+            audio_b64 = None
+        if audio_b64 is not None:
+            if isinstance(audio_b64, bytes):
+                audio_b64 = audio_b64.decode("ascii")
+            TTS_CACHE_LOOKUPS.inc(result="redis_hit")
+            self.memory.set(key, audio_b64)
+            return audio_b64
+
+        TTS_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    async def set(self, key: str, audio_b64: str) -> None:
+        self.memory.set(key, audio_b64)
+        try:
+            await redis_client.set(key, audio_b64, ex=self.redis_ttl)
+        except Exception as e:
+            logger.warning(f"TTS cache redis set failed: {e!r}")
+
+    async def get_or_synthesize(
+        self,
+        key: str,
+        synthesize: Callable[[], Awaitable[Optional[str]]],
+    ) -> Optional[str]:
+        """
+        读取缓存，未命中则调用 synthesize 合成并回填；相同 key 的并发请求共享同一次合成。
+        """
+        audio_b64 = await self.get(key)
+        if audio_b64 is not None:
+            return audio_b64
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # 仅当发起合成的请求被取消（而非当前请求被取消）时，由当前请求自行合成
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                return await synthesize()
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            audio_b64 = await synthesize()
+            if audio_b64:
+                await self.set(key, audio_b64)
+            future.set_result(audio_b64)
+            return audio_b64
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 避免无人等待时出现 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+tts_cache = TTSCache(
+    max_entries=settings.TTS_CACHE_MAX_ENTRIES,
+    redis_ttl=settings.TTS_CACHE_TTL,
+    max_text_len=settings.TTS_CACHE_MAX_TEXT_LEN,
+)
@@ -0,0 +1,104 @@
+"""
+tts_pipeline.py - 单轮对话内的并发 TTS 合成流水线
+----------------------------------------------
+句子片段按顺序提交到有界队列，由若干 worker 并发合成；
+合成结果按提交顺序取出，保证音频事件的播放顺序与文本一致。
+
+示例：
+    async with TTSPipeline(tts.text_to_speech, workers=3) as pipeline:
+        await pipeline.submit("第一句。")
+        await pipeline.submit("第二句。")
+        for audio_b64 in pipeline.ready():   # 非阻塞：取出已按序就绪的结果
+            ...
+        for audio_b64 in await pipeline.drain():   # 阻塞：等待剩余结果
+            ...
+"""
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+from backend.app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class TTSPipeline:
+    def __init__(
+        self,
+        synthesize: Callable[[str], Awaitable[Optional[str]]],
+        workers: int = 3,
+        queue_size: int = 16,
+    ):
+        """
+        :param synthesize: 异步合成函数，输入文本，返回 base64 音频或 None
+        :param workers: 并发合成的 worker 数量
+        :param queue_size: 待合成队列容量，队列满时 submit 会等待（背压）
+        """
+        self._synthesize = synthesize
+        self._worker_count = max(1, workers)
+        self._queue: asyncio.Queue[tuple[str, asyncio.Future]] = asyncio.Queue(maxsize=queue_size)
+        # 按提交顺序排列的结果 future
+        self._pending: deque[asyncio.Future] = deque()
+        self._workers: list[asyncio.Task] = []
+
+    async def __aenter__(self) -> "TTSPipeline":
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def start(self):
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._worker_count)]
+
+    async def close(self):
+        """停止所有 worker，未完成的合成任务直接丢弃"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+    async def submit(self, text: str) -> None:
+        """提交一段待合成文本（队列满时等待）"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        await self._queue.put((text, future))
+
+    def ready(self) -> list[Optional[str]]:
+        """按顺序取出队首已完成的结果，遇到未完成的片段即停止（不阻塞）"""
+        results = []
+        while self._pending and self._pending[0].done():
+            results.append(self._pending.popleft().result())
+        return results
+
+    async def drain(self) -> list[Optional[str]]:
+        """等待所有已提交片段合成完成，并按提交顺序返回结果"""
+        pending = list(self._pending)
+        self._pending.clear()
+        return list(await asyncio.gather(*pending))
+
+    async def _worker(self):
+        while True:
+            text, future = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                audio_b64 = await self._synthesize(text)
+                if not future.done():
+                    future.set_result(audio_b64)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                # 单个片段失败不影响后续片段，结果记为 None
+                logger.error(f"TTS pipeline synthesize failed: {e!r}")
+                if not future.done():
+                    future.set_result(None)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,236 @@
+"""
+upload_queue.py - 对象存储异步上传队列
+----------------------------------------------
+- 有界内存队列 + 多个 worker 并发上传，上传在线程中执行，不阻塞事件循环；
+- 失败按指数退避重试，最终失败或队列已满时写入本地 spool 目录（文件写入在线程中执行）；
+- spool 中的文件在启动时及定时任务中重新入队上传。
+
+示例：
+    await upload_queue.start()
+    upload_queue.enqueue(data, "audios/1.wav", "audio/wav")          # 后台上传，不等待
+    await upload_queue.upload(data, "audios/user1", "audio/webm")    # 等待上传完成
+    await upload_queue.stop()
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+import backend.app.utils.kobo_util as oss_util
+from backend.app.core.logging_config import get_logger
+from backend.app.core.metrics import OSS_UPLOAD
+from backend.app.core.settings import settings
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class UploadJob:
+    data: bytes
+    key: str
+    mime_type: str
+    # 需要等待上传结果的调用方通过该 future 获取结果
+    future: Optional[asyncio.Future] = field(default=None, repr=False)
+
+
+class UploadQueue:
+    def __init__(
+        self,
+        spool_dir: str,
+        max_size: int = 256,
+        workers: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        replay_interval: float = 60,
+    ):
+        """
+        :param spool_dir: 上传失败时的本地落盘目录
+        :param max_size: 内存队列容量
+        :param workers: 并发上传 worker 数量
+        :param max_retries: 单个任务最大重试次数
+        :param retry_backoff: 首次重试等待时间（秒），之后按 2 倍递增
+        :param replay_interval: 定时重放 spool 目录的间隔（秒）
+        """
+        self.spool_dir = spool_dir
+        self.max_size = max_size
+        self.worker_count = max(1, workers)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.replay_interval = replay_interval
+        self._queue: Optional[asyncio.Queue[UploadJob]] = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        if self._tasks:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._tasks.append(asyncio.create_task(self._replay_loop()))
+
+    async def stop(self, timeout: float = 10):
+        """停止上传：等待队列中的任务完成（最多 timeout 秒），剩余任务写入 spool"""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"upload queue drain timed out, spooling {self._queue.qsize()} jobs")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            # 停机阶段直接同步落盘：此时不再处理请求，且要保证进程退出前写完
+            self._spool(job)
+            if job.future is not None and not job.future.done():
+                job.future.set_result(False)
+        self._queue = None
+
+    def enqueue(self, data: bytes, key: str, mime_type: str = "audio/mpeg") -> None:
+        """
+        提交后台上传任务并立即返回（key 可以马上写入数据库）。
+        队列未启动或已满时直接写入 spool，由重放任务补传。
+        """
+        job = UploadJob(data=data, key=key, mime_type=mime_type)
+        if self._queue is None:
+            self._spool_in_background(job)
+            return
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            logger.warning(f"upload queue full, spooling key={key}")
+            self._spool_in_background(job)
+
+    async def upload(self, data: bytes, key: str, mime_type: str = "audio/mpeg") -> bool:
+        """提交上传任务并等待完成（队满时等待空位），返回是否上传成功"""
+        if self._queue is None:
+            return await self._put_with_retry(UploadJob(data=data, key=key, mime_type=mime_type))
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(UploadJob(data=data, key=key, mime_type=mime_type, future=future))
+        return await future
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                ok = await self._put_with_retry(job)
+                if not ok:
+                    await asyncio.to_thread(self._spool, job)
+                if job.future is not None and not job.future.done():
+                    job.future.set_result(ok)
+            except asyncio.CancelledError:
+                # 取消只发生在停机时：同步落盘，避免在已取消的任务中再次 await 被打断而丢失数据
+                self._spool(job)
+                if job.future is not None and not job.future.done():
+                    job.future.set_result(False)
+                raise
+            except Exception as e:
+                logger.error(f"upload worker failed, key={job.key}: {e!r}")
+                await asyncio.to_thread(self._spool, job)
+                if job.future is not None and not job.future.done():
+                    job.future.set_result(False)
+            finally:
+                self._queue.task_done()
+
+    async def _put_with_retry(self, job: UploadJob) -> bool:
+        delay = self.retry_backoff
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                if await asyncio.to_thread(oss_util.upload_data, job.data, job.key, job.mime_type):
+                    OSS_UPLOAD.observe(time.perf_counter() - start, outcome="ok")
+                    return True
+            except Exception as e:
+                logger.warning(f"upload failed, key={job.key} attempt={attempt + 1}: {e!r}")
+            OSS_UPLOAD.observe(time.perf_counter() - start, outcome="error")
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+                delay *= 2
+        return False
+
+    # =====================
+    # 本地 spool
+    # =====================
+    def _spool_in_background(self, job: UploadJob) -> None:
+        """在线程池中落盘（供同步调用方使用，不阻塞事件循环）；没有运行中的事件循环时直接写入"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._spool(job)
+            return
+        loop.run_in_executor(None, self._spool, job)
+
+    def _spool(self, job: UploadJob) -> None:
+        """
+        把上传任务写入 spool 目录：<name>.bin 为数据，<name>.json 为元信息（最后写入，作为完成标记）。
+        同步文件 I/O，事件循环中应通过 asyncio.to_thread 调用（停机路径除外）。
+        """
+        name = uuid.uuid4().hex
+        data_path = os.path.join(self.spool_dir, name + ".bin")
+        meta_path = os.path.join(self.spool_dir, name + ".json")
+        try:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            with open(data_path, "wb") as f:
+                f.write(job.data)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"key": job.key, "mime_type": job.mime_type}, f)
+        except OSError as e:
+            logger.error(f"failed to spool upload, key={job.key}: {e!r}")
+
+    async def replay_spool(self) -> int:
+        """把 spool 目录中的任务重新提交到队列，返回重放的任务数"""
+        if self._queue is None or not os.path.isdir(self.spool_dir):
+            return 0
+        replayed = 0
+        for filename in sorted(os.listdir(self.spool_dir)):
+            if not filename.endswith(".json"):
+                continue
+            if self._queue.qsize() >= self.max_size // 2:
+                # 给实时上传留出队列空间，剩余的下次再重放
+                break
+            meta_path = os.path.join(self.spool_dir, filename)
+            try:
+                meta, data = await asyncio.to_thread(self._unspool, meta_path)
+            except (OSError, ValueError) as e:
+                logger.error(f"failed to read spooled upload {filename}: {e!r}")
+                continue
+            self.enqueue(data, meta["key"], meta["mime_type"])
+            replayed += 1
+        if replayed:
+            logger.info(f"replayed {replayed} spooled uploads")
+        return replayed
+
+    @staticmethod
+    def _unspool(meta_path: str) -> tuple[dict, bytes]:
+        """读取并删除一个 spool 任务，返回 (元信息, 数据)"""
+        data_path = meta_path[:-len(".json")] + ".bin"
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(data_path, "rb") as f:
+            data = f.read()
+        os.remove(meta_path)
+        os.remove(data_path)
+        return meta, data
+
+    async def _replay_loop(self):
+        while True:
+            try:
+                await self.replay_spool()
+            except Exception as e:
+                logger.error(f"upload spool replay failed: {e!r}")
+            await asyncio.sleep(self.replay_interval)
+
+
+upload_queue = UploadQueue(
+    spool_dir=settings.UPLOAD_SPOOL_DIR,
+    max_size=settings.UPLOAD_QUEUE_SIZE,
+    workers=settings.UPLOAD_WORKERS,
+    max_retries=settings.UPLOAD_MAX_RETRIES,
+    retry_backoff=settings.UPLOAD_RETRY_BACKOFF,
+    replay_interval=settings.UPLOAD_SPOOL_REPLAY_INTERVAL,
+)
@@ -5,28 +5,73 @@ voice_util.py - 七牛云语音工具集（TTS + ASR）
 - 文本转语音 (Text-to-Speech)
 - 语音转文本 (Automatic Speech Recognition)
 
+所有 HTTP 请求均为异步调用，并共享同一个带连接池（keep-alive）的 aiohttp 会话，
+避免阻塞事件循环，也避免每次请求重新建立 TCP/TLS 连接。
+
 示例：
     from voice_util import TTSClient, ASRClient
 
     tts = TTSClient(api_key="your_api_key_here")
-    tts.text_to_speech("你好，世界", "hello.mp3")
+    audio_base64 = await tts.text_to_speech("你好，世界")
 
     asr = ASRClient(api_key="your_api_key_here")
-    result = asr.speech_to_text("https://example.com/audio.mp3")
+    result = await asr.speech_to_text("https://example.com/audio.mp3")
     print(result)
 """
 import io
-import re
+import base64
+import time
+
+import aiohttp
+from pydub import AudioSegment
 
+from backend.app.core.logging_config import get_logger
+from backend.app.core.metrics import TTS_REQUEST, ASR_REQUEST
+from backend.app.core.settings import settings
+from backend.app.utils.audio_util import AUDIO_FORMATS, concat_mp3, concat_wav
+from backend.app.utils.tts_cache import tts_cache, tts_cache_key, normalize_tts_text
 
+logger = get_logger(__name__)
+
+
+# =====================
+# 共享 HTTP 连接池
+# =====================
+_http_session: aiohttp.ClientSession | None = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    获取进程内共享的 aiohttp 会话（懒加载，必须在事件循环中调用）。
+
+    连接池大小、单 host 连接上限、keep-alive 与超时时间均由 settings 配置。
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=settings.VOICE_HTTP_POOL_LIMIT,
+            limit_per_host=settings.VOICE_HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=settings.VOICE_HTTP_KEEPALIVE_TIMEOUT,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings.VOICE_HTTP_TIMEOUT,
+            connect=settings.VOICE_HTTP_CONNECT_TIMEOUT,
+        )
+        _http_session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _http_session
+
+
+async def close_http_session():
+    """关闭共享会话（应用关闭时调用）"""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
 
 
 # =====================
 # TTS 客户端
 # =====================
-import requests
-import base64
-from pydub import AudioSegment
 class TTSClient:
     def __init__(
         self,
@@ -34,6 +79,7 @@ class TTSClient:
         base_url: str = "https://openai.qiniu.com/v1/voice/tts",
         voice_type: str = "qiniu_zh_female_wwxkjx",
         speed_ratio: float = 1.0,
+        audio_encoding: str = "wav",
     ):
         self.api_key = api_key
         self.base_url = base_url
@@ -43,21 +89,32 @@ class TTSClient:
         }
         self.voice_type = voice_type
         self.speed_ratio = speed_ratio
-        print(speed_ratio)
+        self.encoding = audio_encoding or "wav"
 
-    def text_to_speech(
+    async def text_to_speech(
         self,
         text: str,
-        encoding: str = "wav",
+        encoding: str | None = None,
     ) -> str | None:
         """
         文本转语音
         :param text: 要转换的文本
-        :param encoding: 输出音频格式 (如 wav/mp3)
+        :param encoding: 输出音频格式 (wav/mp3/ogg_opus)，默认使用客户端配置的编码
 
         :return: base64 音频字符串 或 None
         """
-        print(self.speed_ratio)
+        encoding = encoding or self.encoding
+        text = normalize_tts_text(text)
+        if not text:
+            return None
+        if not tts_cache.cacheable(text):
+            return await self._synthesize(text, encoding)
+
+        # 命中缓存则直接返回，不调用供应商接口
+        key = tts_cache_key(self.voice_type, self.speed_ratio, encoding, text)
+        return await tts_cache.get_or_synthesize(key, lambda: self._synthesize(text, encoding))
+
+    async def _synthesize(self, text: str, encoding: str) -> str | None:
         payload = {
             "audio": {
                 "voice_type": self.voice_type,
@@ -69,14 +126,17 @@ class TTSClient:
             }
         }
 
+        start = time.perf_counter()
         try:
-            response = requests.post(self.base_url, headers=self.headers, json=payload)
-            response.raise_for_status()
-        except requests.RequestException as e:
-            print(f"请求出错: {e}")
+            async with get_http_session().post(self.base_url, headers=self.headers, json=payload) as response:
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, TimeoutError) as e:
+            TTS_REQUEST.observe(time.perf_counter() - start, outcome="error")
+            logger.error(f"TTS 请求出错: {e!r}")
             return None
+        TTS_REQUEST.observe(time.perf_counter() - start, outcome="ok")
 
-        data = response.json()
         audio_base64 = data.get("audio") or data.get("data")
         return audio_base64
 
@@ -104,7 +164,7 @@ class ASRClient:
             "Authorization": f"Bearer {self.api_key}"
         }
 
-    def speech_to_text(self, audio_url: str, audio_format: str = "mp3"):
+    async def speech_to_text(self, audio_url: str, audio_format: str = "mp3"):
         """
         调用 ASR 接口进行语音识别
         :param audio_url: 音频文件的公网 URL
@@ -119,14 +179,17 @@ class ASRClient:
             }
         }
 
+        start = time.perf_counter()
         try:
-            response = requests.post(self.base_url, headers=self.headers, json=payload)
-            response.raise_for_status()
-        except requests.RequestException as e:
-            print(f"请求出错: {e}")
+            async with get_http_session().post(self.base_url, headers=self.headers, json=payload) as response:
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, TimeoutError) as e:
+            ASR_REQUEST.observe(time.perf_counter() - start, outcome="error")
+            logger.error(f"ASR 请求出错: {e!r}")
             return None
+        ASR_REQUEST.observe(time.perf_counter() - start, outcome="ok")
 
-        data = response.json()
         try:
             text = data["data"]["result"]["text"]
             print(f"✅ 识别结果: {text}")
@@ -137,60 +200,47 @@ class ASRClient:
             return None
 
 
-def has_punctuation(text):
-    """判断是否包含常见标点"""
-    return re.search(r"[。？！；，,.!?、]", text) is not None
-
-def is_sentence_end(text):
-    """判断是否为完整句子的结尾"""
-    return re.search(r"[。？！!?\n]$", text.strip()) is not None
-
-def text_to_speech_segments(stream_tokens, call_tts_api, min_len=10, max_len=40):
-    """
-    从大模型流中收集文本：
-    - 当长度>min_len 且末尾是句末标点时触发；
-    - 若超过max_len则强制触发；
-    - 避免句子被逗号切断；
-    """
-    buffer = ""
-    audio_segments = []
-
-    for token in stream_tokens:
-        buffer += token
-        buffer=buffer.replace("**", "")
-        # 判断是否可以触发
-        if len(buffer) >= min_len and has_punctuation(buffer):
-            if is_sentence_end(buffer) or len(buffer) >= max_len:
-                # ✅ 句末标点或太长 -> 触发TTS
-                text_piece = buffer.strip()
-                audio_b64 = call_tts_api(text_piece)
-                audio_segments.append(audio_b64)
-                buffer = ""  # 清空缓冲
-            else:
-                # ⚠️ 只是逗号类标点，继续等待更多内容
-                continue
-
-    # 🔚 收尾：如果还有未处理的内容，留给下一次拼接
-    if buffer.strip():
-        return audio_segments, buffer.strip()  # 👈 把剩余部分返回以便后续拼接
-    else:
-        return audio_segments, ""
-
-
 # ========== 三、拼接音频函数 ==========
-def merge_audio_base64_segments(audio_base64_list):
-    """
-    将多个 base64 音频片段拼接成一个完整音频（返回bytes）
+def merge_audio_base64_segments(audio_base64_list, encoding: str = "wav") -> bytes | None:
     """
-    combined = AudioSegment.silent(duration=0)  # 开始空音频
-    for idx, audio_b64 in enumerate(audio_base64_list):
-        if audio_b64:
-            audio_data = base64.b64decode(audio_b64)
-            segment = AudioSegment.from_file(io.BytesIO(audio_data),  format="wav")
-            combined += segment
+    将多个 base64 音频片段拼接成一个完整音频（返回bytes，没有有效片段时返回 None）
 
+    同一音色/格式的 WAV 片段直接拼接 PCM 数据，MP3 片段直接拼接帧（均不解码）；
+    WAV 格式不一致或其他编码（如 ogg_opus）时回退到 pydub 转码拼接。
+    CPU 开销较大，调用方应放到线程中执行。
+    """
+    segments = [base64.b64decode(audio_b64) for audio_b64 in audio_base64_list if audio_b64]
+    if not segments:
+        return None
+
+    if encoding == "wav":
+        merged = concat_wav(segments)
+    elif encoding == "mp3":
+        merged = concat_mp3(segments)
+    else:
+        merged = None
+    if merged is not None:
+        return merged
+    return _transcode_merge(segments, encoding)
+
+
+def _transcode_merge(segments: list[bytes], encoding: str) -> bytes:
+    """回退方案：解码各片段并统一为首个片段的采样参数后拼接，再按原编码导出"""
+    decoded = [AudioSegment.from_file(io.BytesIO(data)) for data in segments]
+    first = decoded[0]
+    raw = b"".join(
+        seg.set_frame_rate(first.frame_rate)
+        .set_channels(first.channels)
+        .set_sample_width(first.sample_width)
+        .raw_data
+        for seg in decoded
+    )
+    combined = first._spawn(raw)
 
     # 导出拼接后的完整音频
     output_buffer = io.BytesIO()
-    combined.export(output_buffer, format="wav")
-    return output_buffer.getvalue()
\ No newline at end of file
+    if encoding == "ogg_opus":
+        combined.export(output_buffer, format="ogg", codec="libopus")
+    else:
+        combined.export(output_buffer, format=AUDIO_FORMATS.get(encoding, ("wav",))[0])
+    return output_buffer.getvalue()
@@ -0,0 +1,151 @@
+"""
+bench_chat_message_index.py - chat_message (thread_id, id) 索引基准
+----------------------------------------------
+在 .env 配置的数据库中创建与 chat_message 结构相同的临时表 chat_message_bench，
+灌入大量数据后，对比添加 (thread_id, id) 索引前后
+`WHERE thread_id=? ORDER BY id DESC LIMIT n` 的查询延迟。
+
+建索引期间另起一个连接持续单行写入，记录写入次数与最大延迟，用于验证在线 DDL：
+MySQL 下 ALGORITHM=INPLACE, LOCK=NONE 建索引时写入不应被阻塞；
+其他数据库（如 SQLite）建索引会锁表，写入会一直等待到建完或超时。
+
+运行（项目根目录，默认 200 万行，约需数分钟）：
+    python -m backend.benchmarks.bench_chat_message_index --rows 2000000 --threads 20000
+本地没有 MySQL 时可通过 DATABASE_URL 指向 SQLite 文件（需要安装 aiosqlite）：
+    DATABASE_URL=sqlite+aiosqlite:///bench.db python -m backend.benchmarks.bench_chat_message_index
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+from sqlalchemy import MetaData, text
+
+from backend.app.core.connection import engine
+from backend.app.migrations.helpers import add_index, drop_index
+from backend.app.models.chat_message import ChatMessage
+
+TABLE = "chat_message_bench"
+INDEX = "ix_chat_message_thread_id_id"
+COVERING_INDEX = "ix_chat_message_thread_id_id_tokens"
+BATCH = 5000
+PROBE_INTERVAL = 0.01
+
+
+async def seed(rows: int, threads: int):
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        if conn.dialect.name == "mysql":
+            await conn.execute(text(f"CREATE TABLE {TABLE} LIKE chat_message"))
+        else:
+            bench_table = ChatMessage.__table__.to_metadata(MetaData(), name=TABLE)
+            await conn.run_sync(bench_table.create)
+        await drop_index(conn, TABLE, INDEX)
+        # 覆盖索引 (thread_id, id, token_count) 同样能服务该查询，基准中一并删除
+        await drop_index(conn, TABLE, COVERING_INDEX)
+
+    thread_ids = [uuid.uuid4().hex for _ in range(threads)]
+    start = time.perf_counter()
+    for offset in range(0, rows, BATCH):
+        batch = [random_row(thread_ids) for _ in range(min(BATCH, rows - offset))]
+        async with engine.begin() as conn:
+            await conn.execute(INSERT, batch)
+        if (offset // BATCH) % 40 == 0:
+            print(f"  seeded {offset + len(batch):>10} rows ({time.perf_counter() - start:.0f}s)")
+    return thread_ids
+
+
+INSERT = text(
+    f"INSERT INTO {TABLE} (type, content, thread_id, langgraph_id, token_count, created_at, updated_at) "
+    "VALUES (:type, :content, :thread_id, :langgraph_id, :token_count, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+)
+
+
+def random_row(thread_ids: list[str]) -> dict:
+    content = "x" * random.randint(20, 400)
+    return {
+        "type": random.choice(("human", "ai", "tool")),
+        "content": content,
+        "thread_id": random.choice(thread_ids),
+        "langgraph_id": uuid.uuid4().hex,
+        "token_count": len(content) // 4,
+    }
+
+
+async def probe_writes(thread_ids: list[str], stop: asyncio.Event) -> list[float]:
+    """建索引期间持续单行写入，返回每次写入的延迟（毫秒，失败的写入记为 inf）"""
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(INSERT, random_row(thread_ids))
+            latencies.append((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            print(f"  probe write failed after {(time.perf_counter() - start) * 1000:.0f}ms: {e!r}")
+            latencies.append(float("inf"))
+        await asyncio.sleep(PROBE_INTERVAL)
+    return latencies
+
+
+async def build_index(thread_ids: list[str]):
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_writes(thread_ids, stop))
+    # 让探测写入先开始，再开始建索引
+    await asyncio.sleep(PROBE_INTERVAL * 5)
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        await add_index(conn, TABLE, INDEX, ["thread_id", "id"])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    writes = await probe
+    print(f"{engine.dialect.name} index build took {elapsed:.2f}s")
+    if writes:
+        print(f"  concurrent writes during build: {len(writes)}, max latency {max(writes):.1f}ms")
+
+
+async def measure(thread_ids: list[str], samples: int, limit: int) -> list[float]:
+    query = text(f"SELECT * FROM {TABLE} WHERE thread_id = :thread_id ORDER BY id DESC LIMIT :limit")
+    latencies = []
+    async with engine.connect() as conn:
+        for thread_id in random.sample(thread_ids, min(samples, len(thread_ids))):
+            start = time.perf_counter()
+            (await conn.execute(query, {"thread_id": thread_id, "limit": limit})).all()
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<14} p50={statistics.median(latencies):8.2f}ms  p95={p95:8.2f}ms  max={latencies[-1]:8.2f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--threads", type=int, default=20_000)
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--keep", action="store_true", help="保留基准表")
+    args = parser.parse_args()
+
+    print(f"seeding {args.rows} rows across {args.threads} threads into {TABLE} ...")
+    thread_ids = await seed(args.rows, args.threads)
+
+    report("without index", await measure(thread_ids, args.samples, args.limit))
+
+    await build_index(thread_ids)
+
+    report("with index", await measure(thread_ids, args.samples, args.limit))
+
+    if not args.keep:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
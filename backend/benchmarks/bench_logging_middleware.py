@@ -0,0 +1,218 @@
+"""
+bench_logging_middleware.py - 请求日志中间件单请求开销基准
+----------------------------------------------
+在进程内直接驱动 ASGI 应用（不经过网络），模拟 /completions 请求（JSON 中携带 base64 音频）
+与 SSE 流式响应，对比每个请求在事件循环线程上的额外耗时：
+- legacy: 原 BaseHTTPMiddleware 实现，整体读取并记录请求体（需要安装 starlette）；
+- asgi: 纯 ASGI 中间件，请求体截断记录，不缓冲响应；
+每种中间件分别使用两种日志输出：
+- direct: 在事件循环线程上同步写 RotatingFileHandler；
+- queued: QueueHandler 入队，由 QueueListener 后台线程写文件。
+--write-delay-us 在每条日志写文件时额外阻塞指定时间，模拟磁盘繁忙、日志轮转等慢写入场景。
+
+各组合按轮次交替测量（--rounds），报告各轮 p50 的中位数，减少 CPU 频率、页缓存回写等
+时间相关的噪声对单次对比的影响。
+
+运行（项目根目录）：
+    python -m backend.benchmarks.bench_logging_middleware --requests 2000 --audio-kb 256 --rounds 5
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import queue
+import statistics
+import tempfile
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from backend.app.middlewares import logging as logging_middleware
+from backend.app.middlewares.logging import LoggingMiddleware
+
+CHUNK = 65536
+
+
+async def app(scope, receive, send):
+    """模拟业务接口：读完请求体后以流式响应下发若干帧"""
+    more_body = True
+    while more_body:
+        message = await receive()
+        more_body = message.get("more_body", False)
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/event-stream")],
+    })
+    for i in range(scope["frames"]):
+        await send({"type": "http.response.body", "body": b"data: {\"i\": %d}\n\n" % i, "more_body": True})
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def legacy_middleware(inner):
+    """原实现：BaseHTTPMiddleware + await request.body()，依赖 starlette"""
+    from starlette.middleware.base import BaseHTTPMiddleware
+
+    class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            start_time = time.time()
+            body_str = (await request.body()).decode("utf-8")
+            response = await call_next(request)
+            process_time = (time.time() - start_time) * 1000
+            logging_middleware.logger.info(
+                f"[SUCCESS] {request.method} {request.url.path} "
+                f"Status: {response.status_code} "
+                f"Time: {process_time:.2f}ms Body: {body_str}"
+            )
+            return response
+
+    return LegacyLoggingMiddleware(inner)
+
+
+def make_body(audio_kb: int) -> bytes:
+    audio = base64.b64encode(os.urandom(audio_kb * 1024)).decode()
+    return json.dumps({"content": "你好", "audio": audio}).encode()
+
+
+async def drive(asgi_app, body: bytes, frames: int):
+    chunks = [body[i:i + CHUNK] for i in range(0, len(body), CHUNK)] or [b""]
+    index = 0
+
+    async def receive():
+        nonlocal index
+        if index < len(chunks):
+            index += 1
+            return {"type": "http.request", "body": chunks[index - 1], "more_body": index < len(chunks)}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/v1/chat/1/completions",
+        "raw_path": b"/v1/chat/1/completions",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+        "frames": frames,
+    }
+    await asgi_app(scope, receive, send)
+
+
+async def measure(asgi_app, body: bytes, frames: int, requests: int) -> list[float]:
+    for _ in range(min(50, requests)):
+        await drive(asgi_app, body, frames)
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await drive(asgi_app, body, frames)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+class SlowFileHandler(RotatingFileHandler):
+    """每次写入额外阻塞 delay 秒，模拟慢磁盘"""
+
+    def __init__(self, *args, delay: float = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.write_delay = delay
+
+    def emit(self, record):
+        if self.write_delay:
+            time.sleep(self.write_delay)
+        super().emit(record)
+
+
+def use_sink(kind: str, path: str, write_delay: float = 0):
+    """把中间件 logger 的输出替换为指定的日志输出，返回清理函数"""
+    target = logging_middleware.logger
+    saved = target.handlers[:]
+    file_handler = SlowFileHandler(
+        path, maxBytes=10 * 1024 * 1024, backupCount=5, encoding="utf-8", delay=write_delay,
+    )
+    file_handler.setFormatter(logging.Formatter("[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s"))
+    listener = None
+    if kind == "queued":
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, file_handler)
+        listener.start()
+        target.handlers = [QueueHandler(log_queue)]
+    else:
+        target.handlers = [file_handler]
+
+    def restore():
+        if listener is not None:
+            listener.stop()
+        file_handler.close()
+        target.handlers = saved
+
+    return restore
+
+
+def summarize(latencies: list[float]) -> tuple[float, float]:
+    latencies = sorted(latencies)
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def report(name: str, rounds: list[tuple[float, float]], baseline: float):
+    """rounds 为每轮的 (p50, p95)，取各轮的中位数"""
+    median = statistics.median(r[0] for r in rounds)
+    p95 = statistics.median(r[1] for r in rounds)
+    spread = max(r[0] for r in rounds) - min(r[0] for r in rounds)
+    print(
+        f"{name:<16} p50={median:9.1f}us  p95={p95:9.1f}us  "
+        f"overhead(p50)={median - baseline:9.1f}us  p50 spread={spread:7.1f}us"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--audio-kb", type=int, default=256, help="请求中原始音频大小（KB，base64 前）")
+    parser.add_argument("--frames", type=int, default=20, help="流式响应帧数")
+    parser.add_argument("--max-body-bytes", type=int, default=1024)
+    parser.add_argument("--rounds", type=int, default=3, help="测量轮数，各组合在每轮中交替执行")
+    parser.add_argument("--write-delay-us", type=float, default=0, help="每条日志写文件的额外阻塞时间（微秒）")
+    args = parser.parse_args()
+
+    body = make_body(args.audio_kb)
+    print(
+        f"request body {len(body)} bytes, {args.frames} response frames, "
+        f"{args.requests} requests x {args.rounds} rounds, write delay {args.write_delay_us:g}us"
+    )
+
+    variants = [("asgi", LoggingMiddleware(app, log_body=True, max_body_bytes=args.max_body_bytes))]
+    try:
+        variants.insert(0, ("legacy", legacy_middleware(app)))
+    except ImportError:
+        print("starlette not installed, skipping legacy BaseHTTPMiddleware")
+
+    results: dict[str, list[tuple[float, float]]] = {"bare app": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(max(1, args.rounds)):
+            results["bare app"].append(summarize(await measure(app, body, args.frames, args.requests)))
+            for name, wrapped in variants:
+                for sink in ("direct", "queued"):
+                    restore = use_sink(sink, os.path.join(tmp, f"{name}-{sink}.log"), args.write_delay_us / 1e6)
+                    try:
+                        latencies = await measure(wrapped, body, args.frames, args.requests)
+                    finally:
+                        restore()
+                    results.setdefault(f"{name}+{sink}", []).append(summarize(latencies))
+
+    baseline = statistics.median(r[0] for r in results["bare app"])
+    for name, rounds in results.items():
+        report(name, rounds, baseline)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
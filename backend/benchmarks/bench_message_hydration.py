@@ -0,0 +1,110 @@
+"""
+bench_message_hydration.py - 历史消息 -> LangChain 消息转换基准
+----------------------------------------------
+对比每 1000 条消息的耗时与内存分配（tracemalloc）：
+- 读取（数据库）：ORM 对象 -> ChatMessageBase.model_validate -> chat_messages_base2base_message
+  vs Core 行（dict）-> records_to_base_messages
+- 读取（Redis 缓存）：ChatMessageBase.model_validate_json -> chat_messages_base2base_message
+  vs json.loads -> records_to_base_messages
+- 写入：base_message2chat_messages_base vs message_record
+
+不需要数据库，运行（项目根目录）：
+    python -m backend.benchmarks.bench_message_hydration --messages 1000 --repeat 20
+"""
+import argparse
+import json
+import time
+import tracemalloc
+import uuid
+
+from backend.app.models.chat_message import ChatMessage
+from backend.app.schemas.chat_message import ChatMessageBase
+from backend.app.utils.agent_util import (
+    base_message2chat_messages_base,
+    chat_messages_base2base_message,
+    message_record,
+    records_to_base_messages,
+)
+
+
+def make_records(count: int) -> list[dict]:
+    """human -> ai(工具调用) -> tool -> ai 循环的历史记录"""
+    records = []
+    while len(records) < count:
+        call_id = uuid.uuid4().hex
+        records.extend([
+            {"id": uuid.uuid4().hex, "type": "human", "content": "帮我列出当前目录下的文件" * 3},
+            {"id": uuid.uuid4().hex, "type": "ai", "content": "好的，我先查看目录结构。",
+             "tool_calls": [{"name": "show_tree", "args": {"path": "."}, "id": call_id, "type": "tool_call"}]},
+            {"id": uuid.uuid4().hex, "type": "tool", "content": "a.txt\nb.txt\n" * 40,
+             "name": "show_tree", "tool_call_id": call_id},
+            {"id": uuid.uuid4().hex, "type": "ai", "content": "当前目录下有 a.txt 和 b.txt 等文件。" * 4},
+        ])
+    records = records[:count]
+    for i, record in enumerate(records):
+        for field in ("tool_calls", "tool_call_id", "name", "artifact", "tts_key", "message_group_id"):
+            record.setdefault(field, None)
+        record["token_count"] = 50 + i % 7
+    return records
+
+
+def orm_rows(records: list[dict]) -> list[ChatMessage]:
+    rows = []
+    for i, r in enumerate(records):
+        data = {k: v for k, v in r.items() if k != "id"}
+        rows.append(ChatMessage(id=i + 1, langgraph_id=r["id"], thread_id="bench", **data))
+    return rows
+
+
+def measure(name: str, func, repeat: int, per: int):
+    func()  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    result = func()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(s.count_diff for s in stats if s.count_diff > 0)
+    del result
+
+    scale = 1000 / per
+    print(f"{name:<34} {elapsed * 1000 * scale:8.2f} ms/1k  peak {peak * scale / 1024:8.1f} KiB/1k  "
+          f"live blocks {blocks * scale:8.0f}/1k")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    records = make_records(args.messages)
+    rows = orm_rows(records)
+    cached = [ChatMessageBase.model_validate(r).model_dump_json() for r in records]
+    messages = records_to_base_messages(records)
+
+    n, repeat = args.messages, args.repeat
+    print(f"{n} messages, {repeat} rounds")
+    measure("read db: orm -> pydantic -> lc",
+            lambda: chat_messages_base2base_message([ChatMessageBase.model_validate(m) for m in rows]), repeat, n)
+    measure("read db: core rows -> lc",
+            lambda: records_to_base_messages([dict(r) for r in records]), repeat, n)
+    measure("read cache: pydantic json -> lc",
+            lambda: chat_messages_base2base_message([ChatMessageBase.model_validate_json(c) for c in cached]), repeat, n)
+    measure("read cache: json.loads -> lc",
+            lambda: records_to_base_messages([json.loads(c) for c in cached]), repeat, n)
+    measure("write: lc -> pydantic -> dict",
+            lambda: [m.model_dump() for m in base_message2chat_messages_base(messages, [None] * n)], repeat, n)
+    measure("write: lc -> record",
+            lambda: [message_record(m) for m in messages], repeat, n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+bench_message_writer.py - 聊天消息写入吞吐基准
+----------------------------------------------
+在 .env 配置的 MySQL 中创建与 chat_message 结构相同的临时表 chat_message_bench，
+模拟大量并发对话各自保存一轮消息，对比：
+- orm: 原写入路径，每轮一个会话 add_all + commit（每轮一个事务）；
+- writer: MessageWriter 合并写入，多轮消息合并为一条多行 INSERT。
+
+运行（项目根目录）：
+    python -m backend.benchmarks.bench_message_writer --turns 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import MetaData, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import declarative_base
+
+from backend.app.core.connection import engine
+from backend.app.models.chat_message import ChatMessage
+from backend.app.services.message_writer import MessageWriter, chat_message_row
+
+TABLE = "chat_message_bench"
+bench_table = ChatMessage.__table__.to_metadata(MetaData(), name=TABLE)
+BenchBase = declarative_base()
+
+
+class BenchMessage(BenchBase):
+    __table__ = bench_table
+
+
+def make_turn(messages_per_turn: int) -> list[dict]:
+    group = uuid.uuid4().hex
+    return [
+        {
+            "id": uuid.uuid4().hex,
+            "type": "human" if i == 0 else "ai",
+            "content": "x" * 200,
+            "message_group_id": group,
+            "token_count": 60,
+        }
+        for i in range(messages_per_turn)
+    ]
+
+
+async def run_orm(turns: list[tuple[str, list[dict]]], concurrency: int) -> float:
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def save(thread_id, messages):
+        async with semaphore, session_factory() as db:
+            db.add_all([BenchMessage(**chat_message_row(m, thread_id, now)) for m in messages])
+            await db.commit()
+
+    now = datetime.now()
+    start = time.perf_counter()
+    await asyncio.gather(*(save(t, m) for t, m in turns))
+    return time.perf_counter() - start
+
+
+async def run_writer(turns: list[tuple[str, list[dict]]], concurrency: int, interval_ms: float, batch_rows: int) -> float:
+    writer = MessageWriter(engine, bench_table, flush_interval=interval_ms / 1000, max_batch_rows=batch_rows)
+    await writer.start()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def save(thread_id, messages):
+        async with semaphore:
+            await writer.write(thread_id, messages)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(save(t, m) for t, m in turns))
+    elapsed = time.perf_counter() - start
+    await writer.stop()
+    return elapsed
+
+
+async def reset_table():
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        await conn.execute(text(f"CREATE TABLE {TABLE} LIKE chat_message"))
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--messages-per-turn", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=20)
+    parser.add_argument("--batch-rows", type=int, default=500)
+    parser.add_argument("--keep", action="store_true", help="保留基准表")
+    args = parser.parse_args()
+
+    rows = args.turns * args.messages_per_turn
+    for name in ("orm", "writer"):
+        await reset_table()
+        turns = [(uuid.uuid4().hex, make_turn(args.messages_per_turn)) for _ in range(args.turns)]
+        if name == "orm":
+            elapsed = await run_orm(turns, args.concurrency)
+        else:
+            elapsed = await run_writer(turns, args.concurrency, args.interval_ms, args.batch_rows)
+        print(f"{name:<8} {rows} rows in {elapsed:6.2f}s  {rows / elapsed:10.0f} rows/s  {args.turns / elapsed:8.0f} turns/s")
+
+    if not args.keep:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
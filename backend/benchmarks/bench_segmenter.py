@@ -0,0 +1,84 @@
+"""
+bench_segmenter.py - 流式断句器微基准
+----------------------------------------------
+对比旧实现（每个 token 重建整个缓冲区并对全量文本做 replace/正则扫描）
+与 SentenceSegmenter（只扫描新增字符）在回答变长时的单 token 开销。
+
+运行（项目根目录）：
+    python -m backend.benchmarks.bench_segmenter
+"""
+import re
+import time
+
+from backend.app.utils.text_segmenter import SentenceSegmenter
+
+# 模拟一段没有句末标点的长回答（例如长代码块/列表），最能暴露旧实现的二次复杂度
+TOKEN = "这是一段**很长**的回答内容 "
+CHECKPOINTS = (1_000, 2_000, 4_000, 8_000, 16_000)
+
+
+def _has_punctuation(text):
+    return re.search(r"[。？！；，,.!?、]", text) is not None
+
+
+def _is_sentence_end(text):
+    return re.search(r"[。？！!?\n]$", text.strip()) is not None
+
+
+def legacy_segments(stream_tokens, min_len=10, max_len=40):
+    """旧版 text_to_speech_segments 的断句逻辑（去掉了 TTS 调用）"""
+    buffer = ""
+    pieces = []
+    for token in stream_tokens:
+        buffer += token
+        buffer = buffer.replace("**", "")
+        if len(buffer) >= min_len and _has_punctuation(buffer):
+            if _is_sentence_end(buffer) or len(buffer) >= max_len:
+                pieces.append(buffer.strip())
+                buffer = ""
+    return pieces, buffer.strip()
+
+
+def bench_legacy():
+    stream_tokens = []
+    results = {}
+    start = time.perf_counter()
+    window_start, window_tokens = start, 0
+    for i in range(1, CHECKPOINTS[-1] + 1):
+        stream_tokens.append(TOKEN)
+        _, remain = legacy_segments(stream_tokens)
+        stream_tokens = [remain]
+        window_tokens += 1
+        if i in CHECKPOINTS:
+            now = time.perf_counter()
+            results[i] = (now - window_start) / window_tokens * 1e6
+            window_start, window_tokens = now, 0
+    return results
+
+
+def bench_segmenter():
+    segmenter = SentenceSegmenter()
+    results = {}
+    start = time.perf_counter()
+    window_start, window_tokens = start, 0
+    for i in range(1, CHECKPOINTS[-1] + 1):
+        segmenter.feed(TOKEN)
+        window_tokens += 1
+        if i in CHECKPOINTS:
+            now = time.perf_counter()
+            results[i] = (now - window_start) / window_tokens * 1e6
+            window_start, window_tokens = now, 0
+    segmenter.flush()
+    return results
+
+
+def main():
+    legacy = bench_legacy()
+    incremental = bench_segmenter()
+    print(f"{'tokens':>8} {'legacy us/token':>16} {'segmenter us/token':>19}")
+    for n in CHECKPOINTS:
+        print(f"{n:>8} {legacy[n]:>16.2f} {incremental[n]:>19.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from backend.app.models.chat_message import ChatMessage
+from backend.app.repositories.chat_message_repository import (
+    get_messages_by_token_budget, get_messages_in_segments, get_last_message_of_type,
+)
+from backend.app.services import branch_service
+from backend.app.services.branch_service import _view, resolve_active_branch, root_branch, segments_until
+
+THREAD = "thread"
+
+
+def fork(view, until_id: int, branch_id: str):
+    """与 branch_service._fork 相同的祖先路径计算（不写库）"""
+    return _view(view.thread_id, branch_id, [list(s) for s in segments_until(view, until_id)])
+
+
+# 根分支 1-4；在 2 处分叉出 b1（5、6）；在 b1 的 5 处分叉出 b2（7）；分叉后根分支继续写入 8
+ROOT = root_branch(THREAD)
+B1 = fork(ROOT, 2, "b1")
+B2 = fork(B1, 5, "b2")
+MESSAGES = [
+    (1, THREAD, "human"), (2, THREAD, "ai"), (3, THREAD, "human"), (4, THREAD, "ai"),
+    (5, "b1", "human"), (6, "b1", "ai"), (7, "b2", "ai"), (8, THREAD, "human"),
+]
+
+
+def test_root_branch():
+    assert ROOT.is_root
+    assert ROOT.segments == ((THREAD, None),)
+
+
+def test_fork_materializes_ancestry():
+    assert not B1.is_root
+    assert B1.segments == ((THREAD, 2), ("b1", None))
+    assert B2.segments == ((THREAD, 2), ("b1", 5), ("b2", None))
+
+
+def test_segments_until_caps_own_branch():
+    assert segments_until(B2, 7) == ((THREAD, 2), ("b1", 5), ("b2", 7))
+    assert segments_until(ROOT, 3) == ((THREAD, 3),)
+
+
+def test_resolve_active_branch(monkeypatch):
+    rows = {
+        "root": (None, None),
+        "forked": ("b2", [[THREAD, 2], ["b1", 5]]),
+        "dangling": ("gone", None),
+    }
+
+    async def fake_get_active_branch(db, thread_id):
+        return rows.get(thread_id)
+
+    monkeypatch.setattr(branch_service, "get_active_branch", fake_get_active_branch)
+
+    assert asyncio.run(resolve_active_branch(None, "missing")) == root_branch("missing")
+    assert asyncio.run(resolve_active_branch(None, "root")) == root_branch("root")
+    assert asyncio.run(resolve_active_branch(None, "forked")).segments == (
+        (THREAD, 2), ("b1", 5), ("b2", None),
+    )
+    # 分支记录已丢失时回退到根分支
+    assert asyncio.run(resolve_active_branch(None, "dangling")) == root_branch("dangling")
+
+
+def with_db(test):
+    async def main():
+        db_engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with db_engine.begin() as conn:
+            await conn.run_sync(ChatMessage.__table__.create)
+            await conn.execute(insert(ChatMessage.__table__), [
+                {
+                    "id": message_id, "type": type_, "content": f"m{message_id}", "thread_id": THREAD,
+                    "branch_id": branch_id, "langgraph_id": f"lg-{message_id}", "token_count": 10 * message_id,
+                }
+                for message_id, branch_id, type_ in MESSAGES
+            ])
+        try:
+            async with async_sessionmaker(db_engine)() as db:
+                await test(db)
+        finally:
+            await db_engine.dispose()
+
+    asyncio.run(main())
+
+
+def ids(messages) -> list[int]:
+    return [m.id for m in messages]
+
+
+def test_branch_sees_only_its_ancestry():
+    async def test(db):
+        assert ids(await get_messages_in_segments(db, ROOT.segments, 10)) == [1, 2, 3, 4, 8]
+        assert ids(await get_messages_in_segments(db, B1.segments, 10)) == [1, 2, 5, 6]
+        assert ids(await get_messages_in_segments(db, B2.segments, 10)) == [1, 2, 5, 7]
+
+    with_db(test)
+
+
+def test_segment_pagination_crosses_fork_points():
+    async def test(db):
+        assert ids(await get_messages_in_segments(db, B2.segments, 2)) == [5, 7]
+        assert ids(await get_messages_in_segments(db, B2.segments, 2, before_id=5)) == [1, 2]
+        assert ids(await get_messages_in_segments(db, B2.segments, 2, after_id=1)) == [2, 5]
+        assert (await get_last_message_of_type(db, B2.segments, "human")).id == 5
+        assert (await get_last_message_of_type(db, B2.segments, "human", until_id=4)).id == 1
+
+    with_db(test)
+
+
+def test_token_budget_window_on_branch():
+    async def test(db):
+        # B2 可见 1、2、5、7（token 10、20、50、70）：从最新往前累加，到 5 时已超出 100
+        records, complete = await get_messages_by_token_budget(db, B2.segments, 10, max_tokens=100)
+        assert [r["id"] for r in records] == ["lg-5", "lg-7"]
+        assert not complete
+
+        records, complete = await get_messages_by_token_budget(db, B2.segments, 10, max_tokens=None)
+        assert [r["id"] for r in records] == ["lg-1", "lg-2", "lg-5", "lg-7"]
+        assert complete
+
+    with_db(test)
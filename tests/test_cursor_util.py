@@ -0,0 +1,28 @@
+import base64
+
+import pytest
+
+from backend.app.utils.cursor_util import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("key", [{"id": 1}, {"id": 123456789, "dir": "before"}, {"name": "会话"}])
+def test_round_trip(key):
+    assert decode_cursor(encode_cursor(key)) == key
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor({"id": 1, "q": "?>?>"})
+
+    assert "=" not in cursor
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    "",
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
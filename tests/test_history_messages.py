@@ -0,0 +1,51 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from backend.app.schemas.chat_message import ChatMessageBase
+from backend.app.utils.agent_util import (
+    HISTORY_FIELDS, chat_messages_base2base_message, message_record, records_to_base_messages,
+)
+
+TOOL_CALL = {"id": "call-1", "name": "run_command", "args": {"command": "ls"}, "type": "tool_call"}
+
+RECORDS = [
+    {"id": "m1", "type": "system", "content": "summary"},
+    {"id": "m2", "type": "human", "content": "list files"},
+    {"id": "m3", "type": "ai", "content": "", "tool_calls": [TOOL_CALL]},
+    {"id": "m4", "type": "tool", "content": "a.txt", "name": "run_command",
+     "tool_call_id": "call-1", "artifact": "stdout"},
+    {"id": "m5", "type": "ai", "content": "done", "tool_calls": None},
+]
+
+
+def test_records_hydrate_to_langchain_messages():
+    messages = records_to_base_messages(RECORDS)
+
+    assert [type(m) for m in messages] == [SystemMessage, HumanMessage, AIMessage, ToolMessage, AIMessage]
+    assert [m.id for m in messages] == ["m1", "m2", "m3", "m4", "m5"]
+    assert messages[2].tool_calls == [TOOL_CALL]
+    assert messages[3].name == "run_command"
+    assert messages[3].tool_call_id == "call-1"
+    assert messages[3].artifact == "stdout"
+    assert messages[4].tool_calls == []
+
+
+def test_records_match_pydantic_conversion():
+    expected = chat_messages_base2base_message([ChatMessageBase(**r) for r in RECORDS])
+
+    assert records_to_base_messages(RECORDS) == expected
+
+
+def test_unknown_type_falls_back_to_human():
+    (message,) = records_to_base_messages([{"id": "m1", "type": "custom", "content": "hi"}])
+
+    assert isinstance(message, HumanMessage)
+    assert message.content == "hi"
+
+
+def test_message_record_round_trip():
+    originals = records_to_base_messages(RECORDS)
+
+    records = [message_record(m) for m in originals]
+
+    assert all(set(r) == set(HISTORY_FIELDS) for r in records)
+    assert records_to_base_messages(records) == originals
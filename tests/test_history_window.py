@@ -0,0 +1,120 @@
+import asyncio
+
+from backend.app.core.settings import settings
+from backend.app.services import chat_message_service
+from backend.app.services.branch_service import root_branch
+from backend.app.services.chat_message_service import select_history_window, load_history_records
+
+
+def record(message_id: int, type_: str, tokens: int, **extra) -> dict:
+    return {"id": f"lg-{message_id}", "type": type_, "content": "x", "token_count": tokens, **extra}
+
+
+def conversation(count: int, tokens: int = 100) -> list[dict]:
+    """human / ai 交替的会话，按时间正序"""
+    return [record(i, "human" if i % 2 == 0 else "ai", tokens) for i in range(count)]
+
+
+def test_budget_keeps_newest_messages():
+    records = conversation(10)
+
+    window, bounded = select_history_window(records, windows_size=20, max_tokens=350)
+
+    # 从最新一条往前选，第 4 条（累计 400）超出预算
+    assert window == records[-3:]
+    assert bounded
+
+
+def test_window_size_limits_count():
+    records = conversation(10)
+
+    window, bounded = select_history_window(records, windows_size=4)
+
+    assert window == records[-4:]
+    assert bounded
+
+
+def test_everything_fits_is_not_bounded():
+    records = conversation(4)
+
+    window, bounded = select_history_window(records, windows_size=10, max_tokens=1000)
+
+    assert window == records
+    assert not bounded
+
+
+def test_huge_tool_output_is_excluded():
+    records = [
+        record(1, "human", 20),
+        record(2, "ai", 30, tool_calls=[{"id": "call-1", "name": "run_command", "args": {}}]),
+        record(3, "tool", 50_000, name="run_command", tool_call_id="call-1"),
+        record(4, "ai", 40),
+        record(5, "human", 20),
+        record(6, "ai", 40),
+    ]
+
+    window, bounded = select_history_window(records, windows_size=20, max_tokens=5000)
+
+    assert window == records[3:]
+    assert all(r["type"] != "tool" for r in window)
+    assert sum(r["token_count"] for r in window) <= 5000
+    assert bounded
+
+
+def test_window_never_starts_with_tool_message():
+    records = [
+        record(1, "human", 10),
+        record(2, "ai", 10, tool_calls=[{"id": "a"}, {"id": "b"}]),
+        record(3, "tool", 10, tool_call_id="a"),
+        record(4, "tool", 10, tool_call_id="b"),
+        record(5, "ai", 10),
+    ]
+
+    # 条数限制恰好截在两条 tool 消息之前
+    window, _ = select_history_window(records, windows_size=3)
+
+    assert window == records[-1:]
+
+
+def test_missing_token_count_is_computed_and_cached():
+    records = [{"id": "lg-1", "type": "human", "content": "hello world", "token_count": None}]
+
+    window, _ = select_history_window(records, windows_size=5, max_tokens=1000)
+
+    assert window == records
+    assert records[0]["token_count"] > 0
+
+
+def test_loader_respects_history_token_budget(monkeypatch):
+    max_tokens = settings.HISTORY_MAX_TOKENS
+    # 模拟仓储层：返回的消息包含第一条超出预算的消息（以及更早的超大工具输出）
+    history = [
+        record(1, "human", 200),
+        record(2, "ai", 200, tool_calls=[{"id": "call-1", "name": "run_command", "args": {}}]),
+        record(3, "tool", max_tokens * 3, name="run_command", tool_call_id="call-1"),
+        record(4, "ai", max_tokens // 4),
+        record(5, "human", max_tokens // 4),
+        record(6, "ai", max_tokens // 4),
+        record(7, "human", max_tokens // 4 - 1),
+    ]
+    calls = []
+
+    async def fake_get_messages_by_token_budget(db, segments, limit, budget, from_id=None):
+        calls.append((segments, limit, budget))
+        return [dict(r) for r in history], False
+
+    async def no_cache(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(chat_message_service, "get_messages_by_token_budget", fake_get_messages_by_token_budget)
+    monkeypatch.setattr(chat_message_service, "read_cached_history", no_cache)
+    monkeypatch.setattr(chat_message_service, "populate_history_cache", no_cache)
+
+    branch = root_branch("thread-1")
+    window = asyncio.run(load_history_records(
+        "thread-1", None, windows_size=20, max_tokens=max_tokens, branch=branch,
+    ))
+
+    assert calls == [(branch.segments, 20, max_tokens)]
+    assert sum(r["token_count"] for r in window) <= max_tokens
+    assert [r["id"] for r in window] == ["lg-4", "lg-5", "lg-6", "lg-7"]
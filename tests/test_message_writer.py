@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import MetaData, event, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from backend.app.models.chat_message import ChatMessage
+from backend.app.services.message_writer import MessageWriter
+
+table = ChatMessage.__table__.to_metadata(MetaData())
+
+
+def turn(prefix: str, count: int = 2) -> list[dict]:
+    return [
+        {"id": f"{prefix}-{i}", "type": "human" if i == 0 else "ai", "content": f"{prefix} {i}", "token_count": 3}
+        for i in range(count)
+    ]
+
+
+async def make_engine():
+    db_engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with db_engine.begin() as conn:
+        await conn.run_sync(table.metadata.create_all)
+    transactions = []
+    event.listen(db_engine.sync_engine, "begin", lambda conn: transactions.append(conn))
+    return db_engine, transactions
+
+
+async def stored_ids(db_engine) -> list[str]:
+    async with db_engine.connect() as conn:
+        return list((await conn.execute(select(table.c.langgraph_id).order_by(table.c.id))).scalars())
+
+
+def test_concurrent_turns_share_one_transaction():
+    async def main():
+        db_engine, transactions = await make_engine()
+        flushed = []
+
+        async def after_flush(branch_id, records):
+            flushed.append((branch_id, [r["id"] for r in records]))
+
+        writer = MessageWriter(db_engine, table, flush_interval=0.05, after_flush=after_flush)
+        await writer.start()
+        futures = [await writer.submit(f"thread-{i % 2}", turn(f"t{i}")) for i in range(4)]
+        await asyncio.gather(*futures)
+        await writer.stop()
+
+        assert len(transactions) == 1
+        assert await stored_ids(db_engine) == [r["id"] for i in range(4) for r in turn(f"t{i}")]
+        # 按分支、按提交顺序回调
+        assert sorted(flushed) == [
+            ("thread-0", ["t0-0", "t0-1", "t2-0", "t2-1"]),
+            ("thread-1", ["t1-0", "t1-1", "t3-0", "t3-1"]),
+        ]
+        await db_engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_batch_is_cut_at_max_batch_rows():
+    async def main():
+        db_engine, transactions = await make_engine()
+        writer = MessageWriter(db_engine, table, flush_interval=0.05, max_batch_rows=4)
+        await writer.start()
+        futures = [await writer.submit("thread", turn(f"t{i}")) for i in range(4)]
+        await asyncio.gather(*futures)
+        await writer.stop()
+
+        assert len(transactions) == 2
+        async with db_engine.connect() as conn:
+            assert (await conn.execute(select(func.count()).select_from(table))).scalar() == 8
+        await db_engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_failed_job_does_not_fail_the_batch():
+    async def main():
+        db_engine, _ = await make_engine()
+        flushed = []
+
+        async def after_flush(branch_id, records):
+            flushed.extend(r["id"] for r in records)
+
+        writer = MessageWriter(db_engine, table, flush_interval=0.05, after_flush=after_flush)
+        await writer.start()
+        good_before = await writer.submit("thread", turn("a"))
+        # content 非空约束：该任务单独重试时仍失败
+        bad = await writer.submit("thread", [{"id": "bad", "type": "ai", "content": None}])
+        good_after = await writer.submit("thread", turn("b"))
+        results = await asyncio.gather(good_before, bad, good_after, return_exceptions=True)
+        await writer.stop()
+
+        assert results[0] is None and results[2] is None
+        assert isinstance(results[1], IntegrityError)
+        assert await stored_ids(db_engine) == ["a-0", "a-1", "b-0", "b-1"]
+        assert flushed == ["a-0", "a-1", "b-0", "b-1"]
+        await db_engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_write_without_running_writer_inserts_directly():
+    async def main():
+        db_engine, transactions = await make_engine()
+        writer = MessageWriter(db_engine, table)
+
+        await writer.write("thread", turn("direct"), branch_id="branch-1")
+
+        assert len(transactions) == 1
+        async with db_engine.connect() as conn:
+            rows = (await conn.execute(select(table.c.thread_id, table.c.branch_id))).all()
+        assert rows == [("thread", "branch-1"), ("thread", "branch-1")]
+        await db_engine.dispose()
+
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.app.core import metrics
+from backend.app.core.metrics import Counter, Histogram, render_prometheus
+from backend.app.routers.metrics import router
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """每个用例使用独立的指标注册表"""
+    monkeypatch.setattr(metrics, "_REGISTRY", [])
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = Histogram("latency_seconds", "latency", buckets=(0.1, 0.01, 1))
+    for value in (0.005, 0.01, 0.05, 0.5, 3):
+        histogram.observe(value)
+
+    (data,) = histogram.snapshot().values()
+
+    # 分桶按上界排序，等于上界的样本计入该桶（le）
+    assert data["buckets"] == {0.01: 2, 0.1: 3, 1: 4, float("inf"): 5}
+    assert data["count"] == 5
+    assert data["sum"] == pytest.approx(3.565)
+
+
+def test_labels_are_separate_series():
+    histogram = Histogram("upload_seconds", "upload", buckets=(1,), labelnames=("outcome",))
+    histogram.observe(0.5, outcome="ok")
+    histogram.observe(2, outcome="error")
+    histogram.observe(0.1, outcome="ok")
+
+    snapshot = histogram.snapshot()
+
+    assert snapshot[("ok",)]["buckets"] == {1: 2, float("inf"): 2}
+    assert snapshot[("error",)]["buckets"] == {1: 0, float("inf"): 1}
+
+
+def test_counter_defaults_missing_labels_to_empty():
+    counter = Counter("requests_total", "requests", labelnames=("reason",))
+    counter.inc(reason="client")
+    counter.inc(2, reason="client")
+    counter.inc()
+
+    assert counter.snapshot() == {("client",): 3, ("",): 1}
+
+
+def test_render_prometheus_text_format():
+    counter = Counter("rejected_total", "rejected\nrequests", labelnames=("reason",))
+    counter.inc(reason='say "hi"')
+    histogram = Histogram("wait_seconds", "wait", buckets=(0.5, 1))
+    histogram.observe(0.25)
+    histogram.observe(0.75)
+
+    assert render_prometheus() == (
+        "# HELP rejected_total rejected\\nrequests\n"
+        "# TYPE rejected_total counter\n"
+        'rejected_total{reason="say \\"hi\\""} 1\n'
+        "# HELP wait_seconds wait\n"
+        "# TYPE wait_seconds histogram\n"
+        'wait_seconds_bucket{le="0.5"} 1\n'
+        'wait_seconds_bucket{le="1"} 2\n'
+        'wait_seconds_bucket{le="+Inf"} 2\n'
+        "wait_seconds_sum 1\n"
+        "wait_seconds_count 2\n"
+    )
+
+
+def test_metrics_without_samples_export_only_metadata():
+    Histogram("idle_seconds", "idle", buckets=(1,))
+
+    assert render_prometheus() == "# HELP idle_seconds idle\n# TYPE idle_seconds histogram\n"
+
+
+def test_record_turn_audio_bytes_skips_empty_kinds(monkeypatch):
+    counter = Counter("audio_bytes_total", "audio", labelnames=("encoding", "kind"))
+    histogram = Histogram("turn_audio_bytes", "audio", buckets=metrics.BYTES_BUCKETS, labelnames=("encoding", "kind"))
+    monkeypatch.setattr(metrics, "TTS_AUDIO_BYTES", counter)
+    monkeypatch.setattr(metrics, "TTS_TURN_AUDIO_BYTES", histogram)
+
+    metrics.record_turn_audio_bytes("mp3", stream_bytes=2048, stored_bytes=0)
+
+    assert counter.snapshot() == {("mp3", "stream"): 2048}
+    assert list(histogram.snapshot()) == [("mp3", "stream")]
+
+
+def test_metrics_endpoint():
+    Counter("hits_total", "hits").inc()
+    app = FastAPI()
+    app.include_router(router)
+
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "hits_total 1\n" in response.text
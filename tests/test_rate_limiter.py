@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from backend.app.utils import rate_limiter as rate_limiter_module
+from backend.app.utils.rate_limiter import RateLimitDecision, RateLimiter
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(rate_limiter_module, "redis_client", client)
+    return client
+
+
+def make_limiter(**kwargs) -> RateLimiter:
+    options = {
+        "client_per_minute": 1, "client_burst": 100,
+        "assistant_per_minute": 1, "assistant_burst": 100,
+        "assistant_max_concurrency": 0,
+    }
+    options.update(kwargs)
+    return RateLimiter(**options)
+
+
+def test_client_bucket_allows_burst_then_rejects(fake_redis):
+    async def main():
+        limiter = make_limiter(client_burst=2)
+        assert (await limiter.acquire("1.2.3.4", 1)).allowed
+        assert (await limiter.acquire("1.2.3.4", 1)).allowed
+
+        decision = await limiter.acquire("1.2.3.4", 1)
+        assert not decision.allowed
+        assert decision.reason == "client"
+        # 每分钟 1 个令牌：约 60 秒后才有下一个
+        assert 59 < decision.retry_after <= 60
+        assert decision.retry_after_header == "60"
+        # 其他客户端不受影响
+        assert (await limiter.acquire("5.6.7.8", 1)).allowed
+
+    asyncio.run(main())
+
+
+def test_tokens_refill_over_time(fake_redis):
+    async def main():
+        # 每毫秒 1 个令牌
+        limiter = make_limiter(client_per_minute=60000, client_burst=1)
+        assert (await limiter.acquire("client", 1)).allowed
+        await asyncio.sleep(0.02)
+        assert (await limiter.acquire("client", 1)).allowed
+
+    asyncio.run(main())
+
+
+def test_assistant_bucket_is_shared_and_rejection_does_not_deduct(fake_redis):
+    async def main():
+        limiter = make_limiter(assistant_burst=2)
+        assert (await limiter.acquire("a", 7)).allowed
+        assert (await limiter.acquire("b", 7)).allowed
+
+        decision = await limiter.acquire("c", 7)
+        assert not decision.allowed
+        assert decision.reason == "assistant"
+        # 被拒的请求不扣减任何令牌桶
+        assert not await fake_redis.exists("rate-limit:client:c")
+
+    asyncio.run(main())
+
+
+def test_concurrency_lease_is_held_until_released(fake_redis):
+    async def main():
+        limiter = make_limiter(assistant_max_concurrency=2)
+        first = await limiter.acquire("a", 7)
+        second = await limiter.acquire("b", 7)
+        assert first.allowed and second.allowed
+        tokens_before = await fake_redis.hget("rate-limit:client:c", "tokens")
+
+        rejected = await limiter.acquire("c", 7)
+        assert not rejected.allowed
+        assert rejected.reason == "concurrency"
+        assert rejected.retry_after == 1
+        assert rejected.lease_id is None
+        assert await fake_redis.hget("rate-limit:client:c", "tokens") == tokens_before
+
+        await first.release()
+        # 重复释放不影响其他租约
+        await first.release()
+        assert await fake_redis.zcard(first.concurrency_key) == 1
+        assert (await limiter.acquire("c", 7)).allowed
+
+    asyncio.run(main())
+
+
+def test_expired_leases_are_reclaimed(fake_redis):
+    async def main():
+        limiter = make_limiter(assistant_max_concurrency=1, concurrency_lease=0.05)
+        assert (await limiter.acquire("a", 7)).allowed
+        assert not (await limiter.acquire("b", 7)).allowed
+        # 持有者崩溃、未释放：租约到期后自动回收
+        await asyncio.sleep(0.1)
+        assert (await limiter.acquire("b", 7)).allowed
+
+    asyncio.run(main())
+
+
+def test_redis_unavailable_allows_request(monkeypatch):
+    class BrokenRedis:
+        async def eval(self, *args):
+            raise ConnectionError("redis down")
+
+    monkeypatch.setattr(rate_limiter_module, "redis_client", BrokenRedis())
+
+    async def main():
+        decision = await make_limiter(assistant_max_concurrency=1).acquire("a", 7)
+        assert decision.allowed
+        assert decision.lease_id is None
+        await decision.release()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("retry_after, header", [(0, "1"), (0.2, "1"), (1, "1"), (2.1, "3")])
+def test_retry_after_header_is_whole_seconds(retry_after, header):
+    assert RateLimitDecision(allowed=False, retry_after=retry_after).retry_after_header == header
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from backend.app.utils import session_lock
+from backend.app.utils.session_lock import SessionLock
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(session_lock, "redis_client", client)
+    return client
+
+
+def make_lock(**kwargs) -> SessionLock:
+    options = {"lease": 3, "wait_timeout": 2, "max_waiters": 5, "poll_interval": 0.05}
+    options.update(kwargs)
+    return SessionLock("session", **options)
+
+
+async def collect_positions(lock: SessionLock) -> list[int]:
+    return [position async for position in lock.wait()]
+
+
+def test_free_lock_is_acquired_without_queueing():
+    async def main():
+        lock = make_lock()
+        assert await collect_positions(lock) == []
+        assert lock.acquired
+        await lock.release()
+        assert not lock.acquired
+
+    asyncio.run(main())
+
+
+def test_waiters_are_served_in_arrival_order():
+    async def main():
+        holder = make_lock()
+        assert await holder.acquire()
+        first, second = make_lock(), make_lock()
+        first_task = asyncio.create_task(collect_positions(first))
+        await asyncio.sleep(0.02)
+        second_task = asyncio.create_task(collect_positions(second))
+        await asyncio.sleep(0.1)
+
+        await holder.release()
+        assert await first_task == [1]
+        assert first.acquired and not second.acquired
+        # 等第二个等待者心跳一次，观察到自己已排到队首
+        await asyncio.sleep(0.15)
+
+        await first.release()
+        assert await second_task == [2, 1]
+        assert second.acquired
+        await second.release()
+
+    asyncio.run(main())
+
+
+def test_full_queue_rejects_without_waiting():
+    async def main():
+        holder = make_lock(max_waiters=1)
+        assert await holder.acquire()
+        waiter = make_lock(max_waiters=1)
+        waiter_task = asyncio.create_task(collect_positions(waiter))
+        await asyncio.sleep(0.05)
+
+        rejected = make_lock(max_waiters=1)
+        assert await collect_positions(rejected) == []
+        assert not rejected.acquired
+
+        await holder.release()
+        await waiter_task
+        assert waiter.acquired
+        await waiter.release()
+
+    asyncio.run(main())
+
+
+def test_wait_times_out():
+    async def main():
+        holder = make_lock()
+        assert await holder.acquire()
+        waiter = make_lock(wait_timeout=0.2)
+        assert await collect_positions(waiter) == [1]
+        assert not waiter.acquired
+        await waiter.release()
+        await holder.release()
+
+    asyncio.run(main())
+
+
+def test_watchdog_keeps_the_lease_alive(fake_redis):
+    async def main():
+        lock = make_lock(lease=0.3)
+        assert await lock.acquire()
+        await asyncio.sleep(0.7)
+        assert await fake_redis.get(lock._keys[0]) == lock.token
+        assert not lock.lost
+        await lock.release()
+
+    asyncio.run(main())
+
+
+def test_lost_lease_cancels_the_holder(fake_redis):
+    async def main():
+        lock = make_lock(lease=0.3)
+
+        async def holder():
+            assert await lock.acquire()
+            try:
+                await asyncio.sleep(5)
+            finally:
+                await lock.release()
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0.05)
+        # 租约过期后被其他请求拿到锁
+        await fake_redis.set(lock._keys[0], "someone-else")
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, 1)
+        assert lock.lost
+        # 释放时不会删除他人持有的锁
+        assert await fake_redis.get(lock._keys[0]) == "someone-else"
+
+    asyncio.run(main())
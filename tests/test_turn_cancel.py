@@ -0,0 +1,105 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from backend.app.services import turn_cancel_service
+from backend.app.services.turn_cancel_service import (
+    cancel_local, cancel_turn, listen_turn_cancellations, register_turn, request_cancel, unregister_turn,
+)
+from backend.app.utils import process_registry, redis_util
+
+
+@pytest.fixture(autouse=True)
+def reset_registry():
+    yield
+    turn_cancel_service._running.clear()
+    process_registry.reset("session")
+
+
+async def idle():
+    await asyncio.sleep(10)
+
+
+def test_registered_turn_is_cancelled_with_its_tool_processes():
+    async def main():
+        proc = subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(30)"], **process_registry.popen_group_kwargs(),
+        )
+        process_registry.register("session", proc)
+        task = asyncio.create_task(idle())
+        register_turn("session", task)
+
+        assert cancel_local("session", "user")
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert proc.wait(timeout=5) != 0
+        assert process_registry.is_cancelled("session")
+        # 任务结束时自动移除登记
+        assert "session" not in turn_cancel_service._running
+        assert not cancel_local("session")
+
+    asyncio.run(main())
+
+
+def test_queued_turn_cancel_leaves_running_turn_alone():
+    async def main():
+        running = asyncio.create_task(idle())
+        queued = asyncio.create_task(idle())
+        register_turn("session", running)
+
+        # 客户端断开的是排队中的对话：只取消它，不结束正在执行的对话的工具进程
+        cancel_turn("session", queued, "client disconnected")
+        await asyncio.gather(queued, return_exceptions=True)
+
+        assert queued.cancelled()
+        assert not running.done()
+        assert not process_registry.is_cancelled("session")
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def test_unregister_ignores_other_tasks():
+    async def main():
+        first = asyncio.create_task(idle())
+        second = asyncio.create_task(idle())
+        register_turn("session", first)
+        register_turn("session", second)
+
+        # 先登记的任务结束时不会移除后登记的任务
+        unregister_turn("session", first)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        assert turn_cancel_service._running["session"] is second
+
+        unregister_turn("session", second)
+        assert "session" not in turn_cancel_service._running
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def test_cancel_request_is_broadcast_to_the_owning_worker(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(turn_cancel_service, "redis_client", client)
+    monkeypatch.setattr(redis_util, "redis_client", client)
+
+    async def main():
+        listener = asyncio.create_task(listen_turn_cancellations())
+        task = asyncio.create_task(idle())
+        register_turn("session", task)
+        await asyncio.sleep(0.1)
+
+        await request_cancel("session", "user")
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, 2)
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from backend.app.routers import base_chat
+from backend.app.routers.base_chat import TurnStreamingResponse, chat_turn_stream
+from backend.app.utils.agent_util import SSETransport
+
+
+class FakeAdmission:
+    """只记录释放次数的并发租约"""
+
+    def __init__(self):
+        self.released = 0
+
+    async def release(self):
+        self.released += 1
+
+
+@pytest.fixture
+def turn(monkeypatch):
+    """替换对话执行：依次输出 frames，之后挂起 hang 秒"""
+    state = {"frames": ["data: a\n\n", "data: b\n\n"], "hang": 0}
+
+    async def fake_turn_frames(session_id, chat_message, transport, regenerate_message_id=None):
+        for frame in state["frames"]:
+            yield frame
+        await asyncio.sleep(state["hang"])
+
+    monkeypatch.setattr(base_chat, "_turn_frames", fake_turn_frames)
+    return state
+
+
+async def settle():
+    """等待后台释放任务执行"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def event_names(frames: list[str]) -> list[str]:
+    return [f.split("\n", 1)[0][len("event: "):] for f in frames if f.startswith("event: ")]
+
+
+def test_completed_turn_releases_lease_once(turn):
+    async def main():
+        admission = FakeAdmission()
+        frames = [f async for f in chat_turn_stream("s1", None, SSETransport(), admission=admission)]
+        await settle()
+
+        assert event_names(frames) == ["start", "done"]
+        assert frames[1:3] == turn["frames"]
+        assert admission.released == 1
+
+    asyncio.run(main())
+
+
+def test_closing_at_first_frame_cancels_turn_and_releases_lease(turn):
+    turn["hang"] = 10
+
+    async def main():
+        admission = FakeAdmission()
+        stream = chat_turn_stream("s1", None, SSETransport(), admission=admission)
+        first = await stream.__anext__()
+        (producer,) = [t for t in asyncio.all_tasks() if t.get_name() == "turn:s1"]
+        # 客户端在收到 start 后立即断开
+        await stream.aclose()
+        await settle()
+
+        assert event_names([first]) == ["start"]
+        assert producer.cancelled()
+        assert admission.released == 1
+
+    asyncio.run(main())
+
+
+def test_explicit_cancel_emits_cancelled_event(turn):
+    turn["hang"] = 10
+
+    async def main():
+        admission = FakeAdmission()
+        frames = []
+        async for frame in chat_turn_stream("s1", None, SSETransport(), admission=admission):
+            frames.append(frame)
+            if frame == turn["frames"][-1]:
+                (producer,) = [t for t in asyncio.all_tasks() if t.get_name() == "turn:s1"]
+                producer.cancel()
+        await settle()
+
+        assert event_names(frames) == ["start", "cancelled", "done"]
+        assert admission.released == 1
+
+    asyncio.run(main())
+
+
+def test_response_releases_lease_when_body_never_starts(turn):
+    async def main():
+        admission = FakeAdmission()
+        started = False
+
+        async def body():
+            nonlocal started
+            started = True
+            yield "data: a\n\n"
+
+        async def send(message):
+            # 发送响应头时连接已断开
+            raise OSError("connection reset")
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        response = TurnStreamingResponse(body(), admission, media_type="text/event-stream")
+        scope = {"type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}}
+        with pytest.raises(ClientDisconnect):
+            await response(scope, receive, send)
+        await settle()
+
+        assert not started
+        assert admission.released == 1
+
+    asyncio.run(main())